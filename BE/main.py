@@ -1,4 +1,6 @@
 from datetime import datetime
+import asyncio
+import contextlib
 import logging
 
 from fastapi import FastAPI
@@ -9,8 +11,14 @@ from rich.console import Console
 from routers import tts, transcription, system, welcome,voice_records,voice_assignment
 from middleware.permissions import AddPermissionsPolicyMiddleware
 from services.db import initialize_database
-from services.tts_service import initialize_tts
-from utils.dependencies import database_exception_handler, DatabaseError
+from src.connectionDB import close_connection_pool
+from services.model_registry import model_registry
+from services.inference_host import get_inference_host_client
+from services.transcription_service import batch_scheduler
+from services.inference_executor import InferenceBusyError, shutdown_inference_pools
+from services.voice_record_repository import voice_record_repository
+from services.transcript_buffer import run_transcript_recovery
+from utils.dependencies import database_exception_handler, DatabaseError, inference_busy_exception_handler
 
 # Initialize logging
 logging.basicConfig(
@@ -25,9 +33,25 @@ console = Console()
 async def lifespan(app: FastAPI):
     console.print("[cyan]Starting application...[/cyan]")
     initialize_database()
-    initialize_tts()
+    # 模型在背景載入，啟動後即可回應請求；載入狀態見 /system/ready
+    # 使用推論主機時模型只在主機行程中載入
+    inference_host_client = get_inference_host_client()
+    if inference_host_client is None:
+        model_registry.warm_up(model_registry.warmup_names())
+    # 伺服器當機或重啟時中斷的串流轉譯記錄會停在 'transcribing'，定期改標為 'error'
+    transcript_recovery = asyncio.create_task(run_transcript_recovery())
     yield
     console.print("[cyan]Shutting down application...[/cyan]")
+    transcript_recovery.cancel()
+    # 等待 task 真正結束，關閉時才不會留下未完成的 task 或 "Task was destroyed" 警告
+    with contextlib.suppress(asyncio.CancelledError):
+        await transcript_recovery
+    await batch_scheduler.stop()
+    shutdown_inference_pools()
+    voice_record_repository.shutdown()
+    if inference_host_client is not None:
+        inference_host_client.close()
+    close_connection_pool()
 
 # Initialize FastAPI with lifespan
 app = FastAPI(lifespan=lifespan)
@@ -45,6 +69,7 @@ app.add_middleware(
 app.add_middleware(AddPermissionsPolicyMiddleware)
 
 app.add_exception_handler(DatabaseError, database_exception_handler)
+app.add_exception_handler(InferenceBusyError, inference_busy_exception_handler)
 
 # Include routers
 app.include_router(welcome.router)
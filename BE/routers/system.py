@@ -1,6 +1,11 @@
 from fastapi import APIRouter
 from fastapi.responses import JSONResponse
 from services.system_service import check_system_resources
+from services.inference_executor import get_pool_stats
+from services.db import check_database_health
+from services.model_registry import model_registry
+from services.inference_host import get_inference_host_client, InferenceHostError
+import asyncio
 import logging
 
 logger = logging.getLogger(__name__)
@@ -12,3 +17,30 @@ async def get_system_resources():
     logger.info("Checking system resources.")
     result = check_system_resources()
     return JSONResponse(content=result.dict())
+
+@router.get("/inference-pools")
+async def get_inference_pools():
+    return JSONResponse(content=get_pool_stats())
+
+@router.get("/database")
+def get_database_health():
+    result = check_database_health()
+    return JSONResponse(content=result, status_code=200 if result["healthy"] else 503)
+
+@router.get("/live")
+async def get_liveness():
+    """行程存活即回傳 200，不依賴模型或資料庫。"""
+    return JSONResponse(content={"status": "alive"})
+
+@router.get("/ready")
+async def get_readiness():
+    """預先載入的模型全部就緒時回傳 200，否則回傳 503 與各模型的載入狀態。"""
+    client = get_inference_host_client()
+    if client is None:
+        result = model_registry.readiness()
+    else:
+        try:
+            result = await asyncio.to_thread(client.readiness)
+        except InferenceHostError as e:
+            result = {"ready": False, "error": e.message}
+    return JSONResponse(content=result, status_code=200 if result["ready"] else 503)
@@ -1,35 +1,60 @@
-from fastapi import APIRouter, UploadFile, File, Form, HTTPException
+from fastapi import APIRouter, UploadFile, File, Form, Header, HTTPException
 from fastapi.responses import StreamingResponse
-from services.transcription_service import transcribe_audio_streaming,transcribe_audio_single
-from pydub import AudioSegment
-import numpy as np
+from services.transcription_service import transcribe_audio_streaming, transcribe_audio_batched, check_transcription_capacity, get_batch_metrics
+from services.inference_executor import InferenceBusyError
+from services.transcription_cache import TranscriptionCache, fingerprint_pcm
+from services.audio_ingest import ingest_audio_file, spool_upload, PcmFrameStream
+from src.asr_backends import resolve_model
+import asyncio
 import logging
-from src.connectionDB import create_connection, create_voice_record, create_tag, associate_tag_with_voice_record
+from services.voice_record_repository import voice_record_repository
+from services.transcript_buffer import INTERRUPTED_MESSAGE, TranscriptBuffer
+from services.job_queue import TERMINAL_STATUSES, get_job, submit_job
+from utils.dependencies import DatabaseError
 import aiofiles # type: ignore
 from datetime import datetime
 import uuid
 import os
 import json
-import sqlite3  # 確保引入 sqlite3
 
 logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
+# 非同步工作的上傳檔案需保留到 worker 處理完畢，因此不放在系統暫存資料夾
+JOB_UPLOAD_DIR = os.getenv('JOB_UPLOAD_DIR', 'jobUploads')
+JOB_EVENTS_POLL_S = float(os.getenv('JOB_EVENTS_POLL_S', '1.0'))
+
+transcription_cache = TranscriptionCache(
+    max_entries=int(os.getenv('TRANSCRIPTION_CACHE_MAX_ENTRIES', '10000')),
+)
+
+def _resolve_asr_model(model, tenant):
+    try:
+        return resolve_model(model, tenant)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
 @router.post("/transcribe-stream")
 async def transcribe_stream(
     file: UploadFile = File(...), 
     return_timestamps: bool = Form(False), 
-    tags: str = Form(None)  # 可選的標籤參數
+    tags: str = Form(None),  # 可選的標籤參數
+    model: str = Form(None),  # 模型別名：large-v3、small、distil
+    x_tenant_id: str = Header(None),
 ):
     """
     接收音頻文件，進行非同步轉譯，並以事件流方式返回轉譯結果。
     同時，將轉譯結果存入資料庫。
     """
-    conn = None
     output_path = ""
     output_filename = ""
     voice_record_id = None
+    spooled = None
+
+    asr_model = _resolve_asr_model(model, x_tenant_id)
+    # 串流開始後無法再回傳 503，因此先確認 ASR 佇列還有空間
+    check_transcription_capacity()
 
     try:
         logger.info("===== FILE INFO =====")
@@ -52,37 +77,28 @@ async def transcribe_stream(
         origin_path = os.path.join(origin_dir, origin_filename)
 
     
-        # 讀取音頻文件
-        audio = AudioSegment.from_file(file.file)
-        logger.info("===== AUDIO INFO =====")
-        logger.info(f"Audio duration: {audio.duration_seconds} seconds, Channels: {audio.channels}")
-        # 設置採樣率為16kHz，單聲道
-        audio = audio.set_frame_rate(16000).set_channels(1)
-        logger.info("===== CONVERTING AUDIO TO WAV FORMAT =====")
-
-        # 保存轉換後的音頻文件
-        converted_path = origin_path.replace(".wav", "_converted.wav")
-        audio.export(converted_path, format="wav")
-        logger.info(f"Converted audio saved to {converted_path}")
+        # 以固定大小的區塊把上傳檔案寫入暫存檔
+        spooled = await spool_upload(file)
 
-        audio = audio.set_frame_rate(16000)
-        logger.info("===== CONVERTING AUDIO TO NUMPY ARRAY =====")
-        audio_data = np.array(audio.get_array_of_samples()).astype(np.float32) / 32768.0
+        # 逐 frame 解碼並重新取樣為 16kHz 單聲道，同時寫出轉換後的音頻文件
+        converted_path = origin_path.replace(".wav", "_converted.wav")
+        frame_stream = PcmFrameStream(spooled.path, wav_path=converted_path)
+        logger.info(f"Streaming converted audio to {converted_path}")
         logger.info(f"return_timestamps: {return_timestamps}")
 
         # 開始轉譯
-        transcription_generator = transcribe_audio_streaming(audio_data, sampling_rate=16000, return_timestamps=return_timestamps)
-
-        # 開啟資料庫連接
-        conn = create_connection()
-        if not conn:
-            raise HTTPException(status_code=500, detail="Database connection failed")
+        # 每個視窗都以時間戳轉譯，片段在串流結束後一次寫入 transcript_segment
+        segments = []
+        transcription_generator = transcribe_audio_streaming(
+            frame_stream, sampling_rate=16000, return_timestamps=return_timestamps, segment_sink=segments,
+            model=asr_model
+        )
 
         # 準備記錄資料，初始狀態為 'transcribing'
         record = {
             "filename": output_filename,
             "filetype": "text/plain",
-            "duration": audio.duration_seconds,
+            "duration": 0,  # 解碼完成後更新
             "size": 0,  # 後續更新
             "filepath": output_path,
             "transcript": "",  # 後續更新
@@ -92,65 +108,51 @@ async def transcribe_stream(
             "parent_id": None  # 因為這是轉譯，不是衍生的檔案
         }
 
-        # 插入 voice_record 表格
-        voice_record_id = create_voice_record(conn, record)
+        # 在單一交易中插入 voice_record 表格並處理標籤（如果有）
+        tag_list = [tag.strip() for tag in tags.split(",") if tag.strip()] if tags else []
+        voice_record_id = await voice_record_repository.create(record, tag_list)
         if not voice_record_id:
             raise HTTPException(status_code=500, detail="Failed to insert voice record into database")
 
-        # 處理標籤（如果有）
-        if tags:
-            tag_list = [tag.strip() for tag in tags.split(",") if tag.strip()]
-            for tag in tag_list:
-                tag_id = create_tag(conn, tag)
-                if tag_id:
-                    associate_tag_with_voice_record(conn, voice_record_id, tag_id)
-
         # 定義內部生成器，用於同步寫入檔案和傳輸事件
         async def internal_event_generator():
             nonlocal record
+            buffer = TranscriptBuffer(voice_record_id)
             try:
                 async with aiofiles.open(output_path, mode='w', encoding='utf-8') as f:
                     async for chunk in transcription_generator:
                         await f.write(chunk)
-                        # 更新資料庫
-                        cursor = conn.cursor()
-                        cursor.execute(
-                            "UPDATE voice_record SET transcript = transcript || ?, size = ? WHERE id = ?",
-                            (chunk, os.path.getsize(output_path), voice_record_id)
-                        )
-                        conn.commit()
+                        # 先累積在記憶體，由 buffer 依時間或大小門檻批次寫回資料庫
+                        buffer.append(chunk)
                         data = {
                             "voice_record_id": voice_record_id,
                             "chunk": chunk
                         }
                         yield f"data: {json.dumps(data)}\n\n"  # SSE 格式
                         
-                # 最後更新狀態為 'completed'
-                cursor = conn.cursor()
-                cursor.execute(
-                    "UPDATE voice_record SET status = ? WHERE id = ?",
-                    ("completed", voice_record_id)
-                )
-                conn.commit()
+                # 寫入時間片段，最後更新狀態為 'completed'
+                await voice_record_repository.add_segments(voice_record_id, segments, frame_stream.duration_seconds)
+                await buffer.close("completed", duration=frame_stream.duration_seconds)
                 logger.info(f"Updated voice record ID {voice_record_id} status to 'completed'")
             except Exception as e:
                 logger.error(f"Error during streaming transcription: {e}")
                 # 更新狀態為錯誤
-                cursor = conn.cursor()
-                cursor.execute(
-                    "UPDATE voice_record SET status = ?, error_message = ? WHERE id = ?",
-                    ("error", str(e), voice_record_id)
-                )
-                conn.commit()
+                await buffer.close("error", str(e))
                 raise e
             finally:
-                conn.close()
+                spooled.remove()
+                # 用戶端中途斷線時 generator 會收到 CancelledError/GeneratorExit，仍需寫入最終狀態
+                if not buffer.closed:
+                    logger.warning(f"Streaming transcription for voice record {voice_record_id} was interrupted")
+                    buffer.close_in_background("error", INTERRUPTED_MESSAGE)
 
         logger.info("===== STREAMING TRANSCRIPTION COMPLETED =====")
         return StreamingResponse(
             internal_event_generator(),
             media_type="text/event-stream"
         )
+    except InferenceBusyError:
+        raise
     except MemoryError as me:
         logger.error(f"MemoryError during transcription: {me}")
         raise HTTPException(status_code=500, detail="Memory error: " + str(me))
@@ -160,22 +162,19 @@ async def transcribe_stream(
     except Exception as e:
         logger.error(f"Error during transcription: {e}")
 
+        # 串流尚未開始，移除暫存的上傳檔案
+        if spooled:
+            spooled.remove()
+
         
 
         # 嘗試將狀態更新為錯誤
-        if conn and voice_record_id:
+        if voice_record_id:
             try:
-                cursor = conn.cursor()
-                cursor.execute(
-                    "UPDATE voice_record SET status = ?, error_message = ? WHERE id = ?",
-                    ("error", str(e), voice_record_id)
-                )
-                conn.commit()
+                await voice_record_repository.update_status(voice_record_id, "error", str(e))
                 logger.info(f"Updated voice record ID {voice_record_id} status to 'error'")
-            except sqlite3.Error as db_e:
-                logger.error(f"Error updating voice record status: {db_e}")
-            finally:
-                conn.close()
+            except DatabaseError as db_e:
+                logger.error(f"Error updating voice record status: {db_e.message}")
 
         # 嘗試刪除已生成的檔案（如果存在）
         if output_path and os.path.exists(output_path):
@@ -191,16 +190,19 @@ async def transcribe_stream(
 async def transcribe(
     file: UploadFile = File(...), 
     return_timestamps: bool = Form(False), 
-    tags: str = Form(None)
+    tags: str = Form(None),
+    model: str = Form(None),  # 模型別名：large-v3、small、distil
+    x_tenant_id: str = Header(None),
 ):
     """
     接收音頻文件，進行轉譯，並返回轉譯結果與 voice_record_id。
     同時，將轉譯結果存入資料庫。
     """
-    conn = None
     output_path = ""
     output_filename = ""
     voice_record_id = None
+    spooled = None
+    asr_model = _resolve_asr_model(model, x_tenant_id)
 
     try:
         logger.info("===== FILE INFO =====")
@@ -223,32 +225,45 @@ async def transcribe(
         os.makedirs(origin_dir, exist_ok=True)
         origin_path = os.path.join(origin_dir, origin_filename)
 
-    
-        # 讀取音頻文件
-        audio = AudioSegment.from_file(file.file)
-        logger.info("===== AUDIO INFO =====")
-        logger.info(f"Audio duration: {audio.duration_seconds} seconds, Channels: {audio.channels}")
-        # 設置採樣率為16kHz，單聲道
-        audio = audio.set_frame_rate(16000).set_channels(1)
-        logger.info("===== CONVERTING AUDIO TO WAV FORMAT =====")
-
-        # 保存轉換後的音頻文件
-        converted_path = origin_path.replace(".wav", "_converted.wav")
-        audio.export(converted_path, format="wav")
-        logger.info(f"Converted audio saved to {converted_path}")
-
-
-        audio = audio.set_frame_rate(16000)
-        logger.info("===== CONVERTING AUDIO TO NUMPY ARRAY =====")
-        audio_data = np.array(audio.get_array_of_samples()).astype(np.float32) / 32768.0
-        logger.info(f"return_timestamps: {return_timestamps}")
-
 
-        # 進行轉譯
-        transcription = transcribe_audio_single(audio_data, sampling_rate=16000, return_timestamps=return_timestamps)
+        # 以固定大小的區塊寫入暫存檔並計算雜湊，先以上傳檔案雜湊快速比對，命中時不需解碼
+        spooled = await spool_upload(file)
+        upload_hash = spooled.upload_hash
+        cached = await voice_record_repository.run_write(transcription_cache.lookup_upload, upload_hash, return_timestamps, asr_model)
+
+        if not cached:
+            # 讀取音頻文件，一次解碼並重新取樣為 16kHz 單聲道
+            audio = await asyncio.to_thread(ingest_audio_file, spooled.path)
+            logger.info("===== AUDIO INFO =====")
+            logger.info(f"Audio duration: {audio.duration_seconds} seconds")
+            audio_data = audio.samples
+            fingerprint = fingerprint_pcm(audio_data)
+            cached = await voice_record_repository.run_write(
+                transcription_cache.lookup_pcm, fingerprint, return_timestamps, upload_hash, asr_model
+            )
+
+        if cached:
+            logger.info(f"===== TRANSCRIPTION CACHE HIT (record {cached['voice_record_id']}) =====")
+            transcription = cached["transcription"]
+            duration = cached["duration"]
+            parent_id = cached["voice_record_id"]
+        else:
+            logger.info("===== CONVERTING AUDIO TO WAV FORMAT =====")
+
+            # 保存轉換後的音頻文件
+            converted_path = origin_path.replace(".wav", "_converted.wav")
+            audio.save_wav(converted_path)
+            logger.info(f"Converted audio saved to {converted_path}")
+            logger.info(f"return_timestamps: {return_timestamps}")
+
+            # 進行轉譯
+            transcription = await transcribe_audio_batched(audio_data, sampling_rate=16000, return_timestamps=return_timestamps, model=asr_model)
+            duration = audio.duration_seconds
+            parent_id = None  # 因為這是轉譯，不是衍生的檔案
         logger.info(f"transcription: {transcription}")
 
-        if transcription:
+        # 全為靜音時 VAD 會回傳空結果，仍視為成功
+        if transcription is not None:
             logger.info("===== TRANSCRIPTION SUCCESSFUL =====")
             if return_timestamps:
             # return_timestamps 為 True，transcription 是字典列表，提取文本
@@ -261,45 +276,39 @@ async def transcribe(
             with open(output_path, 'w', encoding='utf-8') as f:
                 f.write(transcription_str)
 
-            # 將轉譯結果存入資料庫
-            conn = create_connection()
-            if not conn:
-                raise HTTPException(status_code=500, detail="Database connection failed")
-
             # 準備記錄資料
             record = {
                 "filename": output_filename,
                 "filetype": "text/plain",
-                "duration": audio.duration_seconds,
+                "duration": duration,
                 "size": os.path.getsize(output_path),
                 "filepath": output_path,
                 "transcript": transcription_str,  # 轉譯文字
                 "language": "en",  # 根據需求設置語言
                 "status": "completed",
                 "error_message": None,
-                "parent_id": None  # 因為這是轉譯，不是衍生的檔案
+                "parent_id": parent_id  # 快取命中時關聯到原始轉譯記錄
             }
 
-            # 插入 voice_record 表格
-            voice_record_id = create_voice_record(conn, record)
+            # 在單一交易中插入 voice_record 表格並處理標籤（如果有）
+            tag_list = [tag.strip() for tag in tags.split(",") if tag.strip()] if tags else []
+            segments = transcription if return_timestamps else None
+            voice_record_id = await voice_record_repository.create(record, tag_list, segments)
             if not voice_record_id:
                 raise HTTPException(status_code=500, detail="Failed to insert voice record into database")
 
-            # 處理標籤（如果有）
-            if tags:
-                tag_list = [tag.strip() for tag in tags.split(",") if tag.strip()]
-                for tag in tag_list:
-                    tag_id = create_tag(conn, tag)
-                    if tag_id:
-                        associate_tag_with_voice_record(conn, voice_record_id, tag_id)
-
-            # 關閉資料庫連接
-            conn.close()
+            if not cached:
+                await voice_record_repository.run_write(
+                    transcription_cache.store, fingerprint, upload_hash, return_timestamps,
+                    voice_record_id, transcription, duration, asr_model
+                )
 
             return {"transcription": transcription, "record_id": voice_record_id}
         else:
             logger.warning("===== TRANSCRIPTION FAILED =====")
             raise ValueError("Transcription failed or returned unexpected format.")
+    except InferenceBusyError:
+        raise
     except MemoryError as me:
         logger.error(f"MemoryError during transcription: {me}")
         raise HTTPException(status_code=500, detail="Memory error: " + str(me))
@@ -310,19 +319,12 @@ async def transcribe(
         logger.error(f"Error during transcription: {e}")
 
         # 嘗試將狀態更新為錯誤
-        if conn and voice_record_id:
+        if voice_record_id:
             try:
-                cursor = conn.cursor()
-                cursor.execute(
-                    "UPDATE voice_record SET status = ?, error_message = ? WHERE id = ?",
-                    ("error", str(e), voice_record_id)
-                )
-                conn.commit()
+                await voice_record_repository.update_status(voice_record_id, "error", str(e))
                 logger.info(f"Updated voice record ID {voice_record_id} status to 'error'")
-            except sqlite3.Error as db_e:
-                logger.error(f"Error updating voice record status: {db_e}")
-            finally:
-                conn.close()
+            except DatabaseError as db_e:
+                logger.error(f"Error updating voice record status: {db_e.message}")
 
         # 嘗試刪除已生成的檔案（如果存在）
         if output_path and os.path.exists(output_path):
@@ -333,3 +335,93 @@ async def transcribe(
                 logger.error(f"Error removing corrupted transcription file: {file_e}")
 
         raise HTTPException(status_code=500, detail="Internal Server Error")
+    finally:
+        if spooled:
+            spooled.remove()
+
+@router.get("/batch-metrics")
+async def batch_metrics():
+    """回傳 micro-batching 排程器的 batch 填充率與排隊時間統計。"""
+    return get_batch_metrics()
+
+@router.post("/jobs", status_code=202)
+async def submit_transcription_job(
+    file: UploadFile = File(...),
+    return_timestamps: bool = Form(False),
+    tags: str = Form(None),
+    model: str = Form(None),  # 模型別名：large-v3、small、distil
+    priority: int = Form(0),  # 數字越大越先處理
+    x_tenant_id: str = Header(None),
+):
+    """
+    提交長音檔的非同步轉譯工作，立即回傳工作 ID。
+    由 services.job_worker 行程處理，可用 GET /jobs/{job_id} 查詢或 /jobs/{job_id}/events 訂閱進度。
+    """
+    asr_model = _resolve_asr_model(model, x_tenant_id)
+    spooled = await spool_upload(file, spool_dir=JOB_UPLOAD_DIR)
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    record = {
+        "filename": f"transcription_{timestamp}_{uuid.uuid4()}.txt",
+        "filetype": "text/plain",
+        "duration": 0,  # worker 完成後更新
+        "size": 0,
+        "filepath": "",  # worker 完成後更新
+        "transcript": "",
+        "language": "zh-TW",
+        "status": "pending",
+        "error_message": None,
+        "parent_id": None
+    }
+    tag_list = [tag.strip() for tag in tags.split(",") if tag.strip()] if tags else []
+    job = await voice_record_repository.run_write(
+        submit_job, record, tag_list, spooled.path, return_timestamps, asr_model, priority
+    )
+    if not job:
+        spooled.remove()
+        raise HTTPException(status_code=500, detail="Failed to create transcription job")
+    logger.info(f"Queued transcription job {job['id']} for voice record {job['voice_record_id']}")
+    return {"job_id": job["id"], "record_id": job["voice_record_id"], "status": job["status"]}
+
+def _job_response(job):
+    return {
+        "job_id": job["id"],
+        "record_id": job["voice_record_id"],
+        "status": job["status"],
+        "priority": job["priority"],
+        "model": job["model"],
+        "attempts": job["attempts"],
+        "max_attempts": job["max_attempts"],
+        "error_message": job["error_message"],
+        "result": job["result"],
+    }
+
+@router.get("/jobs/{job_id}")
+async def get_transcription_job(job_id: int):
+    """查詢非同步轉譯工作的狀態與結果。"""
+    job = await voice_record_repository.run_read(get_job, job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return _job_response(job)
+
+@router.get("/jobs/{job_id}/events")
+async def transcription_job_events(job_id: int):
+    """以 SSE 推送工作狀態，每次狀態或重試次數改變時送出一筆，到達 completed/error 後結束。"""
+    job = await voice_record_repository.run_read(get_job, job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+
+    async def event_generator():
+        current, last = job, None
+        while True:
+            state = (current["status"], current["attempts"])
+            if state != last:
+                last = state
+                yield f"data: {json.dumps(_job_response(current), ensure_ascii=False)}\n\n"
+            if current["status"] in TERMINAL_STATUSES:
+                return
+            await asyncio.sleep(JOB_EVENTS_POLL_S)
+            current = await voice_record_repository.run_read(get_job, job_id)
+            if current is None:
+                return
+
+    return StreamingResponse(event_generator(), media_type="text/event-stream")
@@ -1,14 +1,28 @@
 from fastapi import APIRouter, Form, HTTPException
 from pydub import AudioSegment
 from fastapi.responses import StreamingResponse
+from starlette.background import BackgroundTask
 import os
+import shutil
+import wave
 import uuid
 from datetime import datetime
 import logging
-from src.connectionDB import create_connection, create_voice_record, create_tag, associate_tag_with_voice_record
-from services.tts_service import generate_voice
+import asyncio
+from services.tts_service import (
+    generate_voice,
+    generate_voice_stream,
+    get_output_sample_rate,
+    to_pcm16,
+    wav_stream_header,
+    get_synthesis_cache_key,
+    tts_output_cache,
+    DEFAULT_SPEAKER_WAV,
+    TTS_MODEL_ID,
+)
+from services.inference_executor import InferenceBusyError, tts_pool
+from services.voice_record_repository import voice_record_repository
 import aiofiles # type: ignore
-import sqlite3
 
 router = APIRouter()
 logger = logging.getLogger(__name__)
@@ -28,7 +42,6 @@ async def generate_voice_endpoint(
     :param original_record_id: 轉譯記錄的 ID，用於關聯
     :return: 語音檔案的串流響應
     """
-    conn = None
     output_path = ""
     output_filename = ""
 
@@ -46,27 +59,35 @@ async def generate_voice_endpoint(
         output_dir = os.path.join("outVoiceFile", date_str)
         os.makedirs(output_dir, exist_ok=True)
         output_path = os.path.join(output_dir, output_filename)
-        pakora_path = os.path.join('pekora', "pekora.wav")
-
-        logger.info(f"Generating voice file at: {output_path}")
-
-        # 生成語音
-        await generate_voice(prompt, pakora_path, output_path)
+        pakora_path = DEFAULT_SPEAKER_WAV
+
+        # 查詢內容定址快取，命中時不需呼叫模型
+        cache_key = get_synthesis_cache_key(prompt, pakora_path)
+        cached = await voice_record_repository.run_write(tts_output_cache.lookup, cache_key)
+        if cached:
+            logger.info(f"TTS cache hit for key {cache_key}")
+            await asyncio.to_thread(shutil.copyfile, cached["filepath"], output_path)
+            file_size = cached["size"]
+            duration = cached["duration"]
+        else:
+            logger.info(f"Generating voice file at: {output_path}")
+
+            # 生成語音
+            await generate_voice(prompt, pakora_path, output_path)
+
+            # 獲取檔案資訊
+            file_size = os.path.getsize(output_path)
+            try:
+                audio = AudioSegment.from_file(output_path)
+                duration = audio.duration_seconds
+                logger.info(f"Audio duration: {duration} seconds, Size: {file_size} bytes")
+            except Exception as audio_e:
+                logger.error(f"Error processing audio file with pydub: {audio_e}")
+                raise HTTPException(status_code=500, detail="Error processing audio file")
 
-        # 獲取檔案資訊
-        file_size = os.path.getsize(output_path)
-        try:
-            audio = AudioSegment.from_file(output_path)
-            duration = audio.duration_seconds
-            logger.info(f"Audio duration: {duration} seconds, Size: {file_size} bytes")
-        except Exception as audio_e:
-            logger.error(f"Error processing audio file with pydub: {audio_e}")
-            raise HTTPException(status_code=500, detail="Error processing audio file")
-
-        # 將檔案資訊寫入資料庫
-        conn = create_connection()
-        if not conn:
-            raise HTTPException(status_code=500, detail="Database connection failed")
+            await voice_record_repository.run_write(
+                tts_output_cache.store, cache_key, output_path, duration, language="en", model_id=TTS_MODEL_ID
+            )
 
         # 準備記錄資料
         record = {
@@ -82,22 +103,12 @@ async def generate_voice_endpoint(
             "parent_id": original_record_id  # 關聯轉譯記錄
         }
 
-        # 插入 voice_record 表格
-        voice_record_id = create_voice_record(conn, record)
+        # 在單一交易中插入 voice_record 表格並處理標籤（如果有）
+        tag_list = [tag.strip() for tag in tags.split(",") if tag.strip()] if tags else []
+        voice_record_id = await voice_record_repository.create(record, tag_list)
         if not voice_record_id:
             raise HTTPException(status_code=500, detail="Failed to insert voice record into database")
 
-        # 處理標籤（如果有）
-        if tags:
-            tag_list = [tag.strip() for tag in tags.split(",") if tag.strip()]
-            for tag in tag_list:
-                tag_id = create_tag(conn, tag)
-                if tag_id:
-                    associate_tag_with_voice_record(conn, voice_record_id, tag_id)
-
-        # 關閉資料庫連接
-        conn.close()
-
         # 串流檔案
         async def iterfile():
             async with aiofiles.open(output_path, mode="rb") as f:
@@ -113,24 +124,11 @@ async def generate_voice_endpoint(
             media_type="audio/wav",
             headers={"Content-Disposition": f"attachment; filename={output_filename}"}
         )
+    except InferenceBusyError:
+        raise
     except Exception as e:
         logger.error(f"Error in generate_voice_endpoint: {e}")
 
-        # 嘗試將狀態更新為錯誤
-        if conn and output_filename:
-            try:
-                cursor = conn.cursor()
-                cursor.execute(
-                    "UPDATE voice_record SET status = ?, error_message = ? WHERE filename = ?",
-                    ("error", str(e), output_filename)
-                )
-                conn.commit()
-                logger.info(f"Updated voice record '{output_filename}' status to 'error'")
-            except sqlite3.Error as db_e:
-                logger.error(f"Error updating voice record status: {db_e}")
-            finally:
-                conn.close()
-
         # 嘗試刪除已生成的檔案（如果存在）
         if output_path and os.path.exists(output_path):
             try:
@@ -140,3 +138,105 @@ async def generate_voice_endpoint(
                 logger.error(f"Error removing corrupted audio file: {file_e}")
 
         raise HTTPException(status_code=500, detail="Internal Server Error")
+
+@router.post("/generate-voice-stream", response_model=None)
+async def generate_voice_stream_endpoint(
+    prompt: str = Form(...),
+    description: str = Form(...),
+    tags: str = Form(None),
+    original_record_id: int = Form(...),
+    format: str = Form("wav"),  # "wav" 或 "pcm"（16-bit little-endian 單聲道）
+):
+    """
+    逐句合成語音，每句完成後立即串流給客戶端。
+    串流結束後才在背景寫出完整的 WAV 檔並寫入資料庫。
+    """
+    if format not in ("wav", "pcm"):
+        raise HTTPException(status_code=400, detail="format must be 'wav' or 'pcm'")
+
+    # 串流開始後無法再回傳 503，因此在送出標頭前就為整段串流預留一個 TTS 名額，
+    # 直到串流結束（或用戶端斷線）才釋放
+    reservation = tts_pool.reserve()
+
+    logger.info(f"Received streaming prompt: {prompt}")
+    logger.info(f"Original Record ID: {original_record_id}")
+
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    unique_id = uuid.uuid4()
+    output_filename = f"parler_tts_{timestamp}_{unique_id}.wav"
+    date_str = datetime.now().strftime("%Y/%m/%d")
+    output_dir = os.path.join("outVoiceFile", date_str)
+    os.makedirs(output_dir, exist_ok=True)
+    output_path = os.path.join(output_dir, output_filename)
+    try:
+        # 模型可能仍在背景載入，避免在 event loop 上等待
+        sample_rate = await asyncio.to_thread(get_output_sample_rate)
+    except BaseException:
+        reservation.release()
+        raise
+
+    pcm_chunks = []
+    state = {"completed": False}
+
+    async def pcm_stream():
+        try:
+            if format == "wav":
+                yield wav_stream_header(sample_rate)
+            async for wav in generate_voice_stream(prompt, DEFAULT_SPEAKER_WAV, reservation=reservation):
+                pcm = to_pcm16(wav)
+                pcm_chunks.append(pcm)
+                yield pcm
+            state["completed"] = True
+        except Exception as e:
+            logger.error(f"Error during streaming voice generation: {e}")
+            raise e
+        finally:
+            reservation.release()
+
+    def write_wav():
+        with wave.open(output_path, "wb") as wav_file:
+            wav_file.setnchannels(1)
+            wav_file.setsampwidth(2)
+            wav_file.setframerate(sample_rate)
+            for pcm in pcm_chunks:
+                wav_file.writeframes(pcm)
+
+    async def finalize():
+        """將已串流的 PCM 寫成 WAV 檔並建立 voice_record。"""
+        # 串流在開始前就被中止時 pcm_stream 的 finally 不會執行，在此確保名額被釋放
+        reservation.release()
+        if not state["completed"]:
+            logger.warning(f"Streaming synthesis for {output_filename} did not complete; skipping record.")
+            return
+        try:
+            await asyncio.to_thread(write_wav)
+            frames = sum(len(pcm) for pcm in pcm_chunks) // 2
+            record = {
+                "filename": output_filename,
+                "filetype": "audio/wav",
+                "duration": frames / sample_rate,
+                "size": os.path.getsize(output_path),
+                "filepath": output_path,
+                "transcript": prompt,
+                "language": "zh-TW",
+                "status": "completed",
+                "error_message": None,
+                "parent_id": original_record_id
+            }
+            tag_list = [tag.strip() for tag in tags.split(",") if tag.strip()] if tags else []
+            voice_record_id = await voice_record_repository.create(record, tag_list)
+            if not voice_record_id:
+                raise RuntimeError("Failed to insert voice record into database")
+            logger.info(f"Finalized streamed voice file: {output_path}")
+        except Exception as e:
+            logger.error(f"Error finalizing streamed voice file: {e}")
+            if os.path.exists(output_path):
+                os.remove(output_path)
+
+    media_type = "audio/wav" if format == "wav" else f"audio/L16; rate={sample_rate}; channels=1"
+    return StreamingResponse(
+        pcm_stream(),
+        media_type=media_type,
+        headers={"Content-Disposition": f"attachment; filename={output_filename}"},
+        background=BackgroundTask(finalize),
+    )
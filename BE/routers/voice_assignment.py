@@ -1,8 +1,14 @@
 from fastapi import APIRouter, HTTPException
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, StreamingResponse
 from pydantic import BaseModel
-from services.voice_assignment import perform_pronunciation_assessment
-from pydub import AudioSegment
+from typing import List, Optional
+from services.voice_assignment import assess_pronunciation_async, AssessmentConfigError, AssessmentError
+from services.inference_executor import assessment_pool, InferenceBusyError
+from services.audio_ingest import prepare_pcm16_wav
+from services.assessment_store import link_assessment, lookup_assessment, store_assessment
+from services.voice_record_repository import voice_record_repository
+import asyncio
+import json
 import os
 import logging
 
@@ -12,60 +18,147 @@ logger = logging.getLogger(__name__)
 router = APIRouter()
 
 BASE_DIRECTORY = os.path.abspath('./originVoice/')
+# 批次評估：單次請求的項目上限、同時評估數，以及評估佇列已滿時的重試次數
+ASSESSMENT_BATCH_MAX_ITEMS = int(os.getenv('ASSESSMENT_BATCH_MAX_ITEMS', '200'))
+ASSESSMENT_BATCH_CONCURRENCY = int(os.getenv('ASSESSMENT_BATCH_CONCURRENCY', '4'))
+ASSESSMENT_BATCH_BUSY_RETRIES = int(os.getenv('ASSESSMENT_BATCH_BUSY_RETRIES', '5'))
 
 class PronunciationAssessmentRequest(BaseModel):
     reference_path: str
     reference_text: str
+    voice_record_id: Optional[int] = None  # 可選：把評估結果關聯到語音記錄
 
-@router.post("/analysis", response_class=JSONResponse)
-async def assess_pronunciation(request: PronunciationAssessmentRequest):
-    reference_path = request.reference_path
-    reference_text = request.reference_text
-    logger.debug(f"Received reference_path: {reference_path}")
-    logger.debug(f"Received reference_text: {reference_text}")
-
+class BatchPronunciationAssessmentRequest(BaseModel):
+    items: List[PronunciationAssessmentRequest]
 
+def _resolve_reference_path(reference_path: str) -> str:
     normalized_path = os.path.normpath(os.path.join(BASE_DIRECTORY, reference_path))
     logger.debug(f"Normalized path: {normalized_path}")
 
-
     if not normalized_path.startswith(BASE_DIRECTORY):
         logger.warning("Invalid reference path attempted.")
         raise HTTPException(status_code=400, detail="Invalid reference path.")
 
     realpath = normalized_path
 
-
     if not os.path.isfile(realpath) or not realpath.lower().endswith('.wav'):
         logger.warning(f"File does not exist or is not a WAV file: {realpath}")
         raise HTTPException(status_code=400, detail="Specified file does not exist or is not a WAV file.")
-
-
-    temp_audio_path = "temp_audio.wav"
+    return realpath
+
+def _stat_reference(reference_path: str):
+    """解析參考音檔並取得 (實際路徑, 相對於 BASE_DIRECTORY 的路徑, os.stat 結果)；會存取檔案系統，需在執行緒中呼叫。"""
+    realpath = _resolve_reference_path(reference_path)
+    return realpath, os.path.relpath(realpath, BASE_DIRECTORY), os.stat(realpath)
+
+async def _assess(request: PronunciationAssessmentRequest):
+    """
+    執行單一評估並回傳 (結果, 是否來自資料庫)。
+    同一音檔（大小與修改時間未變）與參考文字的評估結果直接從資料庫讀取。
+    """
+    reference_text = request.reference_text
+    realpath, stored_path, stat = await asyncio.to_thread(_stat_reference, request.reference_path)
+    stored = await voice_record_repository.run_read(
+        lookup_assessment, stored_path, reference_text, stat.st_size, stat.st_mtime
+    )
+    if stored is not None:
+        logger.debug(f"Reusing stored pronunciation assessment for {stored_path}")
+        if request.voice_record_id is not None:
+            await voice_record_repository.run_write(
+                link_assessment, stored_path, reference_text, request.voice_record_id
+            )
+        return stored, True
+
+    # 佇列已滿時在轉換音檔之前就拒絕
+    assessment_pool.ensure_capacity()
+
+    # 已是 16kHz 單聲道 PCM 的 WAV 直接送進辨識器，其餘轉換到本次請求專用的暫存檔
     try:
-    
-        audio = AudioSegment.from_file(realpath)
-    
-        audio.export(temp_audio_path, format="wav")
-        logger.debug(f"Exported temporary audio file to {temp_audio_path}")
+        prepared = await asyncio.to_thread(prepare_pcm16_wav, realpath)
+        if prepared.temporary:
+            logger.debug(f"Converted audio to temporary file {prepared.path}")
     except Exception as e:
         logger.error(f"Failed to convert audio file: {e}")
         raise HTTPException(status_code=500, detail=f"Failed to process audio file: {e}")
 
 
     try:
-        assessment_result = perform_pronunciation_assessment(temp_audio_path, reference_text)
+        # 辨識器以回呼完成評估，不佔用執行緒；同時進行的評估數由 assessment_pool 限制
+        async with assessment_pool.slot():
+            assessment_result = await assess_pronunciation_async(prepared.path, reference_text)
         logger.debug("Pronunciation assessment completed successfully.")
+    except InferenceBusyError:
+        raise
+    except asyncio.TimeoutError:
+        logger.error("Pronunciation assessment timed out.")
+        raise HTTPException(status_code=504, detail="Pronunciation assessment timed out.")
+    except AssessmentConfigError as e:
+        logger.error(f"Pronunciation assessment is not configured: {e}")
+        raise HTTPException(status_code=503, detail="Pronunciation assessment is not configured.")
+    except AssessmentError as e:
+        logger.error(f"Pronunciation assessment failed: {e}")
+        raise HTTPException(status_code=502, detail="Pronunciation assessment failed.")
     except Exception as e:
         logger.error(f"Pronunciation assessment failed: {e}")
         raise HTTPException(status_code=500, detail="Pronunciation assessment failed.")
     finally:
-    
-        if os.path.exists(temp_audio_path):
-            try:
-                os.remove(temp_audio_path)
-                logger.debug(f"Removed temporary audio file: {temp_audio_path}")
-            except Exception as e:
-                logger.warning(f"Failed to remove temporary audio file: {e}")
+        try:
+            prepared.remove()
+        except Exception as e:
+            logger.warning(f"Failed to remove temporary audio file: {e}")
 
+    await voice_record_repository.run_write(
+        store_assessment, stored_path, reference_text, stat.st_size, stat.st_mtime,
+        assessment_result, request.voice_record_id
+    )
+    return assessment_result, False
+
+@router.post("/analysis", response_class=JSONResponse)
+async def assess_pronunciation(request: PronunciationAssessmentRequest):
+    logger.debug(f"Received reference_path: {request.reference_path}")
+    logger.debug(f"Received reference_text: {request.reference_text}")
+    assessment_result, _ = await _assess(request)
     return JSONResponse(content=assessment_result)
+
+async def _assess_batch_item(index: int, item: PronunciationAssessmentRequest, semaphore: asyncio.Semaphore) -> dict:
+    entry = {"index": index, "reference_path": item.reference_path}
+    async with semaphore:
+        for attempt in range(ASSESSMENT_BATCH_BUSY_RETRIES + 1):
+            try:
+                result, stored = await _assess(item)
+                return {**entry, "status": "completed", "stored": stored, "result": result}
+            except InferenceBusyError as e:
+                # 其他請求佔滿評估佇列時稍後重試，而不是讓整個班級的項目直接失敗
+                if attempt == ASSESSMENT_BATCH_BUSY_RETRIES:
+                    return {**entry, "status": "error", "status_code": 503, "detail": e.message}
+                await asyncio.sleep(e.retry_after)
+            except HTTPException as e:
+                return {**entry, "status": "error", "status_code": e.status_code, "detail": e.detail}
+            except Exception as e:
+                logger.error(f"Batch pronunciation assessment item {index} failed: {e}")
+                return {**entry, "status": "error", "status_code": 500, "detail": "Pronunciation assessment failed."}
+
+@router.post("/batch")
+async def assess_pronunciation_batch(request: BatchPronunciationAssessmentRequest):
+    """
+    一次評估多組 (reference_path, reference_text)，最多同時進行 ASSESSMENT_BATCH_CONCURRENCY 組，
+    每組完成時立即以 NDJSON 送出一行（依完成順序，以 index 對應請求中的位置）。
+    """
+    if len(request.items) > ASSESSMENT_BATCH_MAX_ITEMS:
+        raise HTTPException(status_code=400, detail=f"At most {ASSESSMENT_BATCH_MAX_ITEMS} items per batch.")
+
+    async def ndjson_stream():
+        semaphore = asyncio.Semaphore(ASSESSMENT_BATCH_CONCURRENCY)
+        tasks = [
+            asyncio.create_task(_assess_batch_item(index, item, semaphore))
+            for index, item in enumerate(request.items)
+        ]
+        try:
+            for finished in asyncio.as_completed(tasks):
+                yield json.dumps(await finished, ensure_ascii=False) + "\n"
+        finally:
+            # 用戶端中途斷線時取消尚未完成的評估
+            for task in tasks:
+                task.cancel()
+
+    return StreamingResponse(ndjson_stream(), media_type="application/x-ndjson")
@@ -1,9 +1,15 @@
-from fastapi import APIRouter, Depends, HTTPException
-from typing import List
+from fastapi import APIRouter, HTTPException, Query
+from fastapi.responses import JSONResponse, StreamingResponse
+from typing import List, Optional
+import json
 import logging
 from pydantic import BaseModel
-from utils.dependencies import get_db, DatabaseError
-import sqlite3
+from services.voice_record_repository import (
+    voice_record_repository,
+    build_list_query,
+    DEFAULT_PAGE_SIZE,
+    MAX_PAGE_SIZE,
+)
 
 logger = logging.getLogger(__name__)
 
@@ -24,29 +30,111 @@ class VoiceRecord(BaseModel):
     error_message: str = None
     parent_id: int = None
 
-def fetch_all_records(conn: sqlite3.Connection, query: str, params: tuple = ()) -> List[dict]:
-    try:
-        cursor = conn.cursor()
-        cursor.execute(query, params)
-        rows = cursor.fetchall()
-        column_names = [description[0] for description in cursor.description]
-        records = [dict(zip(column_names, row)) for row in rows]
-        return records
-    except sqlite3.Error as e:
-        logger.error(f"Database query failed: {e}")
-        raise DatabaseError("Database query failed")
-
 @router.get("/all", response_model=List[VoiceRecord])
-def get_all_voice_records(conn: sqlite3.Connection = Depends(get_db)):
+async def get_all_voice_records():
     logger.info("Fetching all voice records.")
-    records = fetch_all_records(conn, "SELECT * FROM voice_record")
+    records = await voice_record_repository.list_all()
     return records
 
+def _parse_fields(fields: Optional[str]) -> Optional[List[str]]:
+    if not fields:
+        return None
+    return [name.strip() for name in fields.split(",") if name.strip()]
+
+
+def _validate_list_params(fields: Optional[List[str]], cursor: Optional[str]):
+    """在開始查詢（或串流）之前檢查 fields 與 cursor，錯誤時回傳 400。"""
+    try:
+        build_list_query(1, cursor, fields)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@router.get("")
+async def list_voice_records(
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    status: Optional[str] = None,
+    tag: Optional[str] = None,
+    language: Optional[str] = None,
+    parent_id: Optional[int] = None,
+    fields: Optional[str] = Query(None, description="逗號分隔的欄位；預設不含 transcript"),
+):
+    """
+    以 (createtime, id) keyset 分頁列出語音記錄，由新到舊排序。
+    回傳 {"items": [...], "next_cursor": "..."}，把 next_cursor 帶回 cursor 參數即可取得下一頁。
+    """
+    field_list = _parse_fields(fields)
+    _validate_list_params(field_list, cursor)
+    records, next_cursor = await voice_record_repository.list_page(
+        limit, cursor, field_list, status=status, tag=tag, language=language, parent_id=parent_id
+    )
+    # 資料列直接來自 SQLite，略過逐筆的 Pydantic 驗證
+    return JSONResponse({"items": records, "next_cursor": next_cursor})
+
+
+@router.get("/search")
+async def search_voice_records(
+    q: str = Query(..., min_length=1, description="搜尋文字"),
+    tags: Optional[str] = Query(None, description="逗號分隔的標籤，記錄需包含全部標籤"),
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    offset: int = Query(0, ge=0),
+    raw: bool = Query(False, description="直接使用 FTS5 查詢語法"),
+):
+    """
+    全文搜尋逐字稿，依 bm25 相關度排序並附上標記命中文字的 snippet。
+    trigram 分詞器下至少需要一個 3 字元以上的詞，只有短詞（例如「會議」）時回傳 400。
+    回傳 {"items": [...], "next_offset": n}。
+    """
+    tag_list = [tag.strip() for tag in tags.split(",") if tag.strip()] if tags else []
+    try:
+        results, next_offset = await voice_record_repository.search(q, limit, offset, tag_list, raw)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return JSONResponse({"items": results, "next_offset": next_offset})
+
+
+@router.get("/export")
+async def export_voice_records(
+    status: Optional[str] = None,
+    tag: Optional[str] = None,
+    language: Optional[str] = None,
+    parent_id: Optional[int] = None,
+    fields: Optional[str] = Query(None, description="逗號分隔的欄位；預設不含 transcript"),
+):
+    """以 NDJSON 串流匯出符合條件的所有記錄，每行一筆，逐頁讀取資料庫。"""
+    field_list = _parse_fields(fields)
+    _validate_list_params(field_list, None)
+
+    async def ndjson_stream():
+        async for record in voice_record_repository.iter_records(
+            fields=field_list, status=status, tag=tag, language=language, parent_id=parent_id
+        ):
+            yield json.dumps(record, ensure_ascii=False) + "\n"
+
+    return StreamingResponse(ndjson_stream(), media_type="application/x-ndjson")
+
+
 @router.get("/{record_id}", response_model=VoiceRecord)
-def get_voice_record(record_id: int, conn: sqlite3.Connection = Depends(get_db)):
+async def get_voice_record(record_id: int):
     logger.info(f"Fetching voice record with ID: {record_id}")
-    records = fetch_all_records(conn, "SELECT * FROM voice_record WHERE id = ?", (record_id,))
-    if not records:
+    record = await voice_record_repository.get(record_id)
+    if not record:
         logger.warning(f"Voice record with ID {record_id} not found.")
         raise HTTPException(status_code=404, detail="Voice record not found")
-    return records[0]
+    return record
+
+@router.get("/{record_id}/segments")
+async def get_voice_record_segments(
+    record_id: int,
+    start: float = Query(0.0, ge=0, description="時間區間起點（秒）"),
+    end: Optional[float] = Query(None, ge=0, description="時間區間終點（秒），省略時到結尾"),
+):
+    """回傳與 [start, end) 重疊的逐字稿片段，播放器或編輯器只需取得可見範圍。"""
+    if end is not None and end <= start:
+        raise HTTPException(status_code=400, detail="end must be greater than start")
+    segments = await voice_record_repository.get_segments(record_id, start, end)
+    # 只有查無片段時才需要區分「記錄不存在」與「區間內沒有片段」
+    if not segments and not await voice_record_repository.exists(record_id):
+        raise HTTPException(status_code=404, detail="Voice record not found")
+    return JSONResponse({"record_id": record_id, "segments": segments})
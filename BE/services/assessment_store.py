@@ -0,0 +1,71 @@
+import hashlib
+import json
+import logging
+import sqlite3
+import time
+from typing import Any, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+_SCORE_FIELDS = ("pronunciation_score", "accuracy_score", "completeness_score", "fluency_score", "prosody_score")
+
+
+def text_hash(reference_text: str) -> str:
+    return hashlib.sha256(reference_text.encode("utf-8")).hexdigest()
+
+
+def lookup_assessment(conn: sqlite3.Connection, reference_path: str, reference_text: str,
+                      audio_size: int, audio_mtime: float) -> Optional[Dict[str, Any]]:
+    """
+    查詢同一音檔與參考文字的既有評估結果。音檔大小或修改時間不同時視為未命中。
+    :return: 評估結果字典，未命中時為 None
+    """
+    try:
+        cursor = conn.execute(
+            '''
+            SELECT result, audio_size, audio_mtime FROM pronunciation_assessment
+            WHERE reference_path = ? AND text_hash = ?
+            ''',
+            (reference_path, text_hash(reference_text))
+        )
+        row = cursor.fetchone()
+    except sqlite3.Error as e:
+        logger.error(f"Error looking up pronunciation assessment: {e}")
+        return None
+    if not row or row[1] != audio_size or row[2] != audio_mtime:
+        return None
+    return json.loads(row[0])
+
+
+def link_assessment(conn: sqlite3.Connection, reference_path: str, reference_text: str, voice_record_id: int):
+    """把既有的評估結果關聯到新的語音記錄（重複使用資料庫中的結果時呼叫）。"""
+    try:
+        with conn:
+            conn.execute(
+                "UPDATE pronunciation_assessment SET voice_record_id = ? WHERE reference_path = ? AND text_hash = ?",
+                (voice_record_id, reference_path, text_hash(reference_text))
+            )
+    except sqlite3.Error as e:
+        logger.error(f"Error linking pronunciation assessment: {e}")
+
+
+def store_assessment(conn: sqlite3.Connection, reference_path: str, reference_text: str, audio_size: int,
+                     audio_mtime: float, result: Dict[str, Any], voice_record_id: Optional[int] = None):
+    """儲存評估結果；同一音檔與參考文字只保留最新的一筆。"""
+    try:
+        with conn:
+            conn.execute(
+                f'''
+                INSERT OR REPLACE INTO pronunciation_assessment
+                    (voice_record_id, reference_path, text_hash, reference_text, audio_size, audio_mtime,
+                     {", ".join(_SCORE_FIELDS)}, result, created_at)
+                VALUES (?, ?, ?, ?, ?, ?, {", ".join("?" for _ in _SCORE_FIELDS)}, ?, ?)
+                ''',
+                (
+                    voice_record_id, reference_path, text_hash(reference_text), reference_text, audio_size,
+                    audio_mtime, *(result.get(field) for field in _SCORE_FIELDS),
+                    json.dumps(result, ensure_ascii=False), time.time(),
+                )
+            )
+    except sqlite3.Error as e:
+        logger.error(f"Error storing pronunciation assessment: {e}")
@@ -0,0 +1,238 @@
+import asyncio
+import hashlib
+import logging
+import os
+import shutil
+import subprocess
+import tempfile
+import wave
+from dataclasses import dataclass
+
+import aiofiles # type: ignore
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+TARGET_SAMPLE_RATE = 16000
+UPLOAD_CHUNK_BYTES = 1024 * 1024
+PCM_FRAME_SECONDS = float(os.getenv('PCM_FRAME_SECONDS', '10'))
+
+
+class AudioDecodeError(Exception):
+    def __init__(self, message: str):
+        self.message = message
+        super().__init__(message)
+
+
+@dataclass
+class IngestedAudio:
+    """
+    解碼後的音訊。pcm 是 ffmpeg 輸出的 16-bit PCM 原始位元組，
+    samples 是由同一份 PCM 轉換而來的 float32 陣列，供模型使用。
+    """
+    pcm: bytes
+    samples: np.ndarray
+    sample_rate: int = TARGET_SAMPLE_RATE
+
+    @property
+    def duration_seconds(self) -> float:
+        return len(self.samples) / self.sample_rate
+
+    def save_wav(self, path: str):
+        """直接把 PCM 位元組寫成 WAV，不需再經過一次轉換。"""
+        write_wav_pcm16(path, self.pcm, self.sample_rate)
+
+
+def _ffmpeg_command(source: str, sample_rate: int):
+    ffmpeg = shutil.which("ffmpeg")
+    if ffmpeg is None:
+        raise AudioDecodeError("ffmpeg is not installed")
+    return [
+        ffmpeg, "-nostdin", "-hide_banner", "-loglevel", "error",
+        "-i", source,
+        "-f", "s16le", "-acodec", "pcm_s16le",
+        "-ac", "1", "-ar", str(sample_rate),
+        "pipe:1",
+    ]
+
+
+@dataclass
+class SpooledUpload:
+    path: str
+    upload_hash: str
+    size: int
+
+    def remove(self):
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+
+async def spool_upload(upload, spool_dir: str = None, chunk_size: int = UPLOAD_CHUNK_BYTES) -> SpooledUpload:
+    """
+    以固定大小的區塊把上傳檔案寫入暫存檔，同時計算 SHA-256，
+    記憶體用量不隨檔案大小增加。
+    """
+    spool_dir = spool_dir or os.getenv('UPLOAD_SPOOL_DIR') or tempfile.gettempdir()
+    os.makedirs(spool_dir, exist_ok=True)
+    suffix = os.path.splitext(upload.filename or "")[1]
+    fd, path = tempfile.mkstemp(prefix="upload_", suffix=suffix, dir=spool_dir)
+    os.close(fd)
+    digest = hashlib.sha256()
+    size = 0
+    try:
+        async with aiofiles.open(path, mode="wb") as f:
+            while True:
+                chunk = await upload.read(chunk_size)
+                if not chunk:
+                    break
+                digest.update(chunk)
+                size += len(chunk)
+                await f.write(chunk)
+    except Exception:
+        os.remove(path)
+        raise
+    logger.info(f"Spooled upload {upload.filename} ({size} bytes) to {path}")
+    return SpooledUpload(path=path, upload_hash=digest.hexdigest(), size=size)
+
+
+def is_pcm16_mono_wav(path: str, sample_rate: int = TARGET_SAMPLE_RATE) -> bool:
+    """只讀 WAV 標頭判斷檔案是否已是指定取樣率的單聲道 16-bit PCM，不解碼音訊內容。"""
+    try:
+        with wave.open(path, "rb") as wav_file:
+            return (
+                wav_file.getcomptype() == "NONE"
+                and wav_file.getnchannels() == 1
+                and wav_file.getsampwidth() == 2
+                and wav_file.getframerate() == sample_rate
+            )
+    except (wave.Error, EOFError, OSError):
+        # 非 PCM 編碼（例如 WAVE_FORMAT_EXTENSIBLE、IEEE float）或標頭損毀時交給 ffmpeg 轉換
+        return False
+
+
+@dataclass
+class PreparedWav:
+    """可直接送進辨識器的 WAV；temporary 為 True 時是本次請求專用的轉換檔，用完需刪除。"""
+    path: str
+    temporary: bool = False
+
+    def remove(self):
+        if self.temporary and os.path.exists(self.path):
+            os.remove(self.path)
+
+
+def prepare_pcm16_wav(path: str, sample_rate: int = TARGET_SAMPLE_RATE) -> PreparedWav:
+    """
+    已符合格式的 WAV 直接沿用原檔；否則以 ffmpeg 轉成 16-bit 單聲道，
+    寫到每個請求各自的暫存檔，並行請求不會互相覆寫。
+    """
+    if is_pcm16_mono_wav(path, sample_rate):
+        return PreparedWav(path)
+    fd, temp_path = tempfile.mkstemp(prefix="converted_", suffix=".wav")
+    os.close(fd)
+    try:
+        ingest_audio_file(path, sample_rate).save_wav(temp_path)
+    except Exception:
+        os.remove(temp_path)
+        raise
+    return PreparedWav(temp_path, temporary=True)
+
+
+def pcm16_to_float32(pcm, out: np.ndarray = None) -> np.ndarray:
+    """
+    將 16-bit PCM 轉成 [-1, 1) 的 float32。輸入以 np.frombuffer 建立 view，
+    結果直接寫入預先配置的 out，不產生額外的中間陣列。
+    """
+    view = np.frombuffer(pcm, dtype="<i2")
+    if out is None:
+        out = np.empty(len(view), dtype=np.float32)
+    np.multiply(view, np.float32(1 / 32768.0), out=out, dtype=np.float32)
+    return out
+
+
+def write_wav_pcm16(path: str, pcm, sample_rate: int = TARGET_SAMPLE_RATE, channels: int = 1):
+    with wave.open(path, "wb") as wav_file:
+        wav_file.setnchannels(channels)
+        wav_file.setsampwidth(2)
+        wav_file.setframerate(sample_rate)
+        wav_file.writeframes(pcm)
+
+
+def ingest_audio_file(path: str, sample_rate: int = TARGET_SAMPLE_RATE) -> IngestedAudio:
+    """解碼磁碟上的音訊檔，ffmpeg 直接讀檔，不需先把上傳內容載入記憶體。"""
+    proc = subprocess.run(_ffmpeg_command(path, sample_rate), capture_output=True)
+    if proc.returncode != 0:
+        raise AudioDecodeError(f"ffmpeg failed to decode audio: {proc.stderr.decode(errors='ignore').strip()}")
+    pcm = proc.stdout
+    samples = pcm16_to_float32(pcm)
+    logger.info(f"Decoded {len(samples) / sample_rate:.2f} seconds of audio at {sample_rate} Hz")
+    return IngestedAudio(pcm=pcm, samples=samples, sample_rate=sample_rate)
+
+
+class PcmFrameStream:
+    """
+    以固定長度的 frame 逐步解碼音訊檔，作為 async iterator 產生 float32 樣本。
+    若提供 wav_path，會同時把 PCM 寫入 WAV 檔。整個過程只保留一個 frame 在記憶體中。
+    """
+
+    def __init__(self, path: str, wav_path: str = None, sample_rate: int = TARGET_SAMPLE_RATE,
+                 frame_seconds: float = PCM_FRAME_SECONDS):
+        self.path = path
+        self.wav_path = wav_path
+        self.sample_rate = sample_rate
+        self.frame_bytes = int(frame_seconds * sample_rate) * 2
+        self.samples_read = 0
+        self._proc = None
+        self._wav_file = None
+
+    @property
+    def duration_seconds(self) -> float:
+        return self.samples_read / self.sample_rate
+
+    def _open(self):
+        self._proc = subprocess.Popen(
+            _ffmpeg_command(self.path, self.sample_rate),
+            stdin=subprocess.DEVNULL,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+        )
+        if self.wav_path:
+            self._wav_file = wave.open(self.wav_path, "wb")
+            self._wav_file.setnchannels(1)
+            self._wav_file.setsampwidth(2)
+            self._wav_file.setframerate(self.sample_rate)
+
+    def _read_frame(self):
+        pcm = self._proc.stdout.read(self.frame_bytes)
+        if not pcm:
+            returncode = self._proc.wait()
+            if returncode != 0:
+                stderr = self._proc.stderr.read().decode(errors="ignore").strip()
+                raise AudioDecodeError(f"ffmpeg failed to decode audio: {stderr}")
+            return None
+        if len(pcm) % 2:
+            # 保持 16-bit 對齊
+            pcm += self._proc.stdout.read(1)
+        if self._wav_file:
+            self._wav_file.writeframes(pcm)
+        self.samples_read += len(pcm) // 2
+        return pcm16_to_float32(pcm)
+
+    def close(self):
+        if self._proc and self._proc.poll() is None:
+            self._proc.kill()
+            self._proc.wait()
+        if self._wav_file:
+            self._wav_file.close()
+            self._wav_file = None
+
+    async def __aiter__(self):
+        self._open()
+        try:
+            while True:
+                frame = await asyncio.to_thread(self._read_frame)
+                if frame is None:
+                    break
+                yield frame
+        finally:
+            self.close()
@@ -0,0 +1,262 @@
+import asyncio
+import logging
+import math
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Any, Callable, Deque, List, Optional, Set
+
+from services.inference_executor import InferencePool
+
+logger = logging.getLogger(__name__)
+
+
+class SchedulerStoppedError(Exception):
+    """排程器已停止，尚未完成的請求不會再被處理。"""
+
+
+@dataclass
+class _BatchItem:
+    audio_data: Any
+    sampling_rate: int
+    return_timestamps: bool
+    chunks: int
+    future: asyncio.Future
+    model: Optional[str] = None
+    enqueued_at: float = field(default_factory=time.perf_counter)
+
+    @property
+    def key(self):
+        # 不同模型無法在同一個 forward 中執行，依模型分組
+        return (self.model, self.sampling_rate, self.return_timestamps)
+
+
+class BatchMetrics:
+    """記錄 batch 填充率與排隊時間，供調整吞吐量與 p99 延遲之間的平衡。"""
+
+    def __init__(self, window: int = 1000):
+        self.batches = 0
+        self.requests = 0
+        self.chunks = 0
+        self.errors = 0
+        self._fill_ratios: Deque[float] = deque(maxlen=window)
+        self._queue_waits_ms: Deque[float] = deque(maxlen=window)
+        self._batch_latency_ms: Deque[float] = deque(maxlen=window)
+
+    def record_batch(self, items: List[_BatchItem], chunks: int, max_batch_size: int, started_at: float, finished_at: float):
+        self.batches += 1
+        self.requests += len(items)
+        self.chunks += chunks
+        self._fill_ratios.append(min(chunks / max_batch_size, 1.0))
+        self._batch_latency_ms.append((finished_at - started_at) * 1000)
+        for item in items:
+            self._queue_waits_ms.append((started_at - item.enqueued_at) * 1000)
+
+    @staticmethod
+    def _percentile(values, q):
+        if not values:
+            return 0.0
+        ordered = sorted(values)
+        index = min(len(ordered) - 1, max(0, math.ceil(q * len(ordered)) - 1))
+        return ordered[index]
+
+    def snapshot(self) -> dict:
+        fills = list(self._fill_ratios)
+        waits = list(self._queue_waits_ms)
+        latencies = list(self._batch_latency_ms)
+        return {
+            "batches": self.batches,
+            "requests": self.requests,
+            "chunks": self.chunks,
+            "errors": self.errors,
+            "avg_requests_per_batch": self.requests / self.batches if self.batches else 0.0,
+            "avg_batch_fill": sum(fills) / len(fills) if fills else 0.0,
+            "queue_wait_ms_p50": self._percentile(waits, 0.5),
+            "queue_wait_ms_p99": self._percentile(waits, 0.99),
+            "batch_latency_ms_p50": self._percentile(latencies, 0.5),
+            "batch_latency_ms_p99": self._percentile(latencies, 0.99),
+        }
+
+
+class TranscriptionBatchScheduler:
+    """
+    動態 micro-batching：把同時進來的轉譯請求合併成一個 batch 送進 pipeline。
+    batch 在累積到 max_batch_size 個 30 秒 chunk，或第一個請求等待超過
+    max_wait_ms 時送出；每個請求的結果會寫回它自己的 future。
+    batch 在 pool 的執行緒上執行，同時最多 pool.max_workers 個 batch。
+    """
+
+    def __init__(
+        self,
+        transcribe_batch_fn: Callable,
+        pool: InferencePool,
+        max_batch_size: int = 16,
+        max_wait_ms: float = 50,
+        chunk_length_s: float = 30,
+    ):
+        self._transcribe_batch_fn = transcribe_batch_fn
+        self._pool = pool
+        self.max_batch_size = max_batch_size
+        self.max_wait_ms = max_wait_ms
+        self.chunk_length_s = chunk_length_s
+        self.metrics = BatchMetrics()
+        self._queue: Optional[asyncio.Queue] = None
+        self._pending: Deque[_BatchItem] = deque()
+        self._worker: Optional[asyncio.Task] = None
+        self._batch_tasks: Set[asyncio.Task] = set()
+        self._queued = 0
+
+    def _ensure_worker(self):
+        if self._worker is None or self._worker.done():
+            self._queue = self._queue or asyncio.Queue()
+            self._worker = asyncio.get_running_loop().create_task(self._run())
+
+    def _count_chunks(self, audio_data, sampling_rate) -> int:
+        samples_per_chunk = int(self.chunk_length_s * sampling_rate)
+        return max(1, math.ceil(len(audio_data) / samples_per_chunk))
+
+    def check_capacity(self):
+        """佇列已滿時拋出 InferenceBusyError。"""
+        self._pool.ensure_capacity(self._queued)
+
+    async def submit(self, audio_data, sampling_rate: int, return_timestamps: bool = False, model: Optional[str] = None):
+        """將一段音訊排入佇列，等待所屬 batch 完成後回傳轉譯結果。"""
+        self.check_capacity()
+        self._ensure_worker()
+        future = asyncio.get_running_loop().create_future()
+        item = _BatchItem(
+            audio_data=audio_data,
+            sampling_rate=sampling_rate,
+            return_timestamps=return_timestamps,
+            chunks=self._count_chunks(audio_data, sampling_rate),
+            future=future,
+            model=model,
+        )
+        self._queued += 1
+        await self._queue.put(item)
+        return await future
+
+    async def _collect(self) -> List[_BatchItem]:
+        first = self._pending.popleft() if self._pending else await self._queue.get()
+        batch = [first]
+        chunks = first.chunks
+
+        # 先從被擱置的請求中取出相同參數的項目
+        for item in list(self._pending):
+            if chunks >= self.max_batch_size:
+                break
+            if item.key == first.key:
+                self._pending.remove(item)
+                batch.append(item)
+                chunks += item.chunks
+
+        deadline = first.enqueued_at + self.max_wait_ms / 1000
+        while chunks < self.max_batch_size:
+            timeout = deadline - time.perf_counter()
+            if timeout <= 0:
+                break
+            try:
+                item = await asyncio.wait_for(self._queue.get(), timeout)
+            except asyncio.TimeoutError:
+                break
+            except asyncio.CancelledError:
+                # 停止時已取出的項目放回擱置區，由 stop() 一併結束
+                self._pending.extendleft(reversed(batch))
+                raise
+            if item.key != first.key:
+                # 參數不同的請求留待下一個 batch
+                self._pending.append(item)
+                continue
+            batch.append(item)
+            chunks += item.chunks
+        return batch
+
+    async def _run(self):
+        slots = asyncio.Semaphore(self._pool.max_workers)
+        while True:
+            await slots.acquire()
+            try:
+                batch = await self._collect()
+            except asyncio.CancelledError:
+                slots.release()
+                raise
+            self._queued -= len(batch)
+            batch = [item for item in batch if not item.future.cancelled()]
+            if not batch:
+                slots.release()
+                continue
+            task = asyncio.get_running_loop().create_task(self._execute(batch))
+            self._batch_tasks.add(task)
+
+            def _on_done(finished, slots=slots):
+                self._batch_tasks.discard(finished)
+                slots.release()
+
+            task.add_done_callback(_on_done)
+
+    async def _execute(self, batch: List[_BatchItem]):
+        chunks = sum(item.chunks for item in batch)
+        model, sampling_rate, return_timestamps = batch[0].key
+        started_at = time.perf_counter()
+        try:
+            results = await self._pool.run(
+                self._transcribe_batch_fn,
+                [item.audio_data for item in batch],
+                sampling_rate,
+                return_timestamps,
+                self.max_batch_size,
+                model,
+            )
+        except asyncio.CancelledError:
+            self._fail(batch, SchedulerStoppedError("Transcription batch scheduler stopped"))
+            raise
+        except Exception as e:
+            logger.error(f"Error during batched transcription: {e}")
+            self.metrics.errors += len(batch)
+            self._fail(batch, e)
+            return
+        finished_at = time.perf_counter()
+        self.metrics.record_batch(batch, chunks, self.max_batch_size, started_at, finished_at)
+        logger.info(
+            f"Transcribed batch of {len(batch)} requests ({chunks} chunks, model {model or 'default'}) "
+            f"in {(finished_at - started_at) * 1000:.0f} ms"
+        )
+        for item, result in zip(batch, results):
+            if item.future.done():
+                continue
+            if isinstance(result, Exception):
+                self.metrics.errors += 1
+                item.future.set_exception(result)
+            else:
+                item.future.set_result(result)
+
+    @staticmethod
+    def _fail(items, error: Exception):
+        for item in items:
+            if not item.future.done():
+                item.future.set_exception(error)
+
+    async def stop(self):
+        """
+        停止排程器：取消 worker 與執行中的 batch，佇列與擱置區中尚未處理的請求
+        一律以 SchedulerStoppedError 結束，等待中的 submit() 不會永遠掛住。
+        """
+        if self._worker is not None:
+            self._worker.cancel()
+            try:
+                await self._worker
+            except asyncio.CancelledError:
+                pass
+            self._worker = None
+        tasks = list(self._batch_tasks)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+        error = SchedulerStoppedError("Transcription batch scheduler stopped")
+        self._fail(self._pending, error)
+        self._pending.clear()
+        if self._queue is not None:
+            while not self._queue.empty():
+                self._fail([self._queue.get_nowait()], error)
+        self._queued = 0
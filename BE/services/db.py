@@ -1,7 +1,7 @@
 import os
 import sqlite3
 import logging
-from src.connectionDB import create_connection, create_tables
+from src.connectionDB import create_connection, create_tables, get_connection_pool
 
 logger = logging.getLogger(__name__)
 
@@ -12,6 +12,10 @@ def initialize_database():
         logger.info("Creating voice record table if not exists.")
         create_tables(conn)
         conn.close()
-        logger.info("Database initialized successfully.")
+        health = get_connection_pool().health_check()
+        logger.info(f"Database initialized successfully (journal_mode={health['journal_mode']}).")
     else:
         logger.error("Failed to initialize database connection.")
+
+def check_database_health():
+    return get_connection_pool().health_check()
@@ -0,0 +1,150 @@
+import asyncio
+import contextlib
+import functools
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+
+class InferenceBusyError(Exception):
+    """推論佇列已滿時拋出，由 main.py 轉成 503 與 Retry-After。"""
+
+    def __init__(self, pool_name: str, retry_after: int):
+        self.pool_name = pool_name
+        self.retry_after = retry_after
+        self.message = f"{pool_name} inference queue is full"
+        super().__init__(self.message)
+
+
+class InferencePool:
+    """
+    有界的推論執行緒池。同時執行的工作數上限為 max_workers，
+    另外最多允許 max_queue 個工作排隊，超過時立即拒絕而不是無限堆積。
+    """
+
+    def __init__(self, name: str, max_workers: int, max_queue: int, retry_after: int = 5):
+        self.name = name
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self.retry_after = retry_after
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=f"{name}-inference")
+        self._in_flight = 0
+        self._semaphore = None
+        self.rejected = 0
+        self.completed = 0
+
+    @property
+    def capacity(self) -> int:
+        return self.max_workers + self.max_queue
+
+    def ensure_capacity(self, pending: int = 0):
+        """若佇列已滿則拋出 InferenceBusyError。"""
+        if self._in_flight + pending >= self.capacity:
+            self.rejected += 1
+            logger.warning(f"Rejecting {self.name} inference request: queue is full")
+            raise InferenceBusyError(self.name, self.retry_after)
+
+    async def _execute(self, fn, *args, **kwargs):
+        loop = asyncio.get_running_loop()
+        result = await loop.run_in_executor(self._executor, functools.partial(fn, *args, **kwargs))
+        self.completed += 1
+        return result
+
+    async def run(self, fn, *args, **kwargs):
+        """在池中的執行緒上執行阻塞的推論函數，不佔用 event loop。"""
+        self.ensure_capacity()
+        self._in_flight += 1
+        try:
+            return await self._execute(fn, *args, **kwargs)
+        finally:
+            self._in_flight -= 1
+
+    def reserve(self) -> "PoolReservation":
+        """
+        預留一個名額給由多個步驟組成的工作（例如逐句串流）。
+        佇列已滿時立即拋出 InferenceBusyError；預留期間透過 reservation.run() 執行的步驟不會再被拒絕。
+        """
+        self.ensure_capacity()
+        self._in_flight += 1
+        return PoolReservation(self)
+
+    @contextlib.asynccontextmanager
+    async def slot(self):
+        """
+        取得一個執行名額但不佔用執行緒，供以回呼驅動、本身不阻塞的工作使用。
+        與 run() 共用相同的上限與排隊上限。
+        """
+        self.ensure_capacity()
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_workers)
+        self._in_flight += 1
+        try:
+            async with self._semaphore:
+                yield
+            self.completed += 1
+        finally:
+            self._in_flight -= 1
+
+    def stats(self) -> dict:
+        return {
+            "max_workers": self.max_workers,
+            "max_queue": self.max_queue,
+            "in_flight": self._in_flight,
+            "completed": self.completed,
+            "rejected": self.rejected,
+        }
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+class PoolReservation:
+    """InferencePool.reserve() 取得的名額；release() 可重複呼叫，只會釋放一次。"""
+
+    def __init__(self, pool: InferencePool):
+        self.pool = pool
+        self.released = False
+
+    async def run(self, fn, *args, **kwargs):
+        """在預留的名額內執行一個步驟，不再檢查佇列上限。"""
+        if self.released:
+            raise RuntimeError(f"{self.pool.name} reservation was already released")
+        return await self.pool._execute(fn, *args, **kwargs)
+
+    def release(self):
+        if not self.released:
+            self.released = True
+            self.pool._in_flight -= 1
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
+
+
+def _create_pool(name: str, default_workers: int, default_queue: int) -> InferencePool:
+    prefix = name.upper()
+    return InferencePool(
+        name,
+        max_workers=int(os.getenv(f'{prefix}_POOL_WORKERS', str(default_workers))),
+        max_queue=int(os.getenv(f'{prefix}_POOL_QUEUE', str(default_queue))),
+        retry_after=int(os.getenv(f'{prefix}_POOL_RETRY_AFTER', '5')),
+    )
+
+
+# ASR、TTS 與發音評估各自使用獨立的池，互不阻塞
+asr_pool = _create_pool("asr", 1, 32)
+tts_pool = _create_pool("tts", 1, 8)
+assessment_pool = _create_pool("assessment", 4, 16)
+
+
+def get_pool_stats() -> dict:
+    return {pool.name: pool.stats() for pool in (asr_pool, tts_pool, assessment_pool)}
+
+
+def shutdown_inference_pools():
+    for pool in (asr_pool, tts_pool, assessment_pool):
+        pool.shutdown()
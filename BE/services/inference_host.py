@@ -0,0 +1,321 @@
+"""
+推論主機：由單一行程持有 Whisper 與 XTTS 模型，多個 uvicorn worker 透過
+Unix socket（multiprocessing.connection）送出請求。大型 PCM 緩衝區放在
+shared memory 中，socket 上只傳遞區段名稱與長度，不需序列化樣本。
+
+啟動主機（必須設定 INFERENCE_HOST_AUTHKEY，未經驗證的連線會被拒絕）：
+    INFERENCE_HOST_SOCKET=/tmp/voice_inference.sock INFERENCE_HOST_AUTHKEY=... python -m services.inference_host
+worker 設定相同的 INFERENCE_HOST_SOCKET 與 INFERENCE_HOST_AUTHKEY 後，推論會轉送到主機，不會在 worker 中載入模型。
+"""
+import logging
+import multiprocessing
+import os
+import threading
+import traceback
+from multiprocessing import resource_tracker
+from multiprocessing.connection import Client, Listener, answer_challenge, deliver_challenge
+from multiprocessing.shared_memory import SharedMemory
+from typing import List, Optional
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+INFERENCE_HOST_SOCKET = os.getenv('INFERENCE_HOST_SOCKET')
+INFERENCE_HOST_AUTHKEY = os.getenv('INFERENCE_HOST_AUTHKEY')
+# tts_file 只能寫入此目錄下的檔案
+INFERENCE_HOST_OUTPUT_DIR = os.path.realpath(os.getenv('INFERENCE_HOST_OUTPUT_DIR', 'outVoiceFile'))
+# 主機行程自己也會讀到 INFERENCE_HOST_SOCKET，以此旗標區分主機與 worker
+_ROLE_ENV = 'INFERENCE_HOST_ROLE'
+
+
+class InferenceHostError(Exception):
+    def __init__(self, message: str):
+        self.message = message
+        super().__init__(message)
+
+
+def _authkey() -> Optional[bytes]:
+    return INFERENCE_HOST_AUTHKEY.encode() if INFERENCE_HOST_AUTHKEY else None
+
+
+def _attach(name: str) -> SharedMemory:
+    """附加到其他行程建立的區段，並取消 resource_tracker 的追蹤，避免行程結束時被誤刪。"""
+    shm = SharedMemory(name=name)
+    try:
+        resource_tracker.unregister(shm._name, "shared_memory")
+    except Exception:
+        pass
+    return shm
+
+
+def _close_shared(shm: SharedMemory):
+    """關閉附加的區段；仍有 view 未釋放時只記錄警告，不遮蔽原本的例外。"""
+    try:
+        shm.close()
+    except BufferError as e:
+        logger.warning(f"Shared memory segment {shm.name} still has exported views: {e}")
+
+
+def _resolve_output_path(output_path: str) -> str:
+    """確認輸出路徑位於 INFERENCE_HOST_OUTPUT_DIR 之下，避免客戶端指定任意路徑。"""
+    resolved = os.path.realpath(output_path)
+    if os.path.commonpath([resolved, INFERENCE_HOST_OUTPUT_DIR]) != INFERENCE_HOST_OUTPUT_DIR:
+        raise ValueError(f"Output path must be inside {INFERENCE_HOST_OUTPUT_DIR}")
+    return resolved
+
+
+def pack_arrays(arrays: List[np.ndarray]):
+    """把多個 float32 陣列複製到同一個 shared memory 區段，回傳 (區段, 各陣列長度)。"""
+    lengths = [len(array) for array in arrays]
+    shm = SharedMemory(create=True, size=max(sum(lengths), 1) * 4)
+    buffer = np.ndarray((sum(lengths),), dtype=np.float32, buffer=shm.buf)
+    offset = 0
+    for array, length in zip(arrays, lengths):
+        buffer[offset:offset + length] = array
+        offset += length
+    del buffer
+    return shm, lengths
+
+
+def unpack_views(shm: SharedMemory, lengths: List[int]) -> List[np.ndarray]:
+    """以 shared memory 為底層建立各陣列的 view，不複製資料。"""
+    buffer = np.ndarray((sum(lengths),), dtype=np.float32, buffer=shm.buf)
+    views, offset = [], 0
+    for length in lengths:
+        views.append(buffer[offset:offset + length])
+        offset += length
+    return views
+
+
+class InferenceHostClient:
+    """
+    worker 端的推論主機客戶端。方法皆為同步呼叫，應在推論執行緒池中使用；
+    連線在呼叫之間重複使用，每個執行緒同時只佔用一條連線。
+    """
+
+    def __init__(self, address: str, authkey: Optional[bytes] = None):
+        self.address = address
+        self.authkey = authkey
+        self._idle = []
+        self._lock = threading.Lock()
+
+    def _acquire(self):
+        with self._lock:
+            if self._idle:
+                return self._idle.pop()
+        try:
+            return Client(self.address, family="AF_UNIX", authkey=self.authkey)
+        except OSError as e:
+            raise InferenceHostError(f"Cannot connect to inference host at {self.address}: {e}")
+
+    def _release(self, conn):
+        with self._lock:
+            self._idle.append(conn)
+
+    def _call(self, request: dict):
+        conn = self._acquire()
+        try:
+            conn.send(request)
+            response = conn.recv()
+        except (OSError, EOFError) as e:
+            conn.close()
+            raise InferenceHostError(f"Inference host connection failed: {e}")
+        self._release(conn)
+        if not response["ok"]:
+            raise InferenceHostError(response["error"])
+        return response["result"]
+
+    def transcribe_audio_batch(self, audio_list, sampling_rate, return_timestamps=False, batch_size=16, model=None):
+        shm, lengths = pack_arrays(audio_list)
+        try:
+            return self._call({
+                "op": "asr_batch",
+                "shm": shm.name,
+                "lengths": lengths,
+                "sampling_rate": sampling_rate,
+                "return_timestamps": return_timestamps,
+                "batch_size": batch_size,
+                "model": model,
+            })
+        finally:
+            shm.close()
+            shm.unlink()
+
+    def synthesize_sentence(self, sentence: str, speaker_wav: str, language: str = "en") -> np.ndarray:
+        name, length = self._call({
+            "op": "tts_sentence", "sentence": sentence, "speaker_wav": speaker_wav, "language": language,
+        })
+        shm = SharedMemory(name=name)
+        try:
+            return unpack_views(shm, [length])[0].copy()
+        finally:
+            shm.close()
+            shm.unlink()
+
+    def synthesize_to_file(self, prompt: str, speaker_wav: str, output_path: str, language: str = "en"):
+        # 主機與 worker 在同一台機器上，由主機直接寫出檔案
+        return self._call({
+            "op": "tts_file", "prompt": prompt, "speaker_wav": speaker_wav,
+            "output_path": os.path.abspath(output_path), "language": language,
+        })
+
+    def split_sentences(self, prompt: str):
+        return self._call({"op": "tts_split", "prompt": prompt})
+
+    def get_output_sample_rate(self) -> int:
+        return self._call({"op": "tts_sample_rate"})
+
+    def readiness(self) -> dict:
+        return self._call({"op": "readiness"})
+
+    def close(self):
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for conn in idle:
+            conn.close()
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_inference_host_client() -> Optional[InferenceHostClient]:
+    """設定了 INFERENCE_HOST_SOCKET 且目前不是主機行程時，回傳共用的客戶端。"""
+    global _client
+    if not INFERENCE_HOST_SOCKET or os.getenv(_ROLE_ENV) == "host":
+        return None
+    with _client_lock:
+        if _client is None:
+            _client = InferenceHostClient(INFERENCE_HOST_SOCKET, _authkey())
+        return _client
+
+
+class InferenceHost:
+    """持有模型並處理 worker 請求的主機。每條連線一個執行緒，同一模型的推論依序執行。"""
+
+    def __init__(self, address: str, authkey: Optional[bytes] = None):
+        self.address = address
+        self.authkey = authkey
+        self._asr_lock = threading.Lock()
+        self._tts_lock = threading.Lock()
+
+    def _transcribe_shared(self, shm: SharedMemory, request: dict):
+        """
+        在此函數的 frame 內建立 view 並轉譯。模型拋出例外時清除 traceback 中各 frame 的區域變數，
+        例外傳回 _handle 時不再有 view 參照區段，區段才能關閉。
+        """
+        from src import voice_model
+
+        audio_list = unpack_views(shm, request["lengths"])
+        try:
+            with self._asr_lock:
+                return voice_model.transcribe_audio_batch(
+                    audio_list, request["sampling_rate"], request["return_timestamps"],
+                    request["batch_size"], request.get("model")
+                )
+        except Exception as e:
+            traceback.clear_frames(e.__traceback__)
+            raise
+        finally:
+            del audio_list
+
+    def _handle(self, request: dict):
+        from services import tts_service
+        from services.model_registry import model_registry
+
+        op = request["op"]
+        if op == "asr_batch":
+            shm = _attach(request["shm"])
+            try:
+                return self._transcribe_shared(shm, request)
+            finally:
+                _close_shared(shm)
+        if op == "tts_sentence":
+            with self._tts_lock:
+                wav = tts_service.synthesize_sentence(request["sentence"], request["speaker_wav"], request["language"])
+            shm, lengths = pack_arrays([wav])
+            # 區段交由客戶端讀取後 unlink
+            resource_tracker.unregister(shm._name, "shared_memory")
+            shm.close()
+            return shm.name, lengths[0]
+        if op == "tts_file":
+            output_path = _resolve_output_path(request["output_path"])
+            with self._tts_lock:
+                return tts_service.synthesize_to_file(
+                    request["prompt"], request["speaker_wav"], output_path, request["language"]
+                )
+        if op == "tts_split":
+            return tts_service.split_sentences(request["prompt"])
+        if op == "tts_sample_rate":
+            return tts_service.get_output_sample_rate()
+        if op == "readiness":
+            return model_registry.readiness()
+        raise ValueError(f"Unknown inference host operation: {op}")
+
+    def _authenticate(self, conn) -> bool:
+        """在連線自己的執行緒中進行 HMAC 驗證，失敗或中途斷線的客戶端不影響其他連線。"""
+        if not self.authkey:
+            return True
+        try:
+            deliver_challenge(conn, self.authkey)
+            answer_challenge(conn, self.authkey)
+            return True
+        except (OSError, EOFError, multiprocessing.AuthenticationError) as e:
+            logger.warning(f"Inference host rejected connection: {e!r}")
+            return False
+
+    def _serve_connection(self, conn):
+        with conn:
+            if not self._authenticate(conn):
+                return
+            while True:
+                try:
+                    request = conn.recv()
+                except (EOFError, OSError):
+                    return
+                try:
+                    response = {"ok": True, "result": self._handle(request)}
+                except Exception as e:
+                    logger.error(f"Inference host request '{request.get('op')}' failed: {e}")
+                    response = {"ok": False, "error": str(e)}
+                try:
+                    conn.send(response)
+                except OSError:
+                    return
+
+    def serve_forever(self):
+        if os.path.exists(self.address):
+            os.remove(self.address)
+        # 不在 accept() 中驗證：驗證改在每條連線的執行緒中進行，慢速或錯誤的客戶端不會擋住 accept 迴圈
+        with Listener(self.address, family="AF_UNIX") as listener:
+            logger.info(f"Inference host listening on {self.address}")
+            while True:
+                try:
+                    conn = listener.accept()
+                except (OSError, EOFError, multiprocessing.AuthenticationError) as e:
+                    logger.error(f"Inference host failed to accept connection: {e!r}")
+                    continue
+                threading.Thread(target=self._serve_connection, args=(conn,), daemon=True).start()
+
+
+def main():
+    if not INFERENCE_HOST_SOCKET:
+        raise SystemExit("INFERENCE_HOST_SOCKET must be set to run the inference host.")
+    if not INFERENCE_HOST_AUTHKEY:
+        raise SystemExit("INFERENCE_HOST_AUTHKEY must be set to run the inference host.")
+    logging.basicConfig(
+        level=logging.INFO,
+        format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
+    )
+    os.environ[_ROLE_ENV] = "host"
+    from services import tts_service  # noqa: F401  登記 tts 模型
+    from services.model_registry import model_registry
+    from src import voice_model  # noqa: F401  登記 asr 模型
+
+    model_registry.warm_up(model_registry.warmup_names())
+    InferenceHost(INFERENCE_HOST_SOCKET, _authkey()).serve_forever()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,243 @@
+import json
+import logging
+import os
+import sqlite3
+import time
+from typing import Any, Dict, List, Optional
+
+from src.connectionDB import create_voice_record_with_tags, insert_transcript_segments
+
+logger = logging.getLogger(__name__)
+
+JOB_MAX_ATTEMPTS = int(os.getenv('JOB_MAX_ATTEMPTS', '3'))
+JOB_RETRY_BASE_SECONDS = float(os.getenv('JOB_RETRY_BASE_SECONDS', '10'))
+JOB_RETRY_MAX_SECONDS = float(os.getenv('JOB_RETRY_MAX_SECONDS', '600'))
+# 超過此秒數沒有心跳的 'transcribing' 工作視為 worker 已當機，重新排入佇列
+JOB_STALE_SECONDS = float(os.getenv('JOB_STALE_SECONDS', '120'))
+
+TERMINAL_STATUSES = ("completed", "error")
+
+_JOB_COLUMNS = (
+    "id, voice_record_id, status, priority, input_path, return_timestamps, model, attempts, "
+    "max_attempts, next_attempt_at, claimed_by, heartbeat_at, result, error_message, created_at, updated_at"
+)
+
+
+def _row_to_job(cursor, row) -> Optional[Dict[str, Any]]:
+    if row is None:
+        return None
+    job = dict(zip([description[0] for description in cursor.description], row))
+    job["return_timestamps"] = bool(job["return_timestamps"])
+    if job.get("result") is not None:
+        job["result"] = json.loads(job["result"])
+    return job
+
+
+def retry_delay(attempts: int) -> float:
+    """指數退避：第 n 次失敗後等待 base * 2^(n-1) 秒，最多 JOB_RETRY_MAX_SECONDS。"""
+    return min(JOB_RETRY_BASE_SECONDS * (2 ** max(attempts - 1, 0)), JOB_RETRY_MAX_SECONDS)
+
+
+def remove_job_input(input_path: str):
+    """刪除工作的上傳檔案；工作完成或不再重試時呼叫，重試時仍需要它。"""
+    try:
+        if os.path.exists(input_path):
+            os.remove(input_path)
+    except OSError as e:
+        logger.warning(f"Failed to remove job input {input_path}: {e}")
+
+
+def submit_job(conn: sqlite3.Connection, record: Dict[str, Any], tags: List[str], input_path: str,
+               return_timestamps: bool = False, model: Optional[str] = None, priority: int = 0,
+               max_attempts: int = JOB_MAX_ATTEMPTS) -> Optional[Dict[str, Any]]:
+    """
+    建立狀態為 'pending' 的語音記錄與對應的工作。
+    :return: 新工作的字典，失敗時為 None
+    """
+    voice_record_id = create_voice_record_with_tags(conn, record, tags)
+    if not voice_record_id:
+        return None
+    now = time.time()
+    try:
+        with conn:
+            cursor = conn.execute(
+                '''
+                INSERT INTO transcription_job
+                    (voice_record_id, status, priority, input_path, return_timestamps, model,
+                     max_attempts, next_attempt_at, created_at, updated_at)
+                VALUES (?, 'pending', ?, ?, ?, ?, ?, ?, ?, ?)
+                ''',
+                (voice_record_id, priority, input_path, int(return_timestamps), model, max_attempts, now, now, now)
+            )
+            job_id = cursor.lastrowid
+    except sqlite3.Error as e:
+        logger.error(f"Error creating transcription job for voice record {voice_record_id}: {e}")
+        with conn:
+            conn.execute("DELETE FROM voice_record WHERE id = ?", (voice_record_id,))
+        return None
+    return get_job(conn, job_id)
+
+
+def get_job(conn: sqlite3.Connection, job_id: int) -> Optional[Dict[str, Any]]:
+    cursor = conn.execute(f"SELECT {_JOB_COLUMNS} FROM transcription_job WHERE id = ?", (job_id,))
+    return _row_to_job(cursor, cursor.fetchone())
+
+
+def claim_job(conn: sqlite3.Connection, worker_id: str) -> Optional[Dict[str, Any]]:
+    """
+    以 BEGIN IMMEDIATE 取得寫入鎖後，領取優先權最高且已到重試時間的工作，
+    多個 worker 行程同時呼叫也不會領到同一個工作。
+    """
+    now = time.time()
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        cursor = conn.execute(
+            f'''
+            SELECT {_JOB_COLUMNS} FROM transcription_job
+            WHERE status = 'pending' AND next_attempt_at <= ?
+            ORDER BY priority DESC, next_attempt_at, id
+            LIMIT 1
+            ''',
+            (now,)
+        )
+        job = _row_to_job(cursor, cursor.fetchone())
+        if job is None:
+            conn.commit()
+            return None
+        conn.execute(
+            '''
+            UPDATE transcription_job
+            SET status = 'transcribing', attempts = attempts + 1, claimed_by = ?, heartbeat_at = ?, updated_at = ?
+            WHERE id = ?
+            ''',
+            (worker_id, now, now, job["id"])
+        )
+        conn.execute("UPDATE voice_record SET status = 'transcribing' WHERE id = ?", (job["voice_record_id"],))
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    job.update(status="transcribing", attempts=job["attempts"] + 1, claimed_by=worker_id, heartbeat_at=now)
+    return job
+
+
+def heartbeat(conn: sqlite3.Connection, job_id: int, worker_id: str) -> bool:
+    """更新心跳；工作已被回收給其他 worker 時回傳 False。"""
+    now = time.time()
+    with conn:
+        cursor = conn.execute(
+            '''
+            UPDATE transcription_job SET heartbeat_at = ?, updated_at = ?
+            WHERE id = ? AND claimed_by = ? AND status = 'transcribing'
+            ''',
+            (now, now, job_id, worker_id)
+        )
+    return cursor.rowcount == 1
+
+
+def _owned_update(conn: sqlite3.Connection, job: Dict[str, Any], assignments: str, params) -> bool:
+    """只在工作仍由 job['claimed_by'] 持有且狀態為 'transcribing' 時更新工作；回傳是否更新成功。"""
+    cursor = conn.execute(
+        f'''
+        UPDATE transcription_job SET {assignments}
+        WHERE id = ? AND status = 'transcribing' AND claimed_by = ?
+        ''',
+        (*params, job["id"], job["claimed_by"])
+    )
+    return cursor.rowcount == 1
+
+
+def complete_job(conn: sqlite3.Connection, job: Dict[str, Any], result, record_fields: Dict[str, Any],
+                 segments: Optional[List[Dict[str, Any]]] = None) -> bool:
+    """
+    在單一交易中寫入轉譯結果、逐字稿片段，並把工作與語音記錄標為 'completed'。
+    工作已被回收給其他 worker 時不寫入任何資料並回傳 False。
+    """
+    now = time.time()
+    assignments = ", ".join(f"{name} = ?" for name in record_fields)
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        if not _owned_update(conn, job, "status = 'completed', result = ?, error_message = NULL, updated_at = ?",
+                             (json.dumps(result, ensure_ascii=False), now)):
+            conn.rollback()
+            return False
+        conn.execute(
+            f"UPDATE voice_record SET {assignments}, status = 'completed', error_message = NULL WHERE id = ?",
+            (*record_fields.values(), job["voice_record_id"])
+        )
+        conn.execute("DELETE FROM transcript_segment WHERE record_id = ?", (job["voice_record_id"],))
+        if segments:
+            insert_transcript_segments(conn, job["voice_record_id"], segments, record_fields.get("duration"))
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    return True
+
+
+def _fail_owned_job(conn: sqlite3.Connection, job: Dict[str, Any], error_message: str, now: float) -> Optional[str]:
+    """在呼叫端的交易內記錄失敗；工作已不屬於 job['claimed_by'] 時不寫入並回傳 None。"""
+    if job["attempts"] < job["max_attempts"]:
+        status = "pending"
+        next_attempt_at = now + retry_delay(job["attempts"])
+    else:
+        status = "error"
+        next_attempt_at = job["next_attempt_at"]
+    if not _owned_update(
+        conn, job, "status = ?, error_message = ?, next_attempt_at = ?, claimed_by = NULL, updated_at = ?",
+        (status, error_message, next_attempt_at, now)
+    ):
+        return None
+    conn.execute(
+        "UPDATE voice_record SET status = ?, error_message = ? WHERE id = ?",
+        (status, error_message, job["voice_record_id"])
+    )
+    return status
+
+
+def fail_job(conn: sqlite3.Connection, job: Dict[str, Any], error_message: str) -> Optional[str]:
+    """
+    記錄失敗。還有剩餘次數時以指數退避重新排入佇列，否則標為 'error'。
+    :return: 工作的新狀態；工作已被回收給其他 worker 時為 None
+    """
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        status = _fail_owned_job(conn, job, error_message, time.time())
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    return status
+
+
+def recover_stale_jobs(conn: sqlite3.Connection, stale_after: float = JOB_STALE_SECONDS) -> int:
+    """
+    把心跳逾時、停在 'transcribing' 的工作（worker 當機）重新排入佇列；
+    已用完重試次數的工作改標為 'error' 並刪除其上傳檔案。對應的語音記錄狀態一併更新。
+    查詢與回收在同一個 BEGIN IMMEDIATE 交易內完成，不會與其他 worker 的心跳或寫回交錯。
+    :return: 回收的工作數
+    """
+    now = time.time()
+    recovered = 0
+    failed_inputs = []
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        cursor = conn.execute(
+            f"SELECT {_JOB_COLUMNS} FROM transcription_job WHERE status = 'transcribing' AND heartbeat_at < ?",
+            (now - stale_after,)
+        )
+        for job in [_row_to_job(cursor, row) for row in cursor.fetchall()]:
+            logger.warning(f"Recovering transcription job {job['id']} abandoned by worker {job['claimed_by']}")
+            status = _fail_owned_job(conn, job, f"Worker {job['claimed_by']} stopped responding", now)
+            if status is not None:
+                recovered += 1
+            if status == "error":
+                failed_inputs.append(job["input_path"])
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    # 交易提交後才刪除不再重試的工作的上傳檔案
+    for input_path in failed_inputs:
+        remove_job_input(input_path)
+    return recovered
@@ -0,0 +1,178 @@
+# services/job_worker.py
+"""
+非同步轉譯工作的背景 worker。每個 worker 行程輪詢 transcription_job 表格，
+以原子方式領取工作、轉譯、寫回結果；失敗時依指數退避重試。
+
+執行：
+    python -m services.job_worker --workers 2
+"""
+import argparse
+import logging
+import multiprocessing
+import os
+import signal
+import socket
+import threading
+import uuid
+from datetime import datetime
+
+from services.job_queue import (
+    JOB_STALE_SECONDS,
+    claim_job,
+    complete_job,
+    fail_job,
+    heartbeat,
+    recover_stale_jobs,
+    remove_job_input,
+)
+from src.connectionDB import close_connection_pool, create_connection, initialize_database
+
+logger = logging.getLogger(__name__)
+
+JOB_POLL_INTERVAL_S = float(os.getenv('JOB_POLL_INTERVAL_S', '1.0'))
+JOB_HEARTBEAT_INTERVAL_S = float(os.getenv('JOB_HEARTBEAT_INTERVAL_S', '10'))
+
+
+class JobWorker:
+    def __init__(self, worker_id: str = None, poll_interval: float = JOB_POLL_INTERVAL_S,
+                 heartbeat_interval: float = JOB_HEARTBEAT_INTERVAL_S, stale_after: float = JOB_STALE_SECONDS):
+        self.worker_id = worker_id or f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self.poll_interval = poll_interval
+        self.heartbeat_interval = heartbeat_interval
+        self.stale_after = stale_after
+        self._stop = threading.Event()
+
+    def stop(self):
+        self._stop.set()
+
+    def run_forever(self):
+        logger.info(f"Job worker {self.worker_id} started")
+        conn = create_connection()
+        if not conn:
+            raise RuntimeError("Database connection failed")
+        try:
+            while not self._stop.is_set():
+                recover_stale_jobs(conn, self.stale_after)
+                job = claim_job(conn, self.worker_id)
+                if job is None:
+                    self._stop.wait(self.poll_interval)
+                    continue
+                self.process(conn, job)
+        finally:
+            conn.close()
+        logger.info(f"Job worker {self.worker_id} stopped")
+
+    def _heartbeat_loop(self, job, done: threading.Event, lost: threading.Event):
+        # 心跳使用獨立連線，避免與轉譯中的主連線共用
+        conn = create_connection()
+        if not conn:
+            return
+        try:
+            while not done.wait(self.heartbeat_interval):
+                if not heartbeat(conn, job["id"], self.worker_id):
+                    logger.warning(f"Lost ownership of job {job['id']}")
+                    lost.set()
+                    return
+        finally:
+            conn.close()
+
+    def process(self, conn, job):
+        # 延遲匯入：只有真正處理工作時才載入模型相關模組
+        from services.audio_ingest import TARGET_SAMPLE_RATE, ingest_audio_file
+        from services.transcription_service import transcribe_speech_sync
+
+        logger.info(f"Processing job {job['id']} (attempt {job['attempts']}/{job['max_attempts']})")
+        done = threading.Event()
+        lost = threading.Event()
+        beat = threading.Thread(target=self._heartbeat_loop, args=(job, done, lost), daemon=True)
+        beat.start()
+        try:
+            audio = ingest_audio_file(job["input_path"])
+            transcription = transcribe_speech_sync(
+                audio.samples, TARGET_SAMPLE_RATE, job["return_timestamps"], model=job["model"]
+            )
+            if job["return_timestamps"]:
+                transcription_str = '\n'.join(item['text'] for item in transcription)
+            else:
+                transcription_str = transcription
+
+            # 工作已被回收給其他 worker 時不再寫入任何結果，由新的持有者處理
+            if lost.is_set():
+                done.set()
+                beat.join()
+                logger.warning(f"Discarding result of job {job['id']}: ownership was lost")
+                return
+
+            date_str = datetime.now().strftime("%Y/%m/%d")
+            output_dir = os.path.join("transcriptions", date_str)
+            os.makedirs(output_dir, exist_ok=True)
+            output_path = os.path.join(output_dir, f"transcription_job_{job['id']}.txt")
+            with open(output_path, 'w', encoding='utf-8') as f:
+                f.write(transcription_str)
+
+            done.set()
+            beat.join()
+            record_fields = {
+                "filename": os.path.basename(output_path),
+                "filepath": output_path,
+                "transcript": transcription_str,
+                "size": os.path.getsize(output_path),
+                "duration": audio.duration_seconds,
+            }
+            segments = transcription if job["return_timestamps"] else None
+            if not complete_job(conn, job, transcription, record_fields, segments):
+                logger.warning(f"Discarding result of job {job['id']}: ownership was lost")
+                return
+            logger.info(f"Completed job {job['id']}")
+        except Exception as e:
+            done.set()
+            beat.join()
+            status = fail_job(conn, job, str(e))
+            if status is None:
+                logger.warning(f"Job {job['id']} failed after ownership was lost: {e}")
+                return
+            logger.error(f"Job {job['id']} failed ({status}): {e}")
+            if status != "error":
+                return
+        # 完成或不再重試時才刪除上傳檔案，重試時仍需要它
+        remove_job_input(job["input_path"])
+
+
+def _run_worker(index: int):
+    logging.basicConfig(level=logging.INFO)
+    worker = JobWorker(f"{socket.gethostname()}:{os.getpid()}:{index}")
+    signal.signal(signal.SIGTERM, lambda *_: worker.stop())
+    signal.signal(signal.SIGINT, lambda *_: worker.stop())
+    worker.run_forever()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="執行非同步轉譯工作的 worker 行程")
+    parser.add_argument('--workers', type=int, default=1, help='worker 行程數')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    initialize_database()
+    # SQLite 連線不能跨 fork 共用，子行程各自建立連線池
+    close_connection_pool()
+
+    processes = [
+        multiprocessing.Process(target=_run_worker, args=(index,), name=f"job-worker-{index}")
+        for index in range(args.workers)
+    ]
+    for process in processes:
+        process.start()
+
+    def _terminate(*_):
+        for process in processes:
+            if process.is_alive():
+                process.terminate()
+
+    signal.signal(signal.SIGTERM, _terminate)
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    for process in processes:
+        process.join()
+
+
+if __name__ == "__main__":
+    main()
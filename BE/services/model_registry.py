@@ -0,0 +1,116 @@
+import logging
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, Optional
+
+logger = logging.getLogger(__name__)
+
+NOT_LOADED = "not_loaded"
+LOADING = "loading"
+READY = "ready"
+FAILED = "failed"
+
+# 啟動後在背景預先載入的模型，設為空字串則所有模型都在第一次使用時才載入
+MODEL_WARMUP = os.getenv('MODEL_WARMUP', 'asr,tts')
+
+
+class ModelLoadError(Exception):
+    def __init__(self, name: str, message: str):
+        self.name = name
+        self.message = message
+        super().__init__(f"Model '{name}' failed to load: {message}")
+
+
+class _ModelEntry:
+    def __init__(self, name: str, loader: Callable[[], Any]):
+        self.name = name
+        self.loader = loader
+        self.state = NOT_LOADED
+        self.instance = None
+        self.error: Optional[str] = None
+        self.load_seconds: Optional[float] = None
+        self.lock = threading.Lock()
+
+
+class ModelRegistry:
+    """
+    模型的延遲載入登錄表。模組匯入時只登記載入函數，第一次 get() 或背景
+    warm_up() 時才真正載入；同一模型只會載入一次，並發的呼叫者會等待同一次載入。
+    載入失敗的模型會在下一次 get() 時重試。
+    """
+
+    def __init__(self):
+        self._entries: Dict[str, _ModelEntry] = {}
+
+    def register(self, name: str, loader: Callable[[], Any]):
+        if name not in self._entries:
+            self._entries[name] = _ModelEntry(name, loader)
+
+    def get(self, name: str):
+        """取得模型，尚未載入時在目前的執行緒中載入（會阻塞，勿在 event loop 上呼叫）。"""
+        entry = self._entries[name]
+        if entry.state == READY:
+            return entry.instance
+        with entry.lock:
+            if entry.state == READY:
+                return entry.instance
+            entry.state = LOADING
+            entry.error = None
+            logger.info(f"Loading model '{name}'...")
+            started = time.monotonic()
+            try:
+                entry.instance = entry.loader()
+            except Exception as e:
+                entry.state = FAILED
+                entry.error = str(e)
+                logger.error(f"Failed to load model '{name}': {e}")
+                raise ModelLoadError(name, str(e)) from e
+            entry.load_seconds = time.monotonic() - started
+            entry.state = READY
+            logger.info(f"Model '{name}' loaded in {entry.load_seconds:.1f}s")
+            return entry.instance
+
+    def is_ready(self, name: str) -> bool:
+        entry = self._entries.get(name)
+        return entry is not None and entry.state == READY
+
+    def warm_up(self, names: Iterable[str]):
+        """以 daemon 執行緒在背景載入指定模型，不阻塞啟動流程。"""
+        for name in names:
+            if name not in self._entries:
+                logger.warning(f"Unknown model '{name}' in warm-up list; skipping.")
+                continue
+            thread = threading.Thread(target=self._warm_one, args=(name,), name=f"warmup-{name}", daemon=True)
+            thread.start()
+
+    def _warm_one(self, name: str):
+        try:
+            self.get(name)
+        except ModelLoadError:
+            pass
+
+    def warmup_names(self):
+        return [name.strip() for name in MODEL_WARMUP.split(",") if name.strip()]
+
+    def status(self) -> Dict[str, dict]:
+        return {
+            name: {
+                "state": entry.state,
+                "error": entry.error,
+                "load_seconds": entry.load_seconds,
+            }
+            for name, entry in self._entries.items()
+        }
+
+    def readiness(self) -> dict:
+        """預先載入清單中的模型全部就緒時才算 ready；其他模型只回報狀態。"""
+        required = [name for name in self.warmup_names() if name in self._entries]
+        return {
+            "ready": all(self.is_ready(name) for name in required),
+            "required": required,
+            "models": self.status(),
+        }
+
+
+model_registry = ModelRegistry()
@@ -0,0 +1,493 @@
+import os
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+# 對齊時允許偏離對角線的字數；參考文字與辨識結果局部錯位超過此值時會以替換/增刪近似
+ALIGN_BAND = int(os.getenv('ASSESSMENT_ALIGN_BAND', '64'))
+# 帶寬最多加倍的次數：參考文字與辨識結果完全無關時，證明最佳解需要 O(n * m) 的表格，
+# 超過 ALIGN_BAND * 2**ALIGN_BAND_DOUBLINGS 後直接採用帶狀範圍內的結果，時間與記憶體維持 O(n * band)
+ALIGN_BAND_DOUBLINGS = int(os.getenv('ASSESSMENT_ALIGN_BAND_DOUBLINGS', '3'))
+# 表格小於此格數的空隙以純 Python 計算
+SMALL_GAP_CELLS = 400
+# 兩邊都只出現一次的連續 n 字片段視為錨點，錨點之間才需要做動態規劃；字彙少時會自動加長
+ANCHOR_NGRAM = int(os.getenv('ASSESSMENT_ANCHOR_NGRAM', '3'))
+MAX_ANCHOR_NGRAM = 16
+# 錨點 n-gram 碰巧相符的機率上限為 1 / ANCHOR_CHANCE
+ANCHOR_CHANCE = 100
+# 選擇錨點時，每一段最多往前考慮幾段作為前一個錨點
+ANCHOR_CHAIN_WINDOW = 32
+# 與前後錨點錯位超過此字數的錨點，需確認經過它不會提高總成本
+ANCHOR_DRIFT_TOLERANCE = 2
+
+ERROR_TYPES = ("None", "Insertion", "Omission", "Mispronunciation", "UnexpectedBreak", "MissingBreak", "Monotone")
+_ERROR_CODES = {name: code for code, name in enumerate(ERROR_TYPES)}
+ERROR_NONE = _ERROR_CODES["None"]
+ERROR_INSERTION = _ERROR_CODES["Insertion"]
+ERROR_OMISSION = _ERROR_CODES["Omission"]
+
+_INF = np.int32(1 << 29)
+# 增刪一個字的成本為 2、替換為 3：替換仍比一增一刪便宜，但多對齊一個相同的字時寧可多一次增刪，
+# 與 difflib 一樣傾向保留較多相符的字
+_INDEL_COST, _SUBSTITUTION_COST = 2, 3
+# 回溯指標
+_DIAGONAL, _UP, _LEFT = 0, 1, 2
+
+Opcode = Tuple[str, int, int, int, int]
+
+
+def encode_error_types(error_types: Sequence[str]) -> np.ndarray:
+    """把 Azure 的 ErrorType 字串轉成 int8 代碼；未知的類型視為 'None'。"""
+    return np.fromiter((_ERROR_CODES.get(e, ERROR_NONE) for e in error_types), dtype=np.int8, count=len(error_types))
+
+
+def _encode_tokens(reference: Sequence[str], hypothesis: Sequence[str]):
+    vocabulary: Dict[str, int] = {}
+    ref = np.fromiter((vocabulary.setdefault(w, len(vocabulary)) for w in reference), dtype=np.int32, count=len(reference))
+    hyp = np.fromiter((vocabulary.setdefault(w, len(vocabulary)) for w in hypothesis), dtype=np.int32, count=len(hypothesis))
+    return ref, hyp
+
+
+def _band_bounds(n: int, m: int, band: int):
+    """每一列可計算的欄位範圍 [lo, hi]，沿著 (0,0)→(n,m) 的對角線，寬度為 2*band+1。"""
+    rows = np.arange(n + 1, dtype=np.int64)
+    centers = (rows * m + n // 2) // n if n else np.zeros(1, dtype=np.int64)
+    lo = np.maximum(centers - band, 0)
+    hi = np.minimum(centers + band, m)
+    return lo, hi
+
+
+def _unique_ngrams(tokens: np.ndarray, base: int, k: int):
+    """回傳只出現一次的 n-gram 雜湊值與其起點。"""
+    length = len(tokens) - k + 1
+    hashes = np.zeros(length, dtype=np.int64)
+    for offset in range(k):
+        hashes = hashes * base + tokens[offset:offset + length]
+    values, index, counts = np.unique(hashes, return_index=True, return_counts=True)
+    unique = counts == 1
+    return values[unique], index[unique]
+
+
+def _anchor_length(ref: np.ndarray, hyp: np.ndarray, base: int) -> int:
+    """
+    錨點的 n-gram 長度。字彙很少時短片段容易碰巧只出現一次，因此加長到
+    巧合相符的機率（約 n * m / base^k）低於 1/ANCHOR_CHANCE 為止；加長到上限仍不夠時回傳 0，不使用錨點。
+    """
+    k = ANCHOR_NGRAM
+    target = ANCHOR_CHANCE * len(ref) * len(hyp)
+    while base ** k < target:
+        k += 1
+        if k > MAX_ANCHOR_NGRAM or base ** k >= 2 ** 62:
+            return 0
+    return k
+
+
+def _candidate_runs(ref: np.ndarray, hyp: np.ndarray, k: int) -> List[Tuple[int, int, int]]:
+    """兩邊都只出現一次的 n-gram 依對角線合併成完全相符的區段，並向前後延伸相同的字；依起點排序。"""
+    base = int(max(ref.max(), hyp.max())) + 1
+    ref_values, ref_index = _unique_ngrams(ref, base, k)
+    hyp_values, hyp_index = _unique_ngrams(hyp, base, k)
+    _, ref_common, hyp_common = np.intersect1d(ref_values, hyp_values, assume_unique=True, return_indices=True)
+    i_positions = ref_index[ref_common]
+    j_positions = hyp_index[hyp_common]
+    order = np.lexsort((i_positions, j_positions - i_positions))
+
+    runs: List[List[int]] = []
+    for i, j in zip(i_positions[order].tolist(), j_positions[order].tolist()):
+        if runs:
+            run_i, run_j, run_length = runs[-1]
+            if j - i == run_j - run_i and i <= run_i + run_length:
+                runs[-1][2] = max(run_length, i - run_i + k)
+                continue
+        runs.append([i, j, k])
+
+    ref_list, hyp_list = ref.tolist(), hyp.tolist()
+    extended = set()
+    for run_i, run_j, run_length in runs:
+        while run_i > 0 and run_j > 0 and ref_list[run_i - 1] == hyp_list[run_j - 1]:
+            run_i, run_j, run_length = run_i - 1, run_j - 1, run_length + 1
+        while run_i + run_length < len(ref_list) and run_j + run_length < len(hyp_list) \
+                and ref_list[run_i + run_length] == hyp_list[run_j + run_length]:
+            run_length += 1
+        extended.add((run_i, run_j, run_length))
+    return sorted(extended)
+
+
+def _gap_estimate(a: int, b: int) -> int:
+    """
+    空隙的成本估計（兩倍）：a、b 個字全部以替換與增刪處理的成本
+    _SUBSTITUTION_COST * min(a, b) + _INDEL_COST * |a - b|，即 1.5 * (a + b) + 0.5 * |a - b|。
+    """
+    return 3 * (a + b) + abs(a - b)
+
+
+def _anchor_runs(ref: np.ndarray, hyp: np.ndarray, k: int = None) -> List[Tuple[int, int, int]]:
+    """
+    找出兩邊都只出現一次的 n-gram 合併成的完全相符區段，再以動態規劃選出互不重疊、
+    i 與 j 同時遞增且空隙估計成本總和最低的一串作為錨點，回傳 [(ref 起點, hyp 起點, 長度)]。
+    與只求最多錨點的最長遞增子序列不同，偏離對角線的巧合片段或被移動的片段
+    只有在能降低總成本時才會被採用。
+    """
+    n, m = len(ref), len(hyp)
+    if n == 0 or m == 0:
+        return []
+    base = int(max(ref.max(), hyp.max())) + 1
+    k = _anchor_length(ref, hyp, base) if k is None else k
+    if k <= 0 or n < k or m < k or base ** k >= 2 ** 62:
+        return []
+    runs = _candidate_runs(ref, hyp, k)
+
+    # cost[q]：從 (0, 0) 對齊到第 q 段起點的估計成本；只考慮前 ANCHOR_CHAIN_WINDOW 段作為前一個錨點。
+    # 內層迴圈展開 _gap_estimate 以減少函數呼叫
+    ends = [(run_i + run_length, run_j + run_length) for run_i, run_j, run_length in runs]
+    cost, previous = [], []
+    for q, (run_i, run_j, _) in enumerate(runs):
+        best, best_p = _gap_estimate(run_i, run_j), -1
+        for p in range(max(0, q - ANCHOR_CHAIN_WINDOW), q):
+            end_i, end_j = ends[p]
+            if end_i <= run_i and end_j <= run_j:
+                a, b = run_i - end_i, run_j - end_j
+                candidate = cost[p] + 3 * (a + b) + (a - b if a > b else b - a)
+                if candidate < best:
+                    best, best_p = candidate, p
+        cost.append(best)
+        previous.append(best_p)
+
+    best, position = _gap_estimate(n, m), -1
+    for p, (run_i, run_j, run_length) in enumerate(runs):
+        candidate = cost[p] + _gap_estimate(n - run_i - run_length, m - run_j - run_length)
+        if candidate < best:
+            best, position = candidate, p
+    chain = []
+    while position >= 0:
+        chain.append(runs[position])
+        position = previous[position]
+    chain.reverse()
+    return chain
+
+
+def _cost_below(ref: List[int], hyp: List[int], limit: int) -> Optional[int]:
+    """
+    成本低於 limit 時回傳精確的加權編輯距離，否則回傳 None。
+    經過 (i, i + d) 的路徑至少需要 |d| + |(m - n) - d| 次增刪，成本低於 limit 的路徑
+    只會經過有限幾條對角線，以純 Python 只計算這段斜帶。
+    """
+    n, m = len(ref), len(hyp)
+    delta = m - n
+    reach = (limit - 1) // _INDEL_COST
+    if limit <= 0 or abs(delta) > reach:
+        return None
+    slack = (reach - abs(delta)) // 2
+    d_lo, d_hi = min(0, delta) - slack, max(0, delta) + slack
+    width = d_hi - d_lo + 1
+    # previous[k]：上一列第 j = (i - 1) + d_lo + k 欄的成本，超出範圍或不低於 limit 時為 limit
+    previous = [(d_lo + k) * _INDEL_COST if 0 <= d_lo + k <= m else limit for k in range(width)]
+    for i in range(1, n + 1):
+        word = ref[i - 1]
+        current = [limit] * width
+        row_best = limit
+        for k in range(max(0, -i - d_lo), min(width - 1, m - i - d_lo) + 1):
+            j = i + d_lo + k
+            best = previous[k + 1] + _INDEL_COST if k + 1 < width else limit
+            if j > 0:
+                diagonal = previous[k] if hyp[j - 1] == word else previous[k] + _SUBSTITUTION_COST
+                if diagonal < best:
+                    best = diagonal
+                if k > 0 and current[k - 1] + _INDEL_COST < best:
+                    best = current[k - 1] + _INDEL_COST
+            if best < limit:
+                current[k] = best
+                if best < row_best:
+                    row_best = best
+        if row_best >= limit:
+            return None
+        previous = current
+    cost = previous[delta - d_lo]
+    return cost if cost < limit else None
+
+
+def _gap_cost(ref: List[int], hyp: List[int]) -> int:
+    """空隙的最低成本；全部以替換與增刪處理一定可行，以此成本作為上限。"""
+    n, m = len(ref), len(hyp)
+    return _cost_below(ref, hyp, _SUBSTITUTION_COST * min(n, m) + _INDEL_COST * abs(n - m) + 1)
+
+
+def _checked_runs(ref: List[int], hyp: List[int], runs: List[Tuple[int, int, int]]) -> List[Tuple[int, int, int]]:
+    """
+    檢查與前後錨點不在同一條對角線附近（錯位超過 ANCHOR_DRIFT_TOLERANCE 字）的錨點：
+    若把它連同前後兩段空隙合併後直接對齊的成本，低於經過它的兩段空隙成本和，
+    表示它把對齊拉離了最佳路徑，改併入空隙。
+    """
+    checked: List[Tuple[int, int, int]] = []
+    start_i = start_j = 0
+    bounds = runs + [(len(ref), len(hyp), 0)]
+    for index, (run_i, run_j, run_length) in enumerate(runs):
+        next_i, next_j, _ = bounds[index + 1]
+        drift = run_j - run_i
+        if abs(drift - (start_j - start_i)) <= ANCHOR_DRIFT_TOLERANCE \
+                and abs(drift - (next_j - next_i)) <= ANCHOR_DRIFT_TOLERANCE:
+            checked.append((run_i, run_j, run_length))
+            start_i, start_j = run_i + run_length, run_j + run_length
+            continue
+        through = _gap_cost(ref[start_i:run_i], hyp[start_j:run_j]) \
+            + _gap_cost(ref[run_i + run_length:next_i], hyp[run_j + run_length:next_j])
+        if _cost_below(ref[start_i:next_i], hyp[start_j:next_j], through) is None:
+            checked.append((run_i, run_j, run_length))
+            start_i, start_j = run_i + run_length, run_j + run_length
+    return checked
+
+
+def edit_operations(reference: Sequence[str], hypothesis: Sequence[str], band: int = None) -> List[str]:
+    """
+    求出對齊參考文字與辨識結果的 equal/replace/delete/insert 操作序列。
+    先以唯一 n-gram 錨點切出完全相符的區段，只對錨點之間的空隙做帶狀動態規劃；
+    偏離前後錨點對角線、經過它反而提高成本的巧合錨點會併回空隙。
+    """
+    ref, hyp = _encode_tokens(reference, hypothesis)
+    operations: List[str] = []
+    start_i = start_j = 0
+    runs = _checked_runs(ref.tolist(), hyp.tolist(), _anchor_runs(ref, hyp))
+    for run_i, run_j, run_length in runs + [(len(ref), len(hyp), 0)]:
+        operations += _banded_operations(ref[start_i:run_i], hyp[start_j:run_j], band)
+        operations += ["equal"] * run_length
+        start_i, start_j = run_i + run_length, run_j + run_length
+    return operations
+
+
+def _shifted(previous: np.ndarray, previous_lo: int, start: int, count: int) -> np.ndarray:
+    """取出上一列從 start 欄開始的 count 個值；超出上一列帶狀範圍的欄位為無限大。"""
+    out = np.full(count, _INF, dtype=np.int32)
+    begin = max(start, previous_lo)
+    end = min(start + count, previous_lo + len(previous))
+    if begin < end:
+        out[begin - start:end - start] = previous[begin - previous_lo:end - previous_lo]
+    return out
+
+
+def _small_operations(ref: List[int], hyp: List[int]) -> List[str]:
+    """小空隙直接以純 Python 計算完整的表格，避免 NumPy 逐列呼叫的固定成本。"""
+    n, m = len(ref), len(hyp)
+    cost = [[j * _INDEL_COST for j in range(m + 1)]]
+    moves = [[_LEFT] * (m + 1)]
+    for i in range(1, n + 1):
+        row, row_moves = [i * _INDEL_COST], [_UP]
+        above = cost[-1]
+        for j in range(1, m + 1):
+            diagonal = above[j - 1] + (_SUBSTITUTION_COST if ref[i - 1] != hyp[j - 1] else 0)
+            up = above[j] + _INDEL_COST
+            left = row[j - 1] + _INDEL_COST
+            best, move = (diagonal, _DIAGONAL) if diagonal <= up else (up, _UP)
+            if left < best:
+                best, move = left, _LEFT
+            row.append(best)
+            row_moves.append(move)
+        cost.append(row)
+        moves.append(row_moves)
+
+    operations = []
+    i, j = n, m
+    while i > 0 or j > 0:
+        move = moves[i][j]
+        if move == _DIAGONAL:
+            operations.append("equal" if ref[i - 1] == hyp[j - 1] else "replace")
+            i, j = i - 1, j - 1
+        elif move == _UP:
+            operations.append("delete")
+            i -= 1
+        else:
+            operations.append("insert")
+            j -= 1
+    operations.reverse()
+    return operations
+
+
+def _outside_band_bound(n: int, m: int, lo: np.ndarray, hi: np.ndarray) -> float:
+    """
+    任何經過帶狀範圍外格子的路徑的成本下限：經過 (i, j) 的路徑至少需要
+    |j - i| + |(m - n) - (j - i)| 次增刪；對每一列取帶狀範圍兩側最有利的格子。
+    """
+    rows = np.arange(n + 1, dtype=np.int64)
+    delta = m - n
+    plateau_lo, plateau_hi = np.minimum(rows, rows + delta), np.maximum(rows, rows + delta)
+    bound = np.inf
+    for valid, columns in (
+        (lo > 0, np.minimum(np.maximum(plateau_lo, 0), lo - 1)),
+        (hi < m, np.maximum(np.minimum(plateau_hi, m), hi + 1)),
+    ):
+        if valid.any():
+            offsets = columns[valid] - rows[valid]
+            bound = min(bound, float((np.abs(offsets) + np.abs(delta - offsets)).min() * _INDEL_COST))
+    return bound
+
+
+def _banded_table(ref: np.ndarray, hyp: np.ndarray, lo: np.ndarray, hi: np.ndarray, width: int):
+    """計算帶狀範圍內的成本，回傳 (n, m) 的成本與回溯指標。"""
+    n = len(ref)
+    pointers = np.full((n + 1, width), _LEFT, dtype=np.int8)
+
+    # 第 0 列：只能插入
+    previous = np.arange(lo[0], hi[0] + 1, dtype=np.int32) * _INDEL_COST
+    previous_lo = int(lo[0])
+    all_offsets = np.arange(width, dtype=np.int32) * _INDEL_COST
+    for i in range(1, n + 1):
+        row_lo, row_hi = int(lo[i]), int(hi[i])
+        count = row_hi - row_lo + 1
+
+        up = _shifted(previous, previous_lo, row_lo, count) + _INDEL_COST
+        diagonal = _shifted(previous, previous_lo, row_lo - 1, count)
+        if row_lo == 0:
+            diagonal[1:] += _SUBSTITUTION_COST * (hyp[:row_hi] != ref[i - 1])
+        else:
+            diagonal += _SUBSTITUTION_COST * (hyp[row_lo - 1:row_hi] != ref[i - 1])
+        best = np.minimum(diagonal, up)
+        step = (diagonal > up).astype(np.int8)  # _DIAGONAL 或 _UP
+
+        # 同一列的插入：current[j] = min_k<=j (best[k] + 2 * (j - k))，以累積最小值一次算完
+        offsets = all_offsets[:count]
+        current = np.minimum.accumulate(best - offsets) + offsets
+        step[current < best] = _LEFT
+
+        pointers[i, :count] = step
+        previous, previous_lo = current, row_lo
+    return int(previous[-1]), pointers
+
+
+def _banded_operations(ref: np.ndarray, hyp: np.ndarray, band: int = None) -> List[str]:
+    """
+    以帶狀加權編輯距離求出成本最低的操作序列。只計算對角線附近 2*band+1 欄，
+    記憶體為 O(n * band)，每一列以 NumPy 向量化計算。帶狀範圍外的路徑可能更便宜時
+    （成本高於範圍外的下限）把帶寬加倍重算，最多加倍 ALIGN_BAND_DOUBLINGS 次；
+    在此之內結果一定是最佳解，超過時採用帶狀範圍內的最佳結果。
+    """
+    n, m = len(ref), len(hyp)
+    if n == 0 or m == 0:
+        return ["delete"] * n + ["insert"] * m
+    if n * m <= SMALL_GAP_CELLS:
+        return _small_operations(ref.tolist(), hyp.tolist())
+
+    band = ALIGN_BAND if band is None else band
+    # 帶寬至少要能容納斜率造成的逐列位移
+    band = max(band, -(-m // n) + 1)
+    max_band = band * 2 ** ALIGN_BAND_DOUBLINGS
+    while True:
+        lo, hi = _band_bounds(n, m, band)
+        cost, pointers = _banded_table(ref, hyp, lo, hi, 2 * band + 1)
+        if band >= m or band >= max_band or cost <= _outside_band_bound(n, m, lo, hi):
+            break
+        band *= 2
+
+    # 從 (n, m) 回溯
+    operations = []
+    i, j = n, m
+    while i > 0 or j > 0:
+        if i == 0:
+            move = _LEFT
+        else:
+            move = pointers[i, j - lo[i]] if j >= lo[i] else _UP
+            if j == 0:
+                move = _UP
+        if move == _DIAGONAL:
+            operations.append("equal" if ref[i - 1] == hyp[j - 1] else "replace")
+            i, j = i - 1, j - 1
+        elif move == _UP:
+            operations.append("delete")
+            i -= 1
+        else:
+            operations.append("insert")
+            j -= 1
+    operations.reverse()
+    return operations
+
+
+def align_words(reference: Sequence[str], hypothesis: Sequence[str], band: int = None) -> List[Opcode]:
+    """
+    對齊參考文字與辨識出的字，回傳與 difflib.SequenceMatcher.get_opcodes() 相同格式的
+    (tag, i1, i2, j1, j2)；連續的非相等操作合併成一個 opcode。
+    """
+    operations = edit_operations(reference, hypothesis, band)
+    opcodes: List[Opcode] = []
+    i = j = 0
+    start_i = start_j = 0
+    pending_equal = None
+    for operation in operations + [None]:
+        is_equal = operation == "equal"
+        if pending_equal is not None and (operation is None or is_equal != pending_equal):
+            if pending_equal:
+                opcodes.append(("equal", start_i, i, start_j, j))
+            elif i > start_i and j > start_j:
+                opcodes.append(("replace", start_i, i, start_j, j))
+            elif i > start_i:
+                opcodes.append(("delete", start_i, i, start_j, j))
+            else:
+                opcodes.append(("insert", start_i, i, start_j, j))
+            start_i, start_j = i, j
+        if operation is None:
+            break
+        pending_equal = is_equal
+        if operation in ("equal", "replace", "delete"):
+            i += 1
+        if operation in ("equal", "replace", "insert"):
+            j += 1
+    return opcodes
+
+
+def aggregate_scores(reference_words: Sequence[str], words: Sequence[str], accuracy: np.ndarray,
+                     errors: np.ndarray, fluency: np.ndarray, prosody: np.ndarray, durations: np.ndarray,
+                     band: int = None) -> dict:
+    """
+    對齊並計算總體分數。words/accuracy/errors 為所有段落串接後的逐字資料，
+    fluency/prosody/durations 為每段一個值。辨識結果中多出的字標為 'Insertion'，
+    參考文字中缺少的字補上 'Omission'（0 分）。
+    """
+    accuracy = np.asarray(accuracy, dtype=np.float64)
+    errors = np.asarray(errors, dtype=np.int8)
+
+    opcodes = align_words(reference_words, [w.lower() for w in words], band)
+    inserted = np.zeros(len(words), dtype=bool)
+    order = []  # (來源, 起點, 終點)：來源 0 為辨識結果，1 為參考文字中缺少的字
+    for tag, i1, i2, j1, j2 in opcodes:
+        if tag in ("insert", "replace"):
+            inserted[j1:j2] = True
+            order.append((0, j1, j2))
+        if tag in ("delete", "replace"):
+            order.append((1, i1, i2))
+        if tag == "equal":
+            order.append((0, j1, j2))
+    final_errors = errors.copy()
+    final_errors[inserted & (errors == ERROR_NONE)] = ERROR_INSERTION
+    # 完整度只計算對齊後仍判定正確的字
+    correct = int(np.count_nonzero(final_errors == ERROR_NONE))
+
+    omitted = sum(i2 - i1 for source, i1, i2 in order if source == 1)
+    scored = accuracy[final_errors != ERROR_INSERTION]
+    total = scored.sum()
+    count = len(scored) + omitted
+    accuracy_score = float(total / count) if count else 0.0
+
+    durations = np.asarray(durations, dtype=np.float64)
+    fluency_score = float(np.dot(fluency, durations) / durations.sum()) if durations.sum() else 0.0
+    completeness_score = min(correct / len(reference_words) * 100, 100) if len(reference_words) else 0.0
+    prosody_score = float(np.mean(prosody)) if len(prosody) else 0.0
+    pron_score = accuracy_score * 0.4 + prosody_score * 0.2 + fluency_score * 0.2 + completeness_score * 0.2
+
+    words_result = []
+    for source, start, end in order:
+        if source == 0:
+            words_result.extend(
+                {"word": words[k], "accuracy_score": float(accuracy[k]), "error_type": ERROR_TYPES[final_errors[k]]}
+                for k in range(start, end)
+            )
+        else:
+            words_result.extend(
+                {"word": reference_words[k], "accuracy_score": 0.0, "error_type": "Omission"}
+                for k in range(start, end)
+            )
+
+    return {
+        "pronunciation_score": pron_score,
+        "accuracy_score": accuracy_score,
+        "completeness_score": completeness_score,
+        "fluency_score": fluency_score,
+        "prosody_score": prosody_score,
+        "words": words_result,
+    }
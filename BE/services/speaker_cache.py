@@ -0,0 +1,110 @@
+import hashlib
+import logging
+import os
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import torch
+
+logger = logging.getLogger(__name__)
+
+
+def file_sha256(path: str, block_size: int = 1024 * 1024) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class SpeakerLatentCache:
+    """
+    XTTS 說話者條件向量（GPT conditioning latent 與 speaker embedding）的快取。
+    以參考音檔內容的 SHA-256 為鍵，先查記憶體中的 LRU，再查磁碟上的 .npz。
+    """
+
+    def __init__(self, cache_dir: str, max_entries: int = 32):
+        self.cache_dir = cache_dir
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        # (路徑, mtime, 大小) -> 內容雜湊，避免每次請求都重新讀檔計算
+        self._hashes = {}
+        self._lock = threading.Lock()
+
+    def speaker_key(self, speaker_wav: str) -> str:
+        stat = os.stat(speaker_wav)
+        file_key = (os.path.abspath(speaker_wav), stat.st_mtime_ns, stat.st_size)
+        key = self._hashes.get(file_key)
+        if key is None:
+            key = file_sha256(speaker_wav)
+            self._hashes[file_key] = key
+        return key
+
+    def _disk_path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, f"{key}.npz")
+
+    def _remember(self, key, latents):
+        self._entries[key] = latents
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def _load_from_disk(self, key, device):
+        path = self._disk_path(key)
+        if not os.path.isfile(path):
+            return None
+        try:
+            with np.load(path) as data:
+                gpt_cond_latent = torch.from_numpy(data["gpt_cond_latent"]).to(device)
+                speaker_embedding = torch.from_numpy(data["speaker_embedding"]).to(device)
+            return gpt_cond_latent, speaker_embedding
+        except Exception as e:
+            logger.warning(f"Failed to load cached speaker latents from {path}: {e}")
+            return None
+
+    def _save_to_disk(self, key, gpt_cond_latent, speaker_embedding):
+        os.makedirs(self.cache_dir, exist_ok=True)
+        path = self._disk_path(key)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        try:
+            with open(tmp_path, "wb") as f:
+                np.savez(
+                    f,
+                    gpt_cond_latent=gpt_cond_latent.detach().cpu().numpy(),
+                    speaker_embedding=speaker_embedding.detach().cpu().numpy(),
+                )
+            os.replace(tmp_path, path)
+        except Exception as e:
+            logger.warning(f"Failed to persist speaker latents to {path}: {e}")
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    def get(self, xtts_model, speaker_wav: str):
+        """
+        取得參考音檔的條件向量，必要時才由模型重新計算。
+        :param xtts_model: XTTS 模型（tts.synthesizer.tts_model）
+        :param speaker_wav: 參考音檔路徑
+        :return: (gpt_cond_latent, speaker_embedding)
+        """
+        key = self.speaker_key(speaker_wav)
+        with self._lock:
+            latents = self._entries.get(key)
+            if latents is not None:
+                self._entries.move_to_end(key)
+                return latents
+
+            latents = self._load_from_disk(key, xtts_model.device)
+            if latents is None:
+                logger.info(f"Computing speaker latents for {speaker_wav}")
+                config = xtts_model.config
+                latents = xtts_model.get_conditioning_latents(
+                    audio_path=[speaker_wav],
+                    gpt_cond_len=config.gpt_cond_len,
+                    gpt_cond_chunk_len=config.gpt_cond_chunk_len,
+                    max_ref_length=config.max_ref_len,
+                    sound_norm_refs=config.sound_norm_refs,
+                )
+                self._save_to_disk(key, *latents)
+            self._remember(key, latents)
+            return latents
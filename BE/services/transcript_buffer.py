@@ -0,0 +1,165 @@
+import asyncio
+import logging
+import os
+import sqlite3
+import time
+from typing import Optional
+
+from services.voice_record_repository import VoiceRecordRepository, voice_record_repository
+
+logger = logging.getLogger(__name__)
+
+TRANSCRIPT_FLUSH_INTERVAL_S = float(os.getenv('TRANSCRIPT_FLUSH_INTERVAL_S', '2'))
+TRANSCRIPT_FLUSH_BYTES = int(os.getenv('TRANSCRIPT_FLUSH_BYTES', '4096'))
+# 超過此秒數沒有新草稿的 'transcribing' 串流記錄視為已中斷（伺服器當機或重啟）
+TRANSCRIPT_STALE_SECONDS = float(os.getenv('TRANSCRIPT_STALE_SECONDS', '600'))
+
+INTERRUPTED_MESSAGE = "Streaming transcription was interrupted"
+
+
+def append_transcript_draft(conn: sqlite3.Connection, record_id: int, seq: int, text: str, size: int):
+    """附加一段草稿並更新大小；只寫入新增的文字，不改動 transcript 欄位，也不觸發全文索引。"""
+    with conn:
+        conn.execute(
+            "INSERT INTO transcript_draft (record_id, seq, text, created_at) VALUES (?, ?, ?, ?)",
+            (record_id, seq, text, time.time())
+        )
+        conn.execute("UPDATE voice_record SET size = ? WHERE id = ?", (size, record_id))
+
+
+def finalize_transcript(conn: sqlite3.Connection, record_id: int, transcript: str, status: str,
+                        error_message: Optional[str] = None, **fields):
+    """在單一交易中寫入完整逐字稿與最終狀態，並刪除草稿。"""
+    fields = dict(fields, transcript=transcript, status=status, error_message=error_message)
+    assignments = ", ".join(f"{name} = ?" for name in fields)
+    with conn:
+        conn.execute(f"UPDATE voice_record SET {assignments} WHERE id = ?", (*fields.values(), record_id))
+        conn.execute("DELETE FROM transcript_draft WHERE record_id = ?", (record_id,))
+
+
+def recover_interrupted_transcripts(conn: sqlite3.Connection, stale_after: float = TRANSCRIPT_STALE_SECONDS) -> int:
+    """
+    把停在 'transcribing'、且超過 stale_after 秒沒有新草稿的串流轉譯記錄標為 'error'，
+    並以已寫入的草稿組回逐字稿。由非同步工作佇列處理的記錄由 job_queue 自行回收，不在此處理。
+    :return: 回收的記錄數
+    """
+    cutoff = time.time() - stale_after
+    with conn:
+        cursor = conn.execute(
+            '''
+            SELECT v.id FROM voice_record v
+            WHERE v.status = 'transcribing'
+              AND NOT EXISTS (SELECT 1 FROM transcription_job j WHERE j.voice_record_id = v.id)
+              AND COALESCE(
+                  (SELECT MAX(d.created_at) FROM transcript_draft d WHERE d.record_id = v.id),
+                  CAST(strftime('%s', v.createtime) AS REAL)
+              ) < ?
+            ''',
+            (cutoff,)
+        )
+        record_ids = [row[0] for row in cursor.fetchall()]
+        for record_id in record_ids:
+            parts = conn.execute(
+                "SELECT text FROM transcript_draft WHERE record_id = ? ORDER BY seq", (record_id,)
+            ).fetchall()
+            logger.warning(f"Recovering interrupted streaming transcription for voice record {record_id}")
+            conn.execute(
+                "UPDATE voice_record SET transcript = ?, status = 'error', error_message = ? WHERE id = ?",
+                ("".join(part[0] for part in parts), INTERRUPTED_MESSAGE, record_id)
+            )
+            conn.execute("DELETE FROM transcript_draft WHERE record_id = ?", (record_id,))
+    return len(record_ids)
+
+
+class TranscriptBuffer:
+    """
+    串流轉譯中的逐字稿寫回緩衝。每個 chunk 只附加到記憶體中的串列（O(1)），
+    累積超過 flush_bytes 或距上次寫入超過 flush_interval 秒時，才在背景把上次寫入後
+    新增的文字附加為一筆 transcript_draft；同一時間最多只有一個寫入在進行，總寫入量與逐字稿長度成正比。
+    close() 會等待進行中的寫入，再以單一交易寫入完整的逐字稿、大小與狀態並刪除草稿。
+    """
+
+    # 背景關閉的 task 需保留參照，避免在完成前被回收
+    _background_closes = set()
+
+    def __init__(self, record_id: int, repository: VoiceRecordRepository = voice_record_repository,
+                 flush_interval: float = TRANSCRIPT_FLUSH_INTERVAL_S,
+                 flush_bytes: int = TRANSCRIPT_FLUSH_BYTES):
+        self.record_id = record_id
+        self.repository = repository
+        self.flush_interval = flush_interval
+        self.flush_bytes = flush_bytes
+        self.size = 0
+        self.closed = False
+        self._parts = []
+        self._flushed_parts = 0
+        self._seq = 0
+        self._pending_bytes = 0
+        self._last_flush = time.monotonic()
+        self._flush_task: Optional[asyncio.Task] = None
+
+    @property
+    def text(self) -> str:
+        return "".join(self._parts)
+
+    def append(self, chunk: str):
+        """附加一段逐字稿；必要時排程背景寫入，不等待資料庫。"""
+        nbytes = len(chunk.encode('utf-8'))
+        self._parts.append(chunk)
+        self.size += nbytes
+        self._pending_bytes += nbytes
+        if self._flush_task is not None and not self._flush_task.done():
+            return
+        if (self._pending_bytes >= self.flush_bytes
+                or time.monotonic() - self._last_flush >= self.flush_interval):
+            self._flush_task = asyncio.create_task(self._flush())
+
+    async def _flush(self):
+        end = len(self._parts)
+        delta, size = "".join(self._parts[self._flushed_parts:end]), self.size
+        self._pending_bytes = 0
+        self._last_flush = time.monotonic()
+        try:
+            await self.repository.run_write(append_transcript_draft, self.record_id, self._seq, delta, size)
+            self._flushed_parts = end
+            self._seq += 1
+        except Exception as e:
+            # 中途寫入失敗不影響串流，未寫入的文字留到下次寫入，最終狀態由 close() 寫入
+            logger.error(f"Error flushing transcript for voice record {self.record_id}: {e}")
+
+    async def close(self, status: str, error_message: Optional[str] = None, **fields):
+        """等待進行中的寫入後，一次寫入完整逐字稿與最終狀態。"""
+        if self._flush_task is not None:
+            await self._flush_task
+            self._flush_task = None
+        await self.repository.run_write(
+            finalize_transcript, self.record_id, self.text, status, error_message, size=self.size, **fields
+        )
+        self.closed = True
+
+    def close_in_background(self, status: str, error_message: Optional[str] = None, **fields):
+        """
+        在獨立的 task 中寫入最終狀態。用戶端斷線時串流的 generator 會被取消，
+        在其中等待的寫入也會被取消，因此改由不受取消影響的 task 完成。
+        """
+        async def _close():
+            try:
+                await self.close(status, error_message, **fields)
+            except Exception as e:
+                logger.error(f"Error closing transcript for voice record {self.record_id}: {e}")
+
+        task = asyncio.get_running_loop().create_task(_close())
+        self._background_closes.add(task)
+        task.add_done_callback(self._background_closes.discard)
+        return task
+
+
+async def run_transcript_recovery(repository: VoiceRecordRepository = voice_record_repository,
+                                  stale_after: float = TRANSCRIPT_STALE_SECONDS):
+    """啟動時與之後每 stale_after / 2 秒回收一次已中斷的串流轉譯記錄，直到被取消。"""
+    while True:
+        try:
+            await repository.run_write(recover_interrupted_transcripts, stale_after)
+        except Exception as e:
+            logger.error(f"Error recovering interrupted transcriptions: {e}")
+        await asyncio.sleep(stale_after / 2)
@@ -0,0 +1,158 @@
+import hashlib
+import json
+import logging
+import sqlite3
+import time
+
+import numpy as np
+
+from src.asr_backends import DEFAULT_ASR_MODEL
+
+logger = logging.getLogger(__name__)
+
+
+def fingerprint_pcm(audio_data: np.ndarray) -> str:
+    """正規化後 16kHz 單聲道 PCM 的雜湊，不同容器格式的相同錄音也能命中。"""
+    return hashlib.sha256(np.ascontiguousarray(audio_data).data).hexdigest()
+
+
+def _namespaced(value: str, model: str = None):
+    """非預設模型的結果以模型別名為前綴分開存放，預設模型沿用原本的鍵。"""
+    if value is None or not model or model == DEFAULT_ASR_MODEL:
+        return value
+    return f"{model}:{value}"
+
+
+class TranscriptionCache:
+    """
+    以音訊指紋查詢先前完成的轉譯結果。索引存放在 transcription_cache 表格，
+    主鍵為 (fingerprint, return_timestamps)；上傳雜湊另存於 transcription_upload，
+    每個上傳雜湊一筆、對應到它解碼後的 PCM 指紋，同一段錄音的多種上傳格式都能略過解碼。
+    項目數超過 max_entries 時依 last_access 淘汰最久未使用的項目。
+    """
+
+    def __init__(self, max_entries: int = 10000, evict_interval: int = 100):
+        self.max_entries = max_entries
+        self.evict_interval = evict_interval
+        self._stores_since_evict = 0
+
+    def _touch(self, conn: sqlite3.Connection, fingerprint: str, return_timestamps: bool, upload_hash: str = None):
+        now = time.time()
+        cursor = conn.cursor()
+        cursor.execute(
+            "UPDATE transcription_cache SET last_access = ? WHERE fingerprint = ? AND return_timestamps = ?",
+            (now, fingerprint, int(return_timestamps))
+        )
+        if upload_hash:
+            self._remember_upload(cursor, upload_hash, fingerprint, now)
+        conn.commit()
+
+    @staticmethod
+    def _remember_upload(cursor: sqlite3.Cursor, upload_hash: str, fingerprint: str, now: float):
+        cursor.execute(
+            '''
+            INSERT INTO transcription_upload (upload_hash, fingerprint, last_access) VALUES (?, ?, ?)
+            ON CONFLICT(upload_hash) DO UPDATE SET fingerprint = excluded.fingerprint, last_access = excluded.last_access
+            ''',
+            (upload_hash, fingerprint, now)
+        )
+
+    def _lookup(self, conn: sqlite3.Connection, condition: str, value: str, return_timestamps: bool):
+        cursor = conn.cursor()
+        cursor.execute(
+            f'''
+            SELECT c.fingerprint, c.voice_record_id, c.result, c.duration
+            FROM transcription_cache c
+            JOIN voice_record v ON v.id = c.voice_record_id
+            WHERE {condition} AND c.return_timestamps = ? AND v.status = 'completed'
+            ''',
+            (value, int(return_timestamps))
+        )
+        row = cursor.fetchone()
+        if not row:
+            return None
+        fingerprint, voice_record_id, result, duration = row
+        return {
+            "fingerprint": fingerprint,
+            "voice_record_id": voice_record_id,
+            "transcription": json.loads(result),
+            "duration": duration,
+        }
+
+    def lookup_upload(self, conn: sqlite3.Connection, upload_hash: str, return_timestamps: bool, model: str = None):
+        """以上傳檔案雜湊查詢，命中時可完全略過解碼。"""
+        upload_hash = _namespaced(upload_hash, model)
+        try:
+            hit = self._lookup(
+                conn, "c.fingerprint = (SELECT fingerprint FROM transcription_upload WHERE upload_hash = ?)",
+                upload_hash, return_timestamps
+            )
+            if hit:
+                self._touch(conn, hit["fingerprint"], return_timestamps, upload_hash)
+            return hit
+        except sqlite3.Error as e:
+            logger.error(f"Error looking up transcription cache: {e}")
+            return None
+
+    def lookup_pcm(self, conn: sqlite3.Connection, fingerprint: str, return_timestamps: bool, upload_hash: str = None,
+                   model: str = None):
+        """以 PCM 指紋查詢，命中時記住這次的上傳雜湊供下次快速比對；其他上傳雜湊的對應不受影響。"""
+        try:
+            hit = self._lookup(conn, "c.fingerprint = ?", _namespaced(fingerprint, model), return_timestamps)
+            if hit:
+                self._touch(conn, hit["fingerprint"], return_timestamps, _namespaced(upload_hash, model))
+            return hit
+        except sqlite3.Error as e:
+            logger.error(f"Error looking up transcription cache: {e}")
+            return None
+
+    def store(self, conn: sqlite3.Connection, fingerprint: str, upload_hash: str, return_timestamps: bool,
+              voice_record_id: int, transcription, duration: float, model: str = None):
+        try:
+            now = time.time()
+            fingerprint = _namespaced(fingerprint, model)
+            cursor = conn.cursor()
+            cursor.execute(
+                '''
+                INSERT OR REPLACE INTO transcription_cache
+                    (fingerprint, return_timestamps, voice_record_id, result, duration, last_access)
+                VALUES (?, ?, ?, ?, ?, ?)
+                ''',
+                (fingerprint, int(return_timestamps), voice_record_id,
+                 json.dumps(transcription, ensure_ascii=False), duration, now)
+            )
+            if upload_hash:
+                self._remember_upload(cursor, _namespaced(upload_hash, model), fingerprint, now)
+            conn.commit()
+            self._stores_since_evict += 1
+            if self._stores_since_evict >= self.evict_interval:
+                self._stores_since_evict = 0
+                self.evict(conn)
+        except sqlite3.Error as e:
+            logger.error(f"Error storing transcription cache entry: {e}")
+
+    def evict(self, conn: sqlite3.Connection):
+        cursor = conn.cursor()
+        cursor.execute(
+            '''
+            DELETE FROM transcription_cache WHERE rowid IN (
+                SELECT rowid FROM transcription_cache ORDER BY last_access DESC LIMIT -1 OFFSET ?
+            )
+            ''',
+            (self.max_entries,)
+        )
+        if cursor.rowcount:
+            logger.info(f"Evicted {cursor.rowcount} transcription cache entries")
+        # 指紋已被淘汰的上傳雜湊，以及超過 max_entries 筆中最久未使用的上傳雜湊
+        cursor.execute(
+            '''
+            DELETE FROM transcription_upload
+            WHERE NOT EXISTS (
+                SELECT 1 FROM transcription_cache c WHERE c.fingerprint = transcription_upload.fingerprint
+            ) OR rowid IN (
+                SELECT rowid FROM transcription_upload ORDER BY last_access DESC LIMIT -1 OFFSET ?
+            )
+            ''',
+            (self.max_entries,)
+        )
+        conn.commit()
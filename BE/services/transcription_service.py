@@ -1,20 +1,107 @@
 import asyncio
 import json
+import os
 from typing import AsyncGenerator
 import logging
-from src.voice_model import transcribe_audio
+import numpy as np
+from src.voice_model import transcribe_audio, transcribe_audio_batch
+from services.batch_scheduler import TranscriptionBatchScheduler
+from services.inference_executor import asr_pool
+from services.vad import VAD_ENABLED, pack_speech
 import subprocess
 import re
 
 logger = logging.getLogger(__name__)
 
-async def transcribe_audio_streaming(audio_data, sampling_rate, return_timestamps) -> AsyncGenerator[str, None]:
+# 跨請求的 micro-batching 排程器
+batch_scheduler = TranscriptionBatchScheduler(
+    transcribe_audio_batch,
+    asr_pool,
+    max_batch_size=int(os.getenv('ASR_BATCH_MAX_SIZE', '16')),
+    max_wait_ms=float(os.getenv('ASR_BATCH_MAX_WAIT_MS', '50')),
+)
+
+# 串流轉譯的視窗設定：每個視窗 30 秒，與前一個視窗重疊 OVERLAP 秒
+STREAM_WINDOW_SECONDS = float(os.getenv('ASR_STREAM_WINDOW_SECONDS', '30'))
+STREAM_OVERLAP_SECONDS = float(os.getenv('ASR_STREAM_OVERLAP_SECONDS', '5'))
+
+def _select_window_chunks(chunks, offset, window_end, lower_bound, upper_bound):
+    """
+    把視窗內的 chunk 時間戳平移回原始時間軸，並只保留中點落在
+    [lower_bound, upper_bound) 之間的 chunk，避免重疊區域重複輸出。
+    """
+    selected = []
+    for chunk in chunks:
+        start, end = chunk.get("timestamp") or (None, None)
+        start = offset + (start or 0.0)
+        end = offset + end if end is not None else window_end
+        midpoint = (start + end) / 2
+        if midpoint < lower_bound or (upper_bound is not None and midpoint >= upper_bound):
+            continue
+        selected.append({"timestamp": (round(start, 2), round(end, 2)), "text": chunk["text"]})
+    return selected
+
+async def _as_frame_source(audio_source):
+    if isinstance(audio_source, np.ndarray):
+        yield audio_source
+    else:
+        async for frame in audio_source:
+            yield frame
+
+async def iter_stream_windows(audio_source, sampling_rate, window_seconds=STREAM_WINDOW_SECONDS, overlap_seconds=STREAM_OVERLAP_SECONDS):
+    """
+    將音訊切成互相重疊的視窗。輸入可以是逐步解碼的 frame 串流，
+    只保留約一個視窗長度的樣本在記憶體中。
+    :return: 產生 (視窗起點秒數, 視窗音訊, 是否為最後一個視窗)
+    """
+    window = int(window_seconds * sampling_rate)
+    step = window - int(overlap_seconds * sampling_rate)
+    if step <= 0:
+        raise ValueError("Overlap must be shorter than the window.")
+    buffer = np.zeros(0, dtype=np.float32)
+    offset = 0
+    async for frame in _as_frame_source(audio_source):
+        buffer = np.concatenate((buffer, frame)) if len(buffer) else frame
+        # 多讀到至少一個樣本才能確定目前視窗不是最後一個
+        while len(buffer) > window:
+            yield offset / sampling_rate, buffer[:window], False
+            buffer = buffer[step:]
+            offset += step
+    if len(buffer) or offset == 0:
+        yield offset / sampling_rate, buffer, True
+
+async def transcribe_audio_streaming(audio_source, sampling_rate, return_timestamps, segment_sink: list = None, model: str = None) -> AsyncGenerator[str, None]:
+    """
+    逐個視窗轉譯音訊，每個視窗完成後立即輸出結果，
+    因此第一段結果的延遲不會隨檔案長度增加。
+    :param audio_source: 完整的 float32 陣列，或逐步產生 float32 frame 的 async iterator
+    :param segment_sink: 若提供，會把平移回原始時間軸的片段附加到此列表
+    :param model: 模型別名，None 為預設模型
+    """
     try:
-        transcription = transcribe_audio(audio_data, sampling_rate, return_timestamps)
-        for transcription_part in transcription:
-            logger.info(f"Transcription part: {transcription_part}")
-            yield f"data: {json.dumps({'transcription': transcription_part})}\n\n"
-            await asyncio.sleep(0.1)
+        lower_bound = 0.0
+        async for offset, window_audio, is_last in iter_stream_windows(audio_source, sampling_rate):
+            window_end = offset + len(window_audio) / sampling_rate
+            # 重疊區域以中點切分給前後兩個視窗
+            upper_bound = None if is_last else window_end - STREAM_OVERLAP_SECONDS / 2
+            if len(window_audio) == 0:
+                break
+            chunks = await _transcribe_speech(window_audio, sampling_rate, True, model)
+            if chunks is None:
+                raise ValueError("Transcription failed or returned unexpected format.")
+            parts = _select_window_chunks(chunks, offset, window_end, lower_bound, upper_bound)
+            lower_bound = upper_bound
+            if segment_sink is not None:
+                segment_sink.extend(parts)
+            if return_timestamps:
+                for transcription_part in parts:
+                    logger.info(f"Transcription part: {transcription_part}")
+                    yield f"data: {json.dumps({'transcription': transcription_part})}\n\n"
+            else:
+                text = "".join(part["text"] for part in parts)
+                if text:
+                    logger.info(f"Transcription part: {text}")
+                    yield f"data: {json.dumps({'transcription': text})}\n\n"
     except Exception as e:
         logger.error(f"Error during streaming transcription: {e}")
         raise e
@@ -27,4 +114,43 @@ def transcribe_audio_single(audio_data, sampling_rate, return_timestamps):
         logger.error(f"Error during transcription: {e}")
         raise e
 
+async def _transcribe_speech(audio_data, sampling_rate, return_timestamps, model=None):
+    """
+    先以 VAD 移除靜音再送進 batch 排程器，時間戳對應回原始時間軸。
+    完全沒有語音時不呼叫模型，直接回傳空結果。
+    """
+    if not VAD_ENABLED:
+        return await batch_scheduler.submit(audio_data, sampling_rate, return_timestamps, model)
+    packed = await asyncio.to_thread(pack_speech, audio_data, sampling_rate)
+    if not packed.has_speech:
+        return [] if return_timestamps else ""
+    result = await batch_scheduler.submit(packed.samples, sampling_rate, return_timestamps, model)
+    if return_timestamps and result is not None:
+        result = packed.timeline.remap_chunks(result)
+    return result
+
+def transcribe_speech_sync(audio_data, sampling_rate, return_timestamps, model=None):
+    """_transcribe_speech 的同步版本，供背景工作行程使用，不經過 batch 排程器。"""
+    packed = pack_speech(audio_data, sampling_rate) if VAD_ENABLED else None
+    if packed is not None and not packed.has_speech:
+        return [] if return_timestamps else ""
+    samples = packed.samples if packed is not None else audio_data
+    result = transcribe_audio_batch([samples], sampling_rate, return_timestamps, batch_size=1, model=model)[0]
+    if isinstance(result, Exception):
+        raise result
+    if return_timestamps and packed is not None:
+        result = packed.timeline.remap_chunks(result)
+    return result
+
+async def transcribe_audio_batched(audio_data, sampling_rate, return_timestamps, model=None):
+    try:
+        return await _transcribe_speech(audio_data, sampling_rate, return_timestamps, model)
+    except Exception as e:
+        logger.error(f"Error during batched transcription: {e}")
+        raise e
+
+def check_transcription_capacity():
+    batch_scheduler.check_capacity()
 
+def get_batch_metrics():
+    return batch_scheduler.metrics.snapshot()
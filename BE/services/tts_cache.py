@@ -0,0 +1,96 @@
+import hashlib
+import json
+import logging
+import os
+import shutil
+import sqlite3
+import time
+
+logger = logging.getLogger(__name__)
+
+
+def synthesis_cache_key(prompt: str, speaker_key: str, language: str, model_id: str) -> str:
+    """以 (prompt, 說話者參考音檔雜湊, 語言, 模型) 計算內容定址的快取鍵。"""
+    payload = json.dumps([prompt, speaker_key, language, model_id], ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class TTSOutputCache:
+    """
+    TTS 輸出的內容定址快取。音檔存放在 cache_dir/<key 前兩碼>/<key>.wav，
+    索引存放在 SQLite 的 tts_cache 表格，總大小超過 max_bytes 時依 LRU 淘汰。
+    快取檔與輸出檔之間一律複製而不使用 hard link，淘汰快取檔時才會真正釋放空間。
+    """
+
+    def __init__(self, cache_dir: str, max_bytes: int):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+
+    def _cache_path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, key[:2], f"{key}.wav")
+
+    def lookup(self, conn: sqlite3.Connection, key: str):
+        """
+        查詢快取並更新存取時間。
+        :return: 包含 filepath、duration、size 的字典，未命中時為 None
+        """
+        try:
+            cursor = conn.cursor()
+            cursor.execute("SELECT filepath, duration, size FROM tts_cache WHERE cache_key = ?", (key,))
+            row = cursor.fetchone()
+            if not row:
+                return None
+            filepath, duration, size = row
+            if not os.path.isfile(filepath):
+                # 索引存在但檔案已遺失，視為未命中
+                cursor.execute("DELETE FROM tts_cache WHERE cache_key = ?", (key,))
+                conn.commit()
+                return None
+            cursor.execute(
+                "UPDATE tts_cache SET hits = hits + 1, last_access = ? WHERE cache_key = ?",
+                (time.time(), key)
+            )
+            conn.commit()
+            return {"filepath": filepath, "duration": duration, "size": size}
+        except sqlite3.Error as e:
+            logger.error(f"Error looking up TTS cache: {e}")
+            return None
+
+    def store(self, conn: sqlite3.Connection, key: str, source_path: str, duration: float, language: str, model_id: str):
+        """把剛生成的音檔加入快取，並在超過容量時淘汰最久未使用的項目。"""
+        cache_path = self._cache_path(key)
+        try:
+            os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+            if not os.path.exists(cache_path):
+                shutil.copyfile(source_path, cache_path)
+            cursor = conn.cursor()
+            cursor.execute(
+                '''
+                INSERT OR REPLACE INTO tts_cache (cache_key, filepath, duration, size, language, model_id, hits, last_access)
+                VALUES (?, ?, ?, ?, ?, ?, 0, ?)
+                ''',
+                (key, cache_path, duration, os.path.getsize(cache_path), language, model_id, time.time())
+            )
+            conn.commit()
+            self.evict(conn)
+        except (OSError, sqlite3.Error) as e:
+            logger.error(f"Error storing TTS output in cache: {e}")
+
+    def evict(self, conn: sqlite3.Connection):
+        cursor = conn.cursor()
+        cursor.execute("SELECT COALESCE(SUM(size), 0) FROM tts_cache")
+        total = cursor.fetchone()[0]
+        while total > self.max_bytes:
+            cursor.execute("SELECT cache_key, filepath, size FROM tts_cache ORDER BY last_access LIMIT 32")
+            rows = cursor.fetchall()
+            if not rows:
+                break
+            for key, filepath, size in rows:
+                if total <= self.max_bytes:
+                    break
+                cursor.execute("DELETE FROM tts_cache WHERE cache_key = ?", (key,))
+                if os.path.exists(filepath):
+                    os.remove(filepath)
+                total -= size
+                logger.info(f"Evicted TTS cache entry {key} ({size} bytes)")
+            conn.commit()
@@ -1,22 +1,140 @@
+import asyncio
+import os
+import struct
+from typing import AsyncGenerator, Optional
+import numpy as np
 import torch
-from TTS.api import TTS
 import logging
+from services.inference_executor import tts_pool, PoolReservation
+from services.speaker_cache import SpeakerLatentCache
+from services.tts_cache import TTSOutputCache, synthesis_cache_key
+from services.model_registry import model_registry
+from services.inference_host import get_inference_host_client
 
 logger = logging.getLogger(__name__)
 
-tts = None
+TTS_MODEL_ID = "tts_models/multilingual/multi-dataset/xtts_v2"
+
+DEFAULT_SPEAKER_WAV = os.path.join('pekora', "pekora.wav")
+
+speaker_cache = SpeakerLatentCache(
+    cache_dir=os.getenv('SPEAKER_CACHE_DIR', 'speaker_cache'),
+    max_entries=int(os.getenv('SPEAKER_CACHE_MAX_ENTRIES', '32')),
+)
+
+tts_output_cache = TTSOutputCache(
+    cache_dir=os.getenv('TTS_CACHE_DIR', 'ttsCache'),
+    max_bytes=int(os.getenv('TTS_CACHE_MAX_BYTES', str(2 * 1024 ** 3))),
+)
+
+def _load_tts():
+    from TTS.api import TTS
 
-def initialize_tts():
-    global tts
     device = "cuda:0" if torch.cuda.is_available() else "cpu"
     logger.info(f"Using device for TTS: {device}")
-    tts = TTS("tts_models/multilingual/multi-dataset/xtts_v2").to(device)
+    tts = TTS(TTS_MODEL_ID).to(device)
     logger.info("TTS model initialized successfully.")
+    # 預先計算預設說話者的條件向量
+    speaker_cache.get(tts.synthesizer.tts_model, DEFAULT_SPEAKER_WAV)
+    logger.info(f"Speaker latents warmed for: {DEFAULT_SPEAKER_WAV}")
+    return tts
+
+model_registry.register("tts", _load_tts)
+
+def get_tts():
+    """取得 TTS 模型，尚未載入時會在目前的執行緒中載入。"""
+    return model_registry.get("tts")
+
+def _inference_settings(config) -> dict:
+    """與 Xtts.synthesize 相同，取模型設定中的取樣參數；輸入已逐句切分，不再由模型切分。"""
+    return {
+        "temperature": config.temperature,
+        "length_penalty": config.length_penalty,
+        "repetition_penalty": config.repetition_penalty,
+        "top_k": config.top_k,
+        "top_p": config.top_p,
+        "enable_text_splitting": getattr(config, "enable_text_splitting", False),
+    }
+
+def synthesize_sentence(sentence: str, speaker_wav: str, language: str = "en") -> np.ndarray:
+    """使用快取的說話者條件向量直接進行 XTTS 推論，回傳 float32 波形。"""
+    client = get_inference_host_client()
+    if client is not None:
+        return client.synthesize_sentence(sentence, speaker_wav, language)
+    xtts = get_tts().synthesizer.tts_model
+    gpt_cond_latent, speaker_embedding = speaker_cache.get(xtts, speaker_wav)
+    out = xtts.inference(
+        sentence, language, gpt_cond_latent, speaker_embedding, **_inference_settings(xtts.config)
+    )
+    wav = out["wav"]
+    if torch.is_tensor(wav):
+        wav = wav.cpu().numpy()
+    return np.asarray(wav, dtype=np.float32).squeeze()
+
+def get_synthesis_cache_key(prompt: str, speaker_wav: str, language: str = "en") -> str:
+    return synthesis_cache_key(prompt, speaker_cache.speaker_key(speaker_wav), language, TTS_MODEL_ID)
+
+def split_sentences(prompt: str):
+    client = get_inference_host_client()
+    if client is not None:
+        return client.split_sentences(prompt)
+    return get_tts().synthesizer.split_into_sentences(prompt)
+
+def get_output_sample_rate() -> int:
+    client = get_inference_host_client()
+    if client is not None:
+        return client.get_output_sample_rate()
+    return get_tts().synthesizer.output_sample_rate
+
+def synthesize_to_file(prompt: str, speaker_wav: str, output_path: str, language: str = "en"):
+    """逐句合成並寫出 WAV 檔。"""
+    client = get_inference_host_client()
+    if client is not None:
+        return client.synthesize_to_file(prompt, speaker_wav, output_path, language)
+    wavs = [synthesize_sentence(sentence, speaker_wav, language) for sentence in split_sentences(prompt)]
+    if not wavs:
+        raise ValueError("Prompt did not contain any text to synthesize.")
+    get_tts().synthesizer.save_wav(wav=np.concatenate(wavs), path=output_path)
+
+def to_pcm16(wav: np.ndarray) -> bytes:
+    return (np.clip(wav, -1.0, 1.0) * 32767).astype("<i2").tobytes()
+
+def wav_stream_header(sample_rate: int, channels: int = 1, bits_per_sample: int = 16) -> bytes:
+    """串流用的 WAV 標頭，總長度未知，因此 RIFF 與 data 大小填入最大值。"""
+    byte_rate = sample_rate * channels * bits_per_sample // 8
+    block_align = channels * bits_per_sample // 8
+    return (
+        b"RIFF" + struct.pack("<I", 0xFFFFFFFF) + b"WAVE"
+        + b"fmt " + struct.pack("<IHHIIHH", 16, 1, channels, sample_rate, byte_rate, block_align, bits_per_sample)
+        + b"data" + struct.pack("<I", 0xFFFFFFFF)
+    )
+
+async def generate_voice_stream(prompt: str, speaker_wav: str, language: str = "en",
+                                reservation: Optional[PoolReservation] = None) -> AsyncGenerator[np.ndarray, None]:
+    """
+    逐句合成，每一句完成後立即產出其波形。
+    整段串流只佔用 tts_pool 的一個名額：呼叫端可傳入事先取得的 reservation，否則在開始時預留，
+    避免串流途中因佇列已滿而被截斷。
+    """
+    # 模型可能尚未載入，避免在 event loop 上載入
+    sentences = await asyncio.to_thread(split_sentences, prompt)
+    if not sentences:
+        raise ValueError("Prompt did not contain any text to synthesize.")
+    owned = reservation is None
+    if owned:
+        reservation = tts_pool.reserve()
+    try:
+        for sentence in sentences:
+            logger.info(f"Synthesizing sentence: {sentence}")
+            yield await reservation.run(synthesize_sentence, sentence, speaker_wav, language)
+    finally:
+        if owned:
+            reservation.release()
 
 async def generate_voice(prompt: str, speaker_wav: str, output_path: str):
     try:
         logger.info(f"Generating voice for prompt: {prompt}")
-        tts.tts_to_file(prompt, speaker_wav=speaker_wav, language="en", file_path=output_path)
+        await tts_pool.run(synthesize_to_file, prompt, speaker_wav, output_path)
         logger.info(f"Voice generated and saved to: {output_path}")
     except Exception as e:
         logger.error(f"Error during voice generation: {e}")
@@ -0,0 +1,145 @@
+import bisect
+import logging
+import os
+from dataclasses import dataclass
+from typing import List, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+VAD_ENABLED = os.getenv('ASR_VAD', '1') == '1'
+VAD_FRAME_MS = float(os.getenv('VAD_FRAME_MS', '30'))
+# 絕對門檻（dBFS）；實際門檻取此值與「背景噪音 + VAD_NOISE_MARGIN_DB」的較大者，
+# 但不超過 VAD_MAX_THRESHOLD_DB，避免沒有停頓的連續語音把噪音估計拉高而被整段捨棄
+VAD_THRESHOLD_DB = float(os.getenv('VAD_THRESHOLD_DB', '-45'))
+VAD_NOISE_MARGIN_DB = float(os.getenv('VAD_NOISE_MARGIN_DB', '10'))
+VAD_MAX_THRESHOLD_DB = float(os.getenv('VAD_MAX_THRESHOLD_DB', '-30'))
+VAD_MIN_SPEECH_MS = float(os.getenv('VAD_MIN_SPEECH_MS', '250'))
+VAD_MIN_SILENCE_MS = float(os.getenv('VAD_MIN_SILENCE_MS', '500'))
+VAD_PAD_MS = float(os.getenv('VAD_PAD_MS', '200'))
+
+
+def detect_speech(samples: np.ndarray, sampling_rate: int) -> List[Tuple[int, int]]:
+    """
+    以每個 frame 的 RMS 能量判斷語音區段，回傳 [(起點樣本, 終點樣本)]。
+    短於 VAD_MIN_SILENCE_MS 的靜音會併入前後語音，短於 VAD_MIN_SPEECH_MS 的語音會被捨棄，
+    每個區段前後各保留 VAD_PAD_MS 避免切掉字首字尾。
+    """
+    frame = max(1, int(sampling_rate * VAD_FRAME_MS / 1000))
+    n_frames = len(samples) // frame
+    if n_frames == 0:
+        return [(0, len(samples))] if len(samples) else []
+
+    frames = samples[:n_frames * frame].reshape(n_frames, frame)
+    rms = np.sqrt(np.mean(np.square(frames, dtype=np.float32), axis=1))
+    db = 20 * np.log10(rms + 1e-10)
+    noise_floor = float(np.percentile(db, 10))
+    threshold = max(VAD_THRESHOLD_DB, min(noise_floor + VAD_NOISE_MARGIN_DB, VAD_MAX_THRESHOLD_DB))
+    voiced = db > threshold
+
+    # 找出連續的語音 frame 區間
+    edges = np.diff(np.concatenate(([0], voiced.astype(np.int8), [0])))
+    starts = np.flatnonzero(edges == 1)
+    ends = np.flatnonzero(edges == -1)
+
+    min_silence = VAD_MIN_SILENCE_MS / VAD_FRAME_MS
+    min_speech = VAD_MIN_SPEECH_MS / VAD_FRAME_MS
+    merged: List[List[int]] = []
+    for start, end in zip(starts, ends):
+        if merged and start - merged[-1][1] < min_silence:
+            merged[-1][1] = end
+        else:
+            merged.append([start, end])
+
+    pad = int(sampling_rate * VAD_PAD_MS / 1000)
+    segments: List[Tuple[int, int]] = []
+    for start, end in merged:
+        if end - start < min_speech:
+            continue
+        start_sample = max(0, int(start) * frame - pad)
+        end_sample = min(len(samples), int(end) * frame + pad)
+        if segments and start_sample <= segments[-1][1]:
+            segments[-1] = (segments[-1][0], end_sample)
+        else:
+            segments.append((start_sample, end_sample))
+    # 最後不足一個 frame 的尾端樣本屬於最後一個區段
+    if segments and segments[-1][1] >= n_frames * frame:
+        segments[-1] = (segments[-1][0], len(samples))
+    return segments
+
+
+@dataclass
+class TimelineMap:
+    """壓縮後音訊與原始音訊之間的時間對應。每個區段記錄 (壓縮後起點, 原始起點, 長度)，單位為秒。"""
+    packed_starts: List[float]
+    original_starts: List[float]
+    durations: List[float]
+
+    def to_original(self, t, is_end: bool = False):
+        """
+        把壓縮後的時間換回原始時間。剛好落在兩個區段交界的時間，起點屬於後一個區段；
+        is_end 為 True 時屬於前一個區段，終點才不會跨過被移除的靜音而把 chunk 拉長。
+        """
+        if t is None or not self.packed_starts:
+            return t
+        position = bisect.bisect_left(self.packed_starts, t) if is_end else bisect.bisect_right(self.packed_starts, t)
+        i = max(0, position - 1)
+        offset = min(max(t - self.packed_starts[i], 0.0), self.durations[i])
+        return self.original_starts[i] + offset
+
+    def remap_chunks(self, chunks):
+        """把 pipeline 回傳的 chunk 時間戳從壓縮後的時間軸換回原始時間軸。"""
+        remapped = []
+        for chunk in chunks:
+            start, end = chunk.get("timestamp") or (None, None)
+            remapped.append({
+                **chunk, "timestamp": (self.to_original(start), self.to_original(end, is_end=True)),
+            })
+        return remapped
+
+
+@dataclass
+class PackedSpeech:
+    samples: np.ndarray
+    timeline: TimelineMap
+    original_seconds: float
+
+    @property
+    def has_speech(self) -> bool:
+        return len(self.samples) > 0
+
+    @property
+    def speech_ratio(self) -> float:
+        if not self.original_seconds:
+            return 0.0
+        return sum(self.timeline.durations) / self.original_seconds
+
+
+def pack_speech(samples: np.ndarray, sampling_rate: int) -> PackedSpeech:
+    """
+    移除非語音區域，把語音區段緊密地接在一起，並記錄時間對應。
+    沒有任何靜音被移除時直接回傳原始陣列，不複製資料。
+    """
+    original_seconds = len(samples) / sampling_rate
+    segments = detect_speech(samples, sampling_rate)
+    if segments == [(0, len(samples))]:
+        return PackedSpeech(samples, TimelineMap([0.0], [0.0], [original_seconds]), original_seconds)
+
+    packed_starts, original_starts, durations = [], [], []
+    position = 0
+    for start, end in segments:
+        packed_starts.append(position / sampling_rate)
+        original_starts.append(start / sampling_rate)
+        durations.append((end - start) / sampling_rate)
+        position += end - start
+    packed = np.empty(position, dtype=samples.dtype)
+    position = 0
+    for start, end in segments:
+        packed[position:position + end - start] = samples[start:end]
+        position += end - start
+    logger.info(
+        f"VAD kept {position / sampling_rate:.1f}s of speech from {original_seconds:.1f}s "
+        f"({len(segments)} segments)"
+    )
+    return PackedSpeech(packed, TimelineMap(packed_starts, original_starts, durations), original_seconds)
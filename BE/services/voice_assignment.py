@@ -1,142 +1,257 @@
-import azure.cognitiveservices.speech as speechsdk
+import asyncio
 import json
-import time
-import difflib
+import threading
 import string
 import argparse
-import sys
 import os
+from dataclasses import dataclass
 from pathlib import Path
+from typing import Callable, Dict, List, Optional
 from dotenv import load_dotenv
+import numpy as np
+from services.pronunciation_scoring import aggregate_scores, encode_error_types
 
-env_path = Path('env/.env.local').resolve()
-print(f"載入 .env 文件: {env_path}")  # 調試輸出
-load_dotenv(dotenv_path=env_path)
+# 單次評估的逾時秒數
+ASSESSMENT_TIMEOUT_S = float(os.getenv('ASSESSMENT_TIMEOUT_S', '60'))
+# azure：Azure 語音服務；fake：不連網的假辨識器，供離線測試與壓力測試
+ASSESSMENT_RECOGNIZER = os.getenv('ASSESSMENT_RECOGNIZER', 'azure')
 
-if not env_path.is_file():
-    print(f".env 文件不存在於: {env_path}")
-    sys.exit(1)
+ENV_PATH = Path('env/.env.local').resolve()
 
-subscription_key = os.getenv('AZURE_SPEECH_KEY')
-region = os.getenv('AZURE_SPEECH_REGION')
 
-if not subscription_key or not region:
-    print("請設置環境變量 AZURE_SPEECH_KEY 和 AZURE_SPEECH_REGION")
-    sys.exit(1)
+class AssessmentConfigError(Exception):
+    """缺少 Azure 語音服務設定時拋出。"""
 
-def perform_pronunciation_assessment(audio_filename: str, reference_text: str):
-    """執行發音評估並返回評估結果。"""
-    if not os.path.isfile(audio_filename):
-        print(f"音頻文件未找到: {audio_filename}")
-        sys.exit(1)
-
-    print("開始識別...")
-    speech_config = speechsdk.SpeechConfig(subscription=subscription_key, region=region)
-    audio_config = speechsdk.audio.AudioConfig(filename=audio_filename)
-    enable_miscue = True
-    pronunciation_config = speechsdk.PronunciationAssessmentConfig(
-        reference_text=reference_text,
-        grading_system=speechsdk.PronunciationAssessmentGradingSystem.HundredMark,
-        granularity=speechsdk.PronunciationAssessmentGranularity.Phoneme,
-        enable_miscue=enable_miscue
+
+class AssessmentError(Exception):
+    """辨識器回報錯誤（例如連線失敗或金鑰無效）時拋出。"""
+
+
+@dataclass
+class RecognizedSegment:
+    """一次 recognized 事件的評估結果，逐字資料以平行列表保存；duration 為各字的時長總和（100ns 為單位）。"""
+    words: List[str]
+    accuracy_scores: List[float]
+    error_types: List[str]
+    fluency_score: float
+    prosody_score: float
+    duration: int
+
+
+def parse_recognized_json(json_result: str) -> RecognizedSegment:
+    """只解析一次服務回傳的 JSON，取出逐字分數與整段的流暢度、韻律分數。"""
+    nb = json.loads(json_result)['NBest'][0]
+    words = nb.get('Words', [])
+    assessment = nb.get('PronunciationAssessment', {})
+    return RecognizedSegment(
+        words=[w['Word'] for w in words],
+        accuracy_scores=[w.get('PronunciationAssessment', {}).get('AccuracyScore', 0.0) for w in words],
+        error_types=[w.get('PronunciationAssessment', {}).get('ErrorType', 'None') for w in words],
+        fluency_score=assessment.get('FluencyScore', 0.0),
+        prosody_score=assessment.get('ProsodyScore', 0.0),
+        duration=sum(int(w['Duration']) for w in words),
     )
-    pronunciation_config.enable_prosody_assessment()
-
-    speech_recognizer = speechsdk.SpeechRecognizer(speech_config=speech_config, audio_config=audio_config)
-    pronunciation_config.apply_to(speech_recognizer)
-
-    done = False
-    recognized_words = []
-    fluency_scores = []
-    prosody_scores = []
-    durations = []
-
-    def stop_cb(evt: speechsdk.SessionEventArgs):
-        """回調函數，接收到停止事件時設置done為True"""
-        nonlocal done
-        done = True
-
-    def recognized_cb(evt: speechsdk.SpeechRecognitionEventArgs):
-        """回調函數，處理每個識別結果"""
-        pronunciation_result = speechsdk.PronunciationAssessmentResult(evt.result)
-        nonlocal recognized_words, fluency_scores, prosody_scores, durations
-        recognized_words += pronunciation_result.words
-        fluency_scores.append(pronunciation_result.fluency_score)
-        prosody_scores.append(pronunciation_result.prosody_score)
-        json_result = evt.result.properties.get(speechsdk.PropertyId.SpeechServiceResponse_JsonResult)
-        jo = json.loads(json_result)
-        nb = jo['NBest'][0]
-        durations.append(sum([int(w['Duration']) for w in nb['Words']]))
-
-    # 連接回調函數
-    speech_recognizer.recognized.connect(recognized_cb)
-    speech_recognizer.session_stopped.connect(stop_cb)
-    speech_recognizer.canceled.connect(stop_cb)
-
-    # 開始連續識別
-    speech_recognizer.start_continuous_recognition()
-    print("開始發音評估...")
-
-    while not done:
-        time.sleep(0.5)
-
-    speech_recognizer.stop_continuous_recognition()
-    print("發音評估完成。")
-
-    # 處理評估結果
+
+
+def _load_speech_credentials():
+    load_dotenv(dotenv_path=ENV_PATH)
+    subscription_key = os.getenv('AZURE_SPEECH_KEY')
+    region = os.getenv('AZURE_SPEECH_REGION')
+    if not subscription_key or not region:
+        raise AssessmentConfigError(
+            f"AZURE_SPEECH_KEY and AZURE_SPEECH_REGION must be set (environment or {ENV_PATH})"
+        )
+    return subscription_key, region
+
+
+class AzureRecognizer:
+    """
+    包裝 Azure SpeechRecognizer 的連續辨識與發音評估。
+    SDK 在自己的執行緒上觸發回呼，on_segment 每段結果呼叫一次，on_done 在結束時呼叫一次。
+    """
+
+    def __init__(self, audio_filename: str, reference_text: str):
+        import azure.cognitiveservices.speech as speechsdk
+
+        subscription_key, region = _load_speech_credentials()
+        self._sdk = speechsdk
+        speech_config = speechsdk.SpeechConfig(subscription=subscription_key, region=region)
+        audio_config = speechsdk.audio.AudioConfig(filename=audio_filename)
+        pronunciation_config = speechsdk.PronunciationAssessmentConfig(
+            reference_text=reference_text,
+            grading_system=speechsdk.PronunciationAssessmentGradingSystem.HundredMark,
+            granularity=speechsdk.PronunciationAssessmentGranularity.Phoneme,
+            enable_miscue=True
+        )
+        pronunciation_config.enable_prosody_assessment()
+        self._recognizer = speechsdk.SpeechRecognizer(speech_config=speech_config, audio_config=audio_config)
+        pronunciation_config.apply_to(self._recognizer)
+
+    def connect(self, on_segment: Callable[[RecognizedSegment], None], on_done: Callable[[Optional[Exception]], None]):
+        speechsdk = self._sdk
+
+        def recognized_cb(evt):
+            """回調函數，處理每個識別結果"""
+            # 靜音或雜音段落會觸發 NoMatch，沒有 NBest 可解析，略過而不是中止整個評估
+            if evt.result.reason != speechsdk.ResultReason.RecognizedSpeech:
+                return
+            try:
+                json_result = evt.result.properties.get(speechsdk.PropertyId.SpeechServiceResponse_JsonResult)
+                on_segment(parse_recognized_json(json_result))
+            except Exception as e:
+                on_done(e)
+
+        def canceled_cb(evt):
+            details = evt.cancellation_details
+            if details.reason == speechsdk.CancellationReason.Error:
+                on_done(AssessmentError(f"Recognition canceled: {details.error_details}"))
+            else:
+                on_done(None)
+
+        self._recognizer.recognized.connect(recognized_cb)
+        self._recognizer.session_stopped.connect(lambda evt: on_done(None))
+        self._recognizer.canceled.connect(canceled_cb)
+
+    def start(self):
+        self._recognizer.start_continuous_recognition_async().get()
+
+    def stop(self):
+        self._recognizer.stop_continuous_recognition_async().get()
+
+
+class FakeRecognizer:
+    """
+    不連網的假辨識器。在背景執行緒上模擬 SDK 的回呼：經過 latency 秒後
+    把參考文字平均分成 segments 段送出，每個字都以 accuracy 分辨識正確。
+    """
+
+    def __init__(self, audio_filename: str, reference_text: str, latency: float = None,
+                 segments: int = 1, accuracy: float = 90.0):
+        self.reference_text = reference_text
+        self.latency = float(os.getenv('FAKE_ASSESSMENT_LATENCY_S', '0.2')) if latency is None else latency
+        self.segments = max(1, segments)
+        self.accuracy = accuracy
+        self._on_segment = None
+        self._on_done = None
+        self._timer = None
+
+    def connect(self, on_segment, on_done):
+        self._on_segment = on_segment
+        self._on_done = on_done
+
+    def _emit(self):
+        words = [w.strip(string.punctuation) for w in self.reference_text.split()]
+        size = -(-len(words) // self.segments) if words else 0
+        for start in range(0, len(words), size or 1):
+            chunk = words[start:start + size]
+            self._on_segment(RecognizedSegment(
+                words=chunk,
+                accuracy_scores=[self.accuracy] * len(chunk),
+                error_types=["None"] * len(chunk),
+                fluency_score=self.accuracy,
+                prosody_score=self.accuracy,
+                duration=len(chunk) * 3_000_000,
+            ))
+        self._on_done(None)
+
+    def start(self):
+        self._timer = threading.Timer(self.latency, self._emit)
+        self._timer.daemon = True
+        self._timer.start()
+
+    def stop(self):
+        if self._timer is not None:
+            self._timer.cancel()
+
+
+_RECOGNIZER_FACTORIES: Dict[str, Callable[[str, str], object]] = {
+    "azure": AzureRecognizer,
+    "fake": FakeRecognizer,
+}
+
+
+def register_recognizer(kind: str, factory: Callable[[str, str], object]):
+    """登記新的辨識器種類；factory 接收 (音檔路徑, 參考文字) 並回傳辨識器。"""
+    _RECOGNIZER_FACTORIES[kind] = factory
+
+
+def create_recognizer(audio_filename: str, reference_text: str, kind: str = None):
+    kind = kind or ASSESSMENT_RECOGNIZER
+    if kind not in _RECOGNIZER_FACTORIES:
+        raise AssessmentConfigError(
+            f"Unknown assessment recognizer '{kind}'. Available: {', '.join(sorted(_RECOGNIZER_FACTORIES))}"
+        )
+    return _RECOGNIZER_FACTORIES[kind](audio_filename, reference_text)
+
+
+def score_assessment(reference_text: str, segments: List[RecognizedSegment]) -> dict:
+    """合併各段辨識結果，以參考文字標出漏字與多字，並計算總體分數。"""
     reference_words = [w.strip(string.punctuation).lower() for w in reference_text.split()]
-    if enable_miscue:
-        diff = difflib.SequenceMatcher(None, reference_words, [x.word.lower() for x in recognized_words])
-        final_words = []
-        for tag, i1, i2, j1, j2 in diff.get_opcodes():
-            if tag in ['insert', 'replace']:
-                for word in recognized_words[j1:j2]:
-                    if word.error_type == 'None':
-                        word._error_type = 'Insertion'
-                    final_words.append(word)
-            if tag in ['delete', 'replace']:
-                for word_text in reference_words[i1:i2]:
-                    word = speechsdk.PronunciationAssessmentWordResult({
-                        'Word': word_text,
-                        'PronunciationAssessment': {
-                            'ErrorType': 'Omission',
-                        }
-                    })
-                    final_words.append(word)
-            if tag == 'equal':
-                final_words += recognized_words[j1:j2]
-    else:
-        final_words = recognized_words
-
-    # 計算總體分數
-    final_accuracy_scores = [w.accuracy_score for w in final_words if w.error_type != 'Insertion']
-    accuracy_score = sum(final_accuracy_scores) / len(final_accuracy_scores) if final_accuracy_scores else 0
-    fluency_score = sum([x * y for x, y in zip(fluency_scores, durations)]) / sum(durations) if durations else 0
-    completeness_score = len([w for w in recognized_words if w.error_type == "None"]) / len(reference_words) * 100
-    completeness_score = min(completeness_score, 100)
-    prosody_score = sum(prosody_scores) / len(prosody_scores) if prosody_scores else 0
-    pron_score = accuracy_score * 0.4 + prosody_score * 0.2 + fluency_score * 0.2 + completeness_score * 0.2
-
-    # 構建結果
-    words_result = [
-        {
-            "word": word.word,
-            "accuracy_score": word.accuracy_score,
-            "error_type": word.error_type
-        }
-        for word in final_words
-    ]
-
-    result = {
-        "pronunciation_score": pron_score,
-        "accuracy_score": accuracy_score,
-        "completeness_score": completeness_score,
-        "fluency_score": fluency_score,
-        "prosody_score": prosody_score,
-        "words": words_result
-    }
-
-    return result
+    words = [word for segment in segments for word in segment.words]
+    return aggregate_scores(
+        reference_words,
+        words,
+        accuracy=np.fromiter(
+            (score for segment in segments for score in segment.accuracy_scores), dtype=np.float64, count=len(words)
+        ),
+        errors=encode_error_types([error for segment in segments for error in segment.error_types]),
+        fluency=np.array([segment.fluency_score for segment in segments], dtype=np.float64),
+        prosody=np.array([segment.prosody_score for segment in segments], dtype=np.float64),
+        durations=np.array([segment.duration for segment in segments], dtype=np.float64),
+    )
+
+
+async def assess_pronunciation_async(audio_filename: str, reference_text: str, timeout: float = None,
+                                     recognizer_factory: Callable[[str, str], object] = None) -> dict:
+    """
+    執行發音評估。辨識器的回呼透過 call_soon_threadsafe 完成一個 asyncio.Future，
+    等待期間不佔用 event loop 或執行緒；超過 timeout 秒拋出 asyncio.TimeoutError。
+    """
+    if not os.path.isfile(audio_filename):
+        raise FileNotFoundError(f"Audio file not found: {audio_filename}")
+    timeout = ASSESSMENT_TIMEOUT_S if timeout is None else timeout
+    recognizer_factory = recognizer_factory or create_recognizer
+
+    loop = asyncio.get_running_loop()
+    finished = loop.create_future()
+    segments: List[RecognizedSegment] = []
+
+    def _finish(error):
+        if finished.done():
+            return
+        if error is None:
+            finished.set_result(None)
+        else:
+            finished.set_exception(error)
+
+    def _post(callback, *args):
+        # SDK 可能在逾時、event loop 關閉後才觸發回呼，此時直接忽略
+        try:
+            loop.call_soon_threadsafe(callback, *args)
+        except RuntimeError:
+            pass
+
+    def on_segment(segment):
+        _post(segments.append, segment)
+
+    def on_done(error=None):
+        _post(_finish, error)
+
+    # 建立辨識器與開始/停止辨識會做網路與檔案 I/O，放到執行緒上
+    recognizer = await asyncio.to_thread(recognizer_factory, audio_filename, reference_text)
+    recognizer.connect(on_segment, on_done)
+    await asyncio.to_thread(recognizer.start)
+    try:
+        await asyncio.wait_for(finished, timeout)
+    finally:
+        await asyncio.to_thread(recognizer.stop)
+    # 對齊長文字需要數百毫秒的 CPU 時間，不在 event loop 上執行
+    return await asyncio.to_thread(score_assessment, reference_text, segments)
+
+
+def perform_pronunciation_assessment(audio_filename: str, reference_text: str):
+    """執行發音評估並返回評估結果（同步版本，供命令列使用）。"""
+    return asyncio.run(assess_pronunciation_async(audio_filename, reference_text))
 
 
 def main():
@@ -162,8 +277,11 @@ def main():
     print(f"音頻文件: {audio_file}")
     print(f"參考文本: {reference_text}")
 
-    result = perform_pronunciation_assessment(audio_file, reference_text)
-    
+    try:
+        result = perform_pronunciation_assessment(audio_file, reference_text)
+    except (FileNotFoundError, AssessmentConfigError, AssessmentError) as e:
+        raise SystemExit(str(e))
+
     print("\n評估結果:")
     print(json.dumps(result, indent=2))
 
@@ -0,0 +1,328 @@
+import asyncio
+import base64
+import functools
+import json
+import logging
+import sqlite3
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional, Tuple
+
+from src.connectionDB import FTS_TOKENIZER, create_connection, create_voice_record_with_tags, insert_transcript_segments
+from utils.dependencies import DatabaseError
+
+logger = logging.getLogger(__name__)
+
+# 允許透過 update() 修改的欄位
+UPDATABLE_FIELDS = (
+    "filename", "filetype", "duration", "size", "filepath",
+    "transcript", "language", "status", "error_message", "parent_id",
+)
+
+# 列表可投影的欄位；預設不含 transcript，列表頁不需要傳輸完整逐字稿
+LIST_FIELDS = ("id", "createtime") + UPDATABLE_FIELDS
+DEFAULT_LIST_FIELDS = tuple(name for name in LIST_FIELDS if name != "transcript")
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+EXPORT_PAGE_SIZE = 1000
+SNIPPET_TOKENS = 16
+
+
+def encode_cursor(record: Dict[str, Any]) -> str:
+    payload = json.dumps([record["createtime"], record["id"]]).encode("utf-8")
+    return base64.urlsafe_b64encode(payload).decode("ascii")
+
+
+def decode_cursor(cursor: str) -> Tuple[str, int]:
+    try:
+        createtime, record_id = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+        return createtime, int(record_id)
+    except (ValueError, TypeError) as e:
+        raise ValueError("Invalid cursor") from e
+
+
+# trigram 分詞器無法以全文索引比對少於 3 個字元的詞
+MIN_TRIGRAM_TERM = 3
+
+
+def build_match_expression(text: str) -> str:
+    """把使用者輸入拆成以雙引號包住的詞，全部需符合，避免 FTS5 語法錯誤。"""
+    terms = [term.replace('"', '""') for term in text.split()]
+    return " AND ".join(f'"{term}"' for term in terms)
+
+
+def split_search_terms(text: str, tokenizer: str = FTS_TOKENIZER) -> Tuple[str, List[str]]:
+    """
+    把使用者輸入分成 (FTS5 查詢, 需以 LIKE 比對的詞)。trigram 分詞器下少於 3 個字元的詞
+    （例如「會議」）在全文索引中找不到，只在全文索引找到的記錄中以 transcript LIKE '%詞%' 再過濾。
+    全部都是短詞時無法使用索引，需要掃描整個表格，因此拋出 ValueError 要求至少一個 3 字元以上的詞。
+    """
+    terms = text.split()
+    if not tokenizer.startswith("trigram"):
+        return build_match_expression(text), []
+    short_terms = [term for term in terms if len(term) < MIN_TRIGRAM_TERM]
+    long_terms = [term for term in terms if len(term) >= MIN_TRIGRAM_TERM]
+    if short_terms and not long_terms:
+        raise ValueError(
+            f"Search needs at least one term of {MIN_TRIGRAM_TERM} or more characters; "
+            f"shorter terms such as '{short_terms[0]}' cannot use the full-text index. "
+            "Add a longer term or a longer phrase."
+        )
+    return build_match_expression(" ".join(long_terms)), short_terms
+
+
+def escape_like(term: str) -> str:
+    return term.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+def build_list_query(limit: int, cursor: Optional[str] = None, fields: Optional[List[str]] = None,
+                     status: Optional[str] = None, tag: Optional[str] = None,
+                     language: Optional[str] = None, parent_id: Optional[int] = None) -> Tuple[str, tuple]:
+    """
+    組出 keyset 分頁查詢。排序鍵 (createtime, id) 一律包含在結果中以產生下一頁的 cursor，
+    篩選條件皆為等值比較，可使用 (status|language|parent_id, createtime, id) 複合索引。
+    """
+    fields = list(fields) if fields else list(DEFAULT_LIST_FIELDS)
+    invalid = set(fields) - set(LIST_FIELDS)
+    if invalid:
+        raise ValueError(f"Unknown voice_record fields: {', '.join(sorted(invalid))}")
+    for key in ("createtime", "id"):
+        if key not in fields:
+            fields.append(key)
+
+    conditions, params = [], []
+    for column, value in (("status", status), ("language", language), ("parent_id", parent_id)):
+        if value is not None:
+            conditions.append(f"v.{column} = ?")
+            params.append(value)
+    if tag is not None:
+        conditions.append(
+            "EXISTS (SELECT 1 FROM voice_record_tags vt JOIN tags t ON t.id = vt.tag_id "
+            "WHERE vt.voice_record_id = v.id AND t.tag = ?)"
+        )
+        params.append(tag)
+    if cursor:
+        conditions.append("(v.createtime, v.id) < (?, ?)")
+        params.extend(decode_cursor(cursor))
+
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+    columns = ", ".join(f"v.{name}" for name in fields)
+    query = f"SELECT {columns} FROM voice_record v {where} ORDER BY v.createtime DESC, v.id DESC LIMIT ?"
+    params.append(limit)
+    return query, tuple(params)
+
+
+class VoiceRecordRepository:
+    """
+    voice_record / tags 的非同步存取層。
+    所有寫入都交給單一的 writer 執行緒依序執行（SQLite 同時只允許一個 writer），
+    讀取則在獨立的 reader 執行緒池上執行，資料庫延遲不會阻塞 event loop。
+    """
+
+    def __init__(self, read_workers: int = 4):
+        self._writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="db-writer")
+        self._readers = ThreadPoolExecutor(max_workers=read_workers, thread_name_prefix="db-reader")
+
+    @staticmethod
+    def _with_connection(fn: Callable, *args, **kwargs):
+        conn = create_connection()
+        if conn is None:
+            raise DatabaseError("Database connection failed")
+        try:
+            return fn(conn, *args, **kwargs)
+        finally:
+            conn.close()
+
+    async def run_write(self, fn: Callable, *args, **kwargs):
+        """在 writer 執行緒上執行 fn(conn, *args, **kwargs)。"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self._writer, functools.partial(self._with_connection, fn, *args, **kwargs)
+        )
+
+    async def run_read(self, fn: Callable, *args, **kwargs):
+        """在 reader 執行緒上執行 fn(conn, *args, **kwargs)。"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self._readers, functools.partial(self._with_connection, fn, *args, **kwargs)
+        )
+
+    async def create(self, record: Dict[str, Any], tags: Optional[List[str]] = None,
+                     segments: Optional[List[Dict[str, Any]]] = None) -> Optional[int]:
+        """新增語音記錄、標籤與逐字稿片段，回傳新記錄的 ID，失敗時回傳 None。"""
+        return await self.run_write(create_voice_record_with_tags, record, tags, segments)
+
+    @staticmethod
+    def _add_segments(conn: sqlite3.Connection, record_id: int, segments: List[Dict[str, Any]],
+                      duration: Optional[float]) -> int:
+        try:
+            with conn:
+                return insert_transcript_segments(conn, record_id, segments, duration)
+        except sqlite3.Error as e:
+            logger.error(f"Error inserting transcript segments for voice record {record_id}: {e}")
+            raise DatabaseError("Database insert failed")
+
+    async def add_segments(self, record_id: int, segments: List[Dict[str, Any]],
+                           duration: Optional[float] = None) -> int:
+        """在單一交易中批次新增逐字稿片段。"""
+        if not segments:
+            return 0
+        return await self.run_write(self._add_segments, record_id, segments, duration)
+
+    async def get_segments(self, record_id: int, start: float = 0.0,
+                           end: Optional[float] = None) -> List[Dict[str, Any]]:
+        """
+        取得與 [start, end) 時間區間重疊的片段，依起點排序。
+        (record_id, start) 索引只需掃描該記錄中起點早於 end 的片段。
+        """
+        conditions = ["record_id = ?", '"end" > ?']
+        params: List[Any] = [record_id, start]
+        if end is not None:
+            conditions.append('"start" < ?')
+            params.append(end)
+        return await self.query(
+            f'''
+            SELECT "start", "end", text FROM transcript_segment
+            WHERE {' AND '.join(conditions)}
+            ORDER BY "start"
+            ''',
+            tuple(params)
+        )
+
+    @staticmethod
+    def _update(conn: sqlite3.Connection, record_id: int, fields: Dict[str, Any]):
+        invalid = set(fields) - set(UPDATABLE_FIELDS)
+        if invalid:
+            raise ValueError(f"Unknown voice_record fields: {', '.join(sorted(invalid))}")
+        assignments = ", ".join(f"{name} = ?" for name in fields)
+        try:
+            with conn:
+                conn.execute(
+                    f"UPDATE voice_record SET {assignments} WHERE id = ?",
+                    (*fields.values(), record_id)
+                )
+        except sqlite3.Error as e:
+            logger.error(f"Error updating voice record {record_id}: {e}")
+            raise DatabaseError("Database update failed")
+
+    async def update(self, record_id: int, **fields) -> None:
+        """更新語音記錄的指定欄位。"""
+        if fields:
+            await self.run_write(self._update, record_id, fields)
+
+    async def update_status(self, record_id: int, status: str, error_message: Optional[str] = None, **fields) -> None:
+        await self.update(record_id, status=status, error_message=error_message, **fields)
+
+    @staticmethod
+    def _fetch_all(conn: sqlite3.Connection, query: str, params: tuple = ()) -> List[Dict[str, Any]]:
+        try:
+            cursor = conn.cursor()
+            cursor.execute(query, params)
+            rows = cursor.fetchall()
+            column_names = [description[0] for description in cursor.description]
+            return [dict(zip(column_names, row)) for row in rows]
+        except sqlite3.Error as e:
+            logger.error(f"Database query failed: {e}")
+            raise DatabaseError("Database query failed")
+
+    async def query(self, query: str, params: tuple = ()) -> List[Dict[str, Any]]:
+        return await self.run_read(self._fetch_all, query, params)
+
+    async def get(self, record_id: int) -> Optional[Dict[str, Any]]:
+        records = await self.query("SELECT * FROM voice_record WHERE id = ?", (record_id,))
+        return records[0] if records else None
+
+    async def exists(self, record_id: int) -> bool:
+        return bool(await self.query("SELECT 1 FROM voice_record WHERE id = ?", (record_id,)))
+
+    async def list_all(self) -> List[Dict[str, Any]]:
+        return await self.query("SELECT * FROM voice_record")
+
+    async def list_page(self, limit: int = DEFAULT_PAGE_SIZE, cursor: Optional[str] = None,
+                        fields: Optional[List[str]] = None, **filters) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        """
+        以 (createtime, id) 為鍵的 keyset 分頁，由新到舊排序。
+        回傳 (records, next_cursor)，沒有下一頁時 next_cursor 為 None。
+        """
+        query, params = build_list_query(limit + 1, cursor, fields, **filters)
+        records = await self.query(query, params)
+        next_cursor = None
+        if len(records) > limit:
+            records = records[:limit]
+            next_cursor = encode_cursor(records[-1])
+        return records, next_cursor
+
+    @staticmethod
+    def _search(conn: sqlite3.Connection, match: str, like_terms: List[str], limit: int, offset: int,
+                tags: List[str], raw: bool = False) -> List[Dict[str, Any]]:
+        conditions = ["voice_record_fts MATCH ?"]
+        params: List[Any] = [match]
+        for term in like_terms:
+            conditions.append("v.transcript LIKE ? ESCAPE '\\'")
+            params.append(f"%{escape_like(term)}%")
+        for tag in tags:
+            conditions.append(
+                "EXISTS (SELECT 1 FROM voice_record_tags vt JOIN tags t ON t.id = vt.tag_id "
+                "WHERE vt.voice_record_id = v.id AND t.tag = ?)"
+            )
+            params.append(tag)
+        params.extend((limit, offset))
+        # 短詞的 LIKE 只用來過濾全文索引找到的記錄，不會掃描整個表格
+        query = f'''
+            SELECT v.id, v.filename, v.createtime, v.language, v.status, v.parent_id,
+                   snippet(voice_record_fts, 0, '<mark>', '</mark>', '…', {SNIPPET_TOKENS}) AS snippet,
+                   bm25(voice_record_fts) AS score
+            FROM voice_record_fts
+            JOIN voice_record v ON v.id = voice_record_fts.rowid
+            WHERE {' AND '.join(conditions)}
+            ORDER BY score
+            LIMIT ? OFFSET ?
+        '''
+        try:
+            cursor = conn.execute(query, params)
+            column_names = [description[0] for description in cursor.description]
+            return [dict(zip(column_names, row)) for row in cursor.fetchall()]
+        except sqlite3.OperationalError as e:
+            # 使用者自行輸入的 FTS5 語法錯誤時，SQLite 的訊息不一定包含 "fts5"（例如 unterminated string），
+            # raw 查詢的 OperationalError 除了資料庫鎖定以外都視為查詢錯誤
+            if (raw and "locked" not in str(e)) or "fts5" in str(e):
+                raise ValueError(f"Invalid search query: {e}") from e
+            logger.error(f"Search query failed: {e}")
+            raise DatabaseError("Search query failed")
+        except sqlite3.Error as e:
+            logger.error(f"Search query failed: {e}")
+            raise DatabaseError("Search query failed")
+
+    async def search(self, text: str, limit: int = DEFAULT_PAGE_SIZE, offset: int = 0,
+                     tags: Optional[List[str]] = None, raw: bool = False) -> Tuple[List[Dict[str, Any]], Optional[int]]:
+        """
+        以 FTS5 搜尋逐字稿，依 bm25 排序（分數越小越相關）。trigram 分詞器下少於 3 個字元的詞
+        在全文索引的結果中以 LIKE 過濾；只有短詞時拋出 ValueError。
+        raw 為 True 時 text 直接作為 FTS5 查詢語法。回傳 (results, next_offset)。
+        """
+        match, like_terms = (text, []) if raw else split_search_terms(text)
+        if not match:
+            return [], None
+        results = await self.run_read(self._search, match, like_terms, limit + 1, offset, tags or [], raw)
+        next_offset = None
+        if len(results) > limit:
+            results = results[:limit]
+            next_offset = offset + limit
+        return results, next_offset
+
+    async def iter_records(self, page_size: int = EXPORT_PAGE_SIZE, fields: Optional[List[str]] = None,
+                           **filters) -> AsyncIterator[Dict[str, Any]]:
+        """逐頁讀取符合條件的記錄，記憶體中最多只保留一頁。"""
+        cursor = None
+        while True:
+            records, cursor = await self.list_page(page_size, cursor, fields, **filters)
+            for record in records:
+                yield record
+            if cursor is None:
+                break
+
+    def shutdown(self):
+        self._writer.shutdown(wait=True)
+        self._readers.shutdown(wait=False, cancel_futures=True)
+
+
+voice_record_repository = VoiceRecordRepository()
@@ -0,0 +1,152 @@
+# src/asr_backends.py
+import logging
+import os
+from abc import ABC, abstractmethod
+from typing import Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# 可透過請求或租戶選用的模型別名
+ASR_MODEL_ALIASES = {
+    "large-v3": "openai/whisper-large-v3",
+    "small": "openai/whisper-small",
+    "distil": "distil-whisper/distil-large-v3",
+}
+
+
+def _model_alias(model: str) -> str:
+    """把別名或完整模型 ID 轉成別名；不在 ASR_MODEL_ALIASES 中時拋出 ValueError。"""
+    if model in ASR_MODEL_ALIASES:
+        return model
+    for alias, model_id in ASR_MODEL_ALIASES.items():
+        if model == model_id:
+            return alias
+    raise ValueError(f"Unknown ASR model '{model}'. Available: {', '.join(ASR_MODEL_ALIASES)}")
+
+
+# 可設為別名或完整模型 ID（例如 openai/whisper-small），一律轉成別名；無法辨識時啟動即失敗
+DEFAULT_ASR_MODEL = _model_alias(os.getenv('ASR_MODEL') or 'large-v3')
+# transformers：原始精度；transformers-int8：CPU 上對 Linear 層做動態 int8 量化
+ASR_BACKEND = os.getenv('ASR_BACKEND', 'transformers')
+# 租戶預設模型，例如 "tenant-a=small,tenant-b=distil"
+ASR_TENANT_MODELS = os.getenv('ASR_TENANT_MODELS', '')
+
+
+def _extract_result(result):
+    if "chunks" in result:
+        return result["chunks"]
+    elif "text" in result:
+        return result["text"]
+    else:
+        raise ValueError("Unexpected transcription result format.")
+
+
+class ASRBackend(ABC):
+    """轉譯後端介面。transcribe_batch 回傳與輸入對應的結果列表，失敗的項目為例外物件。"""
+
+    name = "base"
+
+    @abstractmethod
+    def transcribe_batch(self, audio_list, sampling_rate: int, return_timestamps: bool = False,
+                         batch_size: int = 16) -> List:
+        ...
+
+
+class TransformersWhisperBackend(ASRBackend):
+    """HF transformers 的 Whisper pipeline；quantize_int8 時在 CPU 上對 Linear 層做動態 int8 量化。"""
+
+    def __init__(self, model_id: str, quantize_int8: bool = False):
+        import torch
+        from transformers import AutoModelForSpeechSeq2Seq, AutoProcessor, pipeline
+
+        device = "cuda:0" if torch.cuda.is_available() else "cpu"
+        torch_dtype = torch.float16 if torch.cuda.is_available() else torch.float32
+
+        model = AutoModelForSpeechSeq2Seq.from_pretrained(
+            model_id,
+            torch_dtype=torch_dtype,
+            low_cpu_mem_usage=True,
+            use_safetensors=True
+        )
+        if quantize_int8:
+            if device == "cpu":
+                model = torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+                logger.info(f"Applied dynamic int8 quantization to {model_id}")
+            else:
+                logger.warning("int8 dynamic quantization only applies on CPU; using float16 on CUDA.")
+                quantize_int8 = False
+        model.to(device)
+
+        processor = AutoProcessor.from_pretrained(model_id)
+
+        self.model_id = model_id
+        self.name = "transformers-int8" if quantize_int8 else "transformers"
+        self.pipe = pipeline(
+            "automatic-speech-recognition",
+            model=model,
+            tokenizer=processor.tokenizer,
+            feature_extractor=processor.feature_extractor,
+            torch_dtype=torch_dtype,
+            device=device,
+            chunk_length_s=30,
+            batch_size=16,
+        )
+
+    def transcribe_batch(self, audio_list, sampling_rate, return_timestamps=False, batch_size=16):
+        inputs = [{"raw": audio_data, "sampling_rate": sampling_rate} for audio_data in audio_list]
+        results = self.pipe(inputs, return_timestamps=return_timestamps, batch_size=batch_size)
+        outputs = []
+        for result in results:
+            try:
+                outputs.append(_extract_result(result))
+            except ValueError as e:
+                outputs.append(e)
+        return outputs
+
+
+_BACKEND_FACTORIES: Dict[str, Callable[[str], ASRBackend]] = {
+    "transformers": lambda model_id: TransformersWhisperBackend(model_id),
+    "transformers-int8": lambda model_id: TransformersWhisperBackend(model_id, quantize_int8=True),
+}
+
+
+def register_backend(kind: str, factory: Callable[[str], ASRBackend]):
+    """登記新的後端種類；factory 接收 HF 模型 ID 並回傳 ASRBackend。"""
+    _BACKEND_FACTORIES[kind] = factory
+
+
+def create_backend(model: str, kind: str = None) -> ASRBackend:
+    kind = kind or ASR_BACKEND
+    if kind not in _BACKEND_FACTORIES:
+        raise ValueError(f"Unknown ASR backend '{kind}'. Available: {', '.join(sorted(_BACKEND_FACTORIES))}")
+    return _BACKEND_FACTORIES[kind](ASR_MODEL_ALIASES[normalize_model(model)])
+
+
+def normalize_model(model: Optional[str]) -> str:
+    """把別名或完整模型 ID 轉成別名；未指定時回傳預設模型。"""
+    if not model:
+        return DEFAULT_ASR_MODEL
+    return _model_alias(model)
+
+
+def _tenant_models() -> Dict[str, str]:
+    mapping = {}
+    for entry in ASR_TENANT_MODELS.split(","):
+        if "=" in entry:
+            tenant, model = entry.split("=", 1)
+            mapping[tenant.strip()] = model.strip()
+    return mapping
+
+
+def resolve_model(requested: Optional[str] = None, tenant: Optional[str] = None) -> str:
+    """決定請求使用的模型：明確指定 > 租戶設定 > 預設模型。"""
+    if requested:
+        return normalize_model(requested)
+    if tenant:
+        return normalize_model(_tenant_models().get(tenant))
+    return DEFAULT_ASR_MODEL
+
+
+def registry_name(model: str) -> str:
+    """模型在 model_registry 中的名稱；預設模型沿用 "asr"，其餘為 "asr:<別名>"。"""
+    return "asr" if model == DEFAULT_ASR_MODEL else f"asr:{model}"
@@ -0,0 +1,89 @@
+# src/backfill.py
+import argparse
+import os
+import wave
+
+from rich.console import Console
+
+from src.connectionDB import create_connection, create_tables, bulk_create_voice_records
+
+console = Console()
+
+
+def _audio_duration(txt_path: str, root: str, audio_root: str = "originVoice") -> float:
+    """
+    由轉譯檔對應的音檔讀取長度（只讀 WAV 標頭）。
+    轉譯時音檔存放在 originVoice/<日期>/<同名>_converted.wav；找不到時回傳 0.0。
+    """
+    relative = os.path.relpath(os.path.splitext(txt_path)[0], root)
+    for suffix in ("_converted.wav", ".wav"):
+        audio_path = os.path.join(audio_root, relative + suffix)
+        try:
+            with wave.open(audio_path, "rb") as wav_file:
+                return wav_file.getnframes() / float(wav_file.getframerate())
+        except (OSError, EOFError, wave.Error):
+            continue
+    return 0.0
+
+
+def iter_transcription_records(root: str, language: str):
+    """掃描 transcriptions/ 資料夾，為每個 .txt 檔產生一筆 voice_record 資料。"""
+    for dirpath, _, filenames in os.walk(root):
+        for filename in sorted(filenames):
+            if not filename.endswith(".txt"):
+                continue
+            filepath = os.path.join(dirpath, filename)
+            with open(filepath, "r", encoding="utf-8", errors="replace") as f:
+                transcript = f.read()
+            yield {
+                "filename": filename,
+                "filetype": "text/plain",
+                "duration": _audio_duration(filepath, root),
+                "size": os.path.getsize(filepath),
+                "filepath": filepath,
+                "transcript": transcript,
+                "language": language,
+                "status": "completed",
+                "error_message": None,
+                "parent_id": None,
+            }
+
+
+def bulk_import_transcriptions(root: str = "transcriptions", tags=None, language: str = "en", batch_size: int = 1000) -> int:
+    """
+    將既有的轉譯檔案批次匯入資料庫，每 batch_size 筆使用一個交易。
+    :return: 新增的記錄數
+    """
+    conn = create_connection()
+    if not conn:
+        raise RuntimeError("Database connection failed")
+    total = 0
+    try:
+        create_tables(conn)
+        batch = []
+        for record in iter_transcription_records(root, language):
+            batch.append(record)
+            if len(batch) >= batch_size:
+                total += bulk_create_voice_records(conn, batch, tags)
+                batch = []
+        total += bulk_create_voice_records(conn, batch, tags)
+    finally:
+        conn.close()
+    console.print(f"[green]Imported {total} transcription records from '{root}'.[/green]")
+    return total
+
+
+def main():
+    parser = argparse.ArgumentParser(description="將 transcriptions/ 中既有的轉譯檔案匯入資料庫")
+    parser.add_argument('--root', type=str, default="transcriptions", help='轉譯檔案的根目錄')
+    parser.add_argument('--tags', type=str, default=None, help='逗號分隔的標籤，套用到所有匯入的記錄')
+    parser.add_argument('--language', type=str, default="en", help='記錄的語言')
+    parser.add_argument('--batch-size', type=int, default=1000, help='每個交易寫入的記錄數')
+    args = parser.parse_args()
+
+    tags = [tag.strip() for tag in args.tags.split(",") if tag.strip()] if args.tags else None
+    bulk_import_transcriptions(args.root, tags=tags, language=args.language, batch_size=args.batch_size)
+
+
+if __name__ == "__main__":
+    main()
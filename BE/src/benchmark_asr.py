@@ -0,0 +1,128 @@
+# src/benchmark_asr.py
+"""
+比較不同 ASR 模型與後端在固定音檔集合上的即時率（RTF）與字詞錯誤率（WER）。
+
+音檔集合是一個資料夾，每個音檔旁放一個同名的 .txt 參考逐字稿：
+    clips/001.wav  clips/001.txt
+    clips/002.mp3  clips/002.txt
+
+執行：
+    python -m src.benchmark_asr --clips clips --models large-v3,small,distil --backends transformers,transformers-int8
+"""
+import argparse
+import os
+import re
+import time
+
+from rich.console import Console
+from rich.table import Table
+
+from services.audio_ingest import TARGET_SAMPLE_RATE, ingest_audio_file
+from src.asr_backends import ASR_MODEL_ALIASES, create_backend
+
+console = Console()
+
+AUDIO_EXTENSIONS = (".wav", ".mp3", ".flac", ".m4a", ".ogg", ".webm")
+
+
+def load_clips(clips_dir: str):
+    """讀取音檔與參考逐字稿，回傳 [(名稱, float32 樣本, 參考文字)]。"""
+    clips = []
+    for filename in sorted(os.listdir(clips_dir)):
+        name, ext = os.path.splitext(filename)
+        if ext.lower() not in AUDIO_EXTENSIONS:
+            continue
+        reference_path = os.path.join(clips_dir, name + ".txt")
+        if not os.path.exists(reference_path):
+            console.print(f"[yellow]Skipping {filename}: no reference transcript[/yellow]")
+            continue
+        with open(reference_path, "r", encoding="utf-8") as f:
+            reference = f.read()
+        audio = ingest_audio_file(os.path.join(clips_dir, filename))
+        clips.append((filename, audio.samples, reference))
+    return clips
+
+
+def tokenize(text: str, unit: str):
+    text = re.sub(r"[^\w\s]", " ", text.lower())
+    if unit == "char":
+        # 中文等不以空白分詞的語言以字元計算（CER）
+        return [ch for ch in text if not ch.isspace()]
+    return text.split()
+
+
+def word_error_rate(reference: str, hypothesis: str, unit: str = "word") -> float:
+    ref, hyp = tokenize(reference, unit), tokenize(hypothesis, unit)
+    if not ref:
+        return 0.0 if not hyp else 1.0
+    previous = list(range(len(hyp) + 1))
+    for i, ref_token in enumerate(ref, 1):
+        current = [i] + [0] * len(hyp)
+        for j, hyp_token in enumerate(hyp, 1):
+            current[j] = min(
+                previous[j] + 1,
+                current[j - 1] + 1,
+                previous[j - 1] + (ref_token != hyp_token),
+            )
+        previous = current
+    return previous[-1] / len(ref)
+
+
+def run_benchmark(clips, model: str, kind: str, batch_size: int, unit: str) -> dict:
+    started = time.perf_counter()
+    backend = create_backend(model, kind)
+    load_seconds = time.perf_counter() - started
+
+    # 先用第一個音檔預熱，避免把首次執行的初始化成本算進 RTF
+    backend.transcribe_batch([clips[0][1]], TARGET_SAMPLE_RATE, False, 1)
+
+    audio_seconds = sum(len(samples) for _, samples, _ in clips) / TARGET_SAMPLE_RATE
+    started = time.perf_counter()
+    results = backend.transcribe_batch([samples for _, samples, _ in clips], TARGET_SAMPLE_RATE, False, batch_size)
+    elapsed = time.perf_counter() - started
+
+    errors = []
+    for (_, _, reference), hypothesis in zip(clips, results):
+        if isinstance(hypothesis, Exception):
+            errors.append(1.0)
+        else:
+            errors.append(word_error_rate(reference, hypothesis, unit))
+    return {
+        "model": model,
+        "backend": kind,
+        "load_seconds": load_seconds,
+        "rtf": elapsed / audio_seconds if audio_seconds else 0.0,
+        "wer": sum(errors) / len(errors),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="比較 ASR 模型與後端的 RTF 與 WER")
+    parser.add_argument('--clips', type=str, required=True, help='音檔與 .txt 參考逐字稿所在的資料夾')
+    parser.add_argument('--models', type=str, default=",".join(ASR_MODEL_ALIASES), help='逗號分隔的模型別名')
+    parser.add_argument('--backends', type=str, default="transformers,transformers-int8", help='逗號分隔的後端種類')
+    parser.add_argument('--batch-size', type=int, default=16, help='pipeline 的 batch 大小')
+    parser.add_argument('--unit', type=str, choices=("word", "char"), default="word", help='錯誤率的計算單位')
+    args = parser.parse_args()
+
+    clips = load_clips(args.clips)
+    if not clips:
+        raise SystemExit(f"No clips with reference transcripts found in '{args.clips}'.")
+    console.print(f"[cyan]Loaded {len(clips)} clips from '{args.clips}'.[/cyan]")
+
+    table = Table(title="ASR benchmark")
+    for column in ("Model", "Backend", "Load (s)", "RTF", "WER" if args.unit == "word" else "CER"):
+        table.add_column(column)
+    for model in [m.strip() for m in args.models.split(",") if m.strip()]:
+        for kind in [k.strip() for k in args.backends.split(",") if k.strip()]:
+            console.print(f"[cyan]Benchmarking {model} ({kind})...[/cyan]")
+            result = run_benchmark(clips, model, kind, args.batch_size, args.unit)
+            table.add_row(
+                result["model"], result["backend"], f"{result['load_seconds']:.1f}",
+                f"{result['rtf']:.3f}", f"{result['wer']:.3f}",
+            )
+    console.print(table)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+# src/benchmark_assessment.py
+"""
+以不連網的 FakeRecognizer 量測發音評估的吞吐量與延遲，不需要 Azure 金鑰。
+
+執行：
+    python -m src.benchmark_assessment --requests 200 --concurrency 4,16,64 --latency 0.2
+"""
+import argparse
+import asyncio
+import functools
+import os
+import statistics
+import tempfile
+import time
+
+from rich.console import Console
+from rich.table import Table
+
+from services.voice_assignment import FakeRecognizer, assess_pronunciation_async
+
+console = Console()
+
+REFERENCE_TEXT = "The quick brown fox jumps over the lazy dog."
+
+
+async def run_benchmark(audio_path: str, requests: int, concurrency: int, latency: float, segments: int) -> dict:
+    factory = functools.partial(FakeRecognizer, latency=latency, segments=segments)
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+
+    async def one():
+        async with semaphore:
+            started = time.perf_counter()
+            await assess_pronunciation_async(audio_path, REFERENCE_TEXT, recognizer_factory=factory)
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(requests)))
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        "concurrency": concurrency,
+        "throughput": requests / elapsed,
+        "p50": statistics.median(latencies),
+        "p95": latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))],
+        # 理想情況下每個評估只花 latency 秒，其餘皆為排程與處理的額外成本
+        "overhead": statistics.median(latencies) - latency,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="以假辨識器量測發音評估的吞吐量")
+    parser.add_argument('--requests', type=int, default=200, help='每種並行度送出的評估數')
+    parser.add_argument('--concurrency', type=str, default="1,4,16,64", help='逗號分隔的並行上限')
+    parser.add_argument('--latency', type=float, default=0.2, help='假辨識器每次評估的延遲秒數')
+    parser.add_argument('--segments', type=int, default=3, help='每次評估觸發的 recognized 事件數')
+    args = parser.parse_args()
+
+    # 評估前會檢查音檔存在，假辨識器本身不讀取內容
+    fd, audio_path = tempfile.mkstemp(suffix=".wav")
+    os.close(fd)
+    try:
+        table = Table(title=f"Pronunciation assessment ({args.requests} requests, {args.latency:.2f}s recognizer latency)")
+        for column in ("Concurrency", "Req/s", "p50 (s)", "p95 (s)", "Overhead (ms)"):
+            table.add_column(column)
+        for concurrency in [int(c) for c in args.concurrency.split(",") if c.strip()]:
+            result = asyncio.run(run_benchmark(audio_path, args.requests, concurrency, args.latency, args.segments))
+            table.add_row(
+                str(result["concurrency"]), f"{result['throughput']:.1f}", f"{result['p50']:.3f}",
+                f"{result['p95']:.3f}", f"{result['overhead'] * 1000:.1f}",
+            )
+        console.print(table)
+    finally:
+        os.remove(audio_path)
+
+
+if __name__ == "__main__":
+    main()
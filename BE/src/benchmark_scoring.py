@@ -0,0 +1,115 @@
+# src/benchmark_scoring.py
+"""
+以合成的逐字資料比較發音評估的對齊與計分成本：
+difflib.SequenceMatcher 搭配逐字物件（舊做法）與 NumPy 帶狀對齊（services.pronunciation_scoring）。
+
+執行：
+    python -m src.benchmark_scoring --words 100,1000,5000 --error-rate 0.1
+"""
+import argparse
+import difflib
+import random
+import time
+
+import numpy as np
+from rich.console import Console
+from rich.table import Table
+
+from services.pronunciation_scoring import aggregate_scores, encode_error_types
+
+console = Console()
+
+
+def synthesize(n_words: int, error_rate: float, segment_words: int = 20, seed: int = 0):
+    """產生參考文字與含有替換、漏字、多字的辨識結果，每 segment_words 個字為一段。"""
+    rng = random.Random(seed)
+    vocabulary = [f"word{i}" for i in range(2000)]
+    reference = [rng.choice(vocabulary) for _ in range(n_words)]
+    words = []
+    for word in reference:
+        roll = rng.random()
+        if roll < error_rate / 3:
+            continue  # 漏字
+        if roll < 2 * error_rate / 3:
+            words.append(rng.choice(vocabulary))  # 替換
+        else:
+            words.append(word)
+        if rng.random() < error_rate / 3:
+            words.append(rng.choice(vocabulary))  # 多字
+    accuracy = [rng.uniform(40, 100) for _ in words]
+    errors = ["None"] * len(words)
+    n_segments = max(1, -(-len(words) // segment_words))
+    segment_scores = [rng.uniform(60, 100) for _ in range(n_segments)]
+    durations = [segment_words * 3_000_000] * n_segments
+    return reference, words, accuracy, errors, segment_scores, durations
+
+
+def legacy_score(reference, words, accuracy, errors, segment_scores, durations):
+    """舊做法：以 difflib 對齊，逐字物件與多次 list comprehension 計分。"""
+    recognized = [{"word": w, "accuracy_score": a, "error_type": e} for w, a, e in zip(words, accuracy, errors)]
+    diff = difflib.SequenceMatcher(None, reference, [w["word"].lower() for w in recognized])
+    final_words = []
+    for tag, i1, i2, j1, j2 in diff.get_opcodes():
+        if tag in ['insert', 'replace']:
+            for word in recognized[j1:j2]:
+                if word["error_type"] == 'None':
+                    word["error_type"] = 'Insertion'
+                final_words.append(word)
+        if tag in ['delete', 'replace']:
+            for word_text in reference[i1:i2]:
+                final_words.append({"word": word_text, "accuracy_score": 0.0, "error_type": "Omission"})
+        if tag == 'equal':
+            final_words += recognized[j1:j2]
+    scores = [w["accuracy_score"] for w in final_words if w["error_type"] != 'Insertion']
+    accuracy_score = sum(scores) / len(scores) if scores else 0
+    fluency_score = sum(x * y for x, y in zip(segment_scores, durations)) / sum(durations)
+    completeness_score = min(len([w for w in recognized if w["error_type"] == "None"]) / len(reference) * 100, 100)
+    return accuracy_score, fluency_score, completeness_score
+
+
+def vectorized_score(reference, words, accuracy, errors, segment_scores, durations):
+    result = aggregate_scores(
+        reference, words,
+        accuracy=np.asarray(accuracy, dtype=np.float64),
+        errors=encode_error_types(errors),
+        fluency=np.asarray(segment_scores, dtype=np.float64),
+        prosody=np.asarray(segment_scores, dtype=np.float64),
+        durations=np.asarray(durations, dtype=np.float64),
+    )
+    return result["accuracy_score"], result["fluency_score"], result["completeness_score"]
+
+
+def _time(fn, args, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn(*args)
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description="比較 difflib 與 NumPy 帶狀對齊的計分成本")
+    parser.add_argument('--words', type=str, default="100,1000,5000", help='逗號分隔的參考文字字數')
+    parser.add_argument('--error-rate', type=float, default=0.1, help='每個字發生錯誤的機率')
+    parser.add_argument('--repeat', type=int, default=5, help='每種設定重複次數，取最快的一次')
+    args = parser.parse_args()
+
+    table = Table(title=f"Pronunciation scoring (error rate {args.error_rate:.0%})")
+    for column in ("Words", "difflib (ms)", "NumPy banded (ms)", "Speedup", "Accuracy diff"):
+        table.add_column(column)
+    for n_words in [int(n) for n in args.words.split(",") if n.strip()]:
+        data = synthesize(n_words, args.error_rate)
+        legacy = _time(legacy_score, data, args.repeat)
+        vectorized = _time(vectorized_score, data, args.repeat)
+        # 兩種對齊在平手時可能選不同的路徑，分數差異應該很小
+        difference = abs(legacy_score(*data)[0] - vectorized_score(*data)[0])
+        table.add_row(
+            str(n_words), f"{legacy * 1000:.2f}", f"{vectorized * 1000:.2f}",
+            f"{legacy / vectorized:.1f}x", f"{difference:.3f}",
+        )
+    console.print(table)
+
+
+if __name__ == "__main__":
+    main()
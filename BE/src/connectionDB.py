@@ -1,6 +1,8 @@
 # src/connectionDB.py
 import os
 import sqlite3
+import threading
+import time
 from rich.console import Console
 from dotenv import load_dotenv
 
@@ -10,24 +12,177 @@ console = Console()
 # 加載環境變數
 load_dotenv()
 
-def create_connection():
-    conn = None
-    try:
-        db_path = os.getenv('DB_PATH', './db/voiceRecord.sqlite')
+class PooledConnection(sqlite3.Connection):
+    """
+    由連線池管理的連線。呼叫 close() 時歸還給連線池而不是真正關閉，
+    因此既有的 conn.close() 呼叫不需要修改。
+    """
+    pool = None
+    in_pool = False
+    last_used = 0.0
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.release(self)
+        else:
+            super().close()
+
+    def close_physical(self):
+        self.pool = None
+        super().close()
+
+
+class ConnectionPool:
+    """
+    SQLite 連線池。連線建立時設定 WAL、synchronous=NORMAL、快取與 mmap 大小
+    以及 busy timeout，之後重複使用，閒置過久的連線在借出前會先做健康檢查。
+    """
+
+    def __init__(self, db_path: str, max_idle: int = 8, busy_timeout_ms: int = 5000,
+                 cache_size_kb: int = 65536, mmap_size: int = 268435456, health_check_after: float = 30.0):
+        self.db_path = db_path
+        self.max_idle = max_idle
+        self.busy_timeout_ms = busy_timeout_ms
+        self.cache_size_kb = cache_size_kb
+        self.mmap_size = mmap_size
+        self.health_check_after = health_check_after
+        self._idle = []
+        self._lock = threading.Lock()
+        self._closed = False
+        self.created = 0
+        self.in_use = 0
+
         db_dir = os.path.dirname(db_path)
-        
         # 如果資料夾不存在，則創建
-        if not os.path.exists(db_dir):
+        if db_dir and not os.path.exists(db_dir):
             console.print(f"[yellow]Database directory '{db_dir}' does not exist. Creating it...[/yellow]")
             os.makedirs(db_dir, exist_ok=True)
             console.print(f"[green]Database directory '{db_dir}' created successfully.[/green]")
-        
-        # 嘗試連接資料庫
         console.print(f"[blue]Database path:[/blue] {db_path}")
-        conn = sqlite3.connect(db_path)
+
+    def _connect(self) -> PooledConnection:
+        conn = sqlite3.connect(
+            self.db_path,
+            factory=PooledConnection,
+            timeout=self.busy_timeout_ms / 1000,
+            check_same_thread=False,
+        )
+        conn.execute("PRAGMA journal_mode = WAL;")
+        conn.execute("PRAGMA synchronous = NORMAL;")
+        conn.execute(f"PRAGMA cache_size = -{self.cache_size_kb};")
+        conn.execute(f"PRAGMA mmap_size = {self.mmap_size};")
+        conn.execute(f"PRAGMA busy_timeout = {self.busy_timeout_ms};")
+        conn.execute("PRAGMA temp_store = MEMORY;")
         conn.execute("PRAGMA foreign_keys = ON;")  # 啟用外鍵支援
-        console.print("[green]Connection successful with foreign keys enabled.[/green]")
+        conn.pool = self
+        self.created += 1
         return conn
+
+    @staticmethod
+    def _is_healthy(conn: PooledConnection) -> bool:
+        try:
+            conn.execute("SELECT 1").fetchone()
+            return True
+        except sqlite3.Error:
+            return False
+
+    def acquire(self) -> PooledConnection:
+        if self._closed:
+            raise sqlite3.ProgrammingError("Connection pool is closed")
+        while True:
+            with self._lock:
+                conn = self._idle.pop() if self._idle else None
+                self.in_use += 1
+            if conn is None:
+                try:
+                    return self._connect()
+                except sqlite3.Error:
+                    with self._lock:
+                        self.in_use -= 1
+                    raise
+            conn.in_pool = False
+            if time.monotonic() - conn.last_used < self.health_check_after or self._is_healthy(conn):
+                return conn
+            console.print("[yellow]Discarding unhealthy pooled database connection.[/yellow]")
+            with self._lock:
+                self.in_use -= 1
+            conn.close_physical()
+
+    def release(self, conn: PooledConnection):
+        if conn.in_pool:
+            return
+        try:
+            if conn.in_transaction:
+                conn.rollback()
+        except sqlite3.Error:
+            with self._lock:
+                self.in_use -= 1
+            conn.close_physical()
+            return
+        with self._lock:
+            self.in_use -= 1
+            if not self._closed and len(self._idle) < self.max_idle:
+                conn.in_pool = True
+                conn.last_used = time.monotonic()
+                self._idle.append(conn)
+                return
+        conn.close_physical()
+
+    def health_check(self) -> dict:
+        healthy = False
+        journal_mode = None
+        try:
+            conn = self.acquire()
+            try:
+                healthy = self._is_healthy(conn)
+                journal_mode = conn.execute("PRAGMA journal_mode;").fetchone()[0]
+            finally:
+                conn.close()
+        except sqlite3.Error as e:
+            console.print(f"[bold red]Database health check failed:[/bold red] {e}")
+        with self._lock:
+            return {
+                "healthy": healthy,
+                "journal_mode": journal_mode,
+                "idle_connections": len(self._idle),
+                "in_use_connections": self.in_use,
+                "connections_created": self.created,
+            }
+
+    def close_all(self):
+        with self._lock:
+            self._closed = True
+            idle, self._idle = self._idle, []
+        for conn in idle:
+            conn.close_physical()
+        console.print(f"[cyan]Closed {len(idle)} pooled database connections.[/cyan]")
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+def get_connection_pool() -> ConnectionPool:
+    global _pool
+    with _pool_lock:
+        if _pool is None or _pool._closed:
+            _pool = ConnectionPool(
+                os.getenv('DB_PATH', './db/voiceRecord.sqlite'),
+                max_idle=int(os.getenv('DB_POOL_MAX_IDLE', '8')),
+                busy_timeout_ms=int(os.getenv('DB_BUSY_TIMEOUT_MS', '5000')),
+            )
+        return _pool
+
+def close_connection_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.close_all()
+            _pool = None
+
+def create_connection():
+    """從連線池借出一個連線，使用完畢後呼叫 conn.close() 歸還。"""
+    try:
+        return get_connection_pool().acquire()
     except sqlite3.Error as e:
         console.print(f"[bold red]Error connecting to database:[/bold red] {e}")
         return None
@@ -79,13 +234,210 @@ def create_tables(conn):
             CREATE INDEX IF NOT EXISTS idx_voice_record_filename ON voice_record(filename);
             CREATE INDEX IF NOT EXISTS idx_voice_record_createtime ON voice_record(createtime);
             CREATE INDEX IF NOT EXISTS idx_voice_record_status ON voice_record(status);
+            CREATE INDEX IF NOT EXISTS idx_voice_record_createtime_id ON voice_record(createtime, id);
+            CREATE INDEX IF NOT EXISTS idx_voice_record_status_createtime_id ON voice_record(status, createtime, id);
+            CREATE INDEX IF NOT EXISTS idx_voice_record_language_createtime_id ON voice_record(language, createtime, id);
+            CREATE INDEX IF NOT EXISTS idx_voice_record_parent_id ON voice_record(parent_id, createtime, id);
+        ''')
+
+        # 創建 TTS 輸出快取索引表格
+        cursor.executescript('''
+            CREATE TABLE IF NOT EXISTS tts_cache (
+                cache_key TEXT PRIMARY KEY,
+                filepath TEXT NOT NULL,
+                duration REAL,
+                size INTEGER NOT NULL,
+                language TEXT,
+                model_id TEXT,
+                hits INTEGER DEFAULT 0,
+                createtime DATETIME DEFAULT CURRENT_TIMESTAMP,
+                last_access REAL NOT NULL
+            );
+
+            CREATE INDEX IF NOT EXISTS idx_tts_cache_last_access ON tts_cache(last_access);
+        ''')
+
+        # 創建轉譯結果快取表格（以音訊指紋為鍵）
+        cursor.executescript('''
+            CREATE TABLE IF NOT EXISTS transcription_cache (
+                fingerprint TEXT NOT NULL,
+                return_timestamps INTEGER NOT NULL,
+                voice_record_id INTEGER NOT NULL REFERENCES voice_record(id) ON DELETE CASCADE,
+                result TEXT NOT NULL,
+                duration REAL,
+                last_access REAL NOT NULL,
+                PRIMARY KEY (fingerprint, return_timestamps)
+            );
+
+            CREATE INDEX IF NOT EXISTS idx_transcription_cache_last_access ON transcription_cache(last_access);
+
+            -- 上傳檔案雜湊對應到 PCM 指紋：同一段錄音可能以不同容器格式上傳，每個上傳雜湊各一筆
+            CREATE TABLE IF NOT EXISTS transcription_upload (
+                upload_hash TEXT PRIMARY KEY,
+                fingerprint TEXT NOT NULL,
+                last_access REAL NOT NULL
+            );
+
+            CREATE INDEX IF NOT EXISTS idx_transcription_upload_fingerprint ON transcription_upload(fingerprint);
+            CREATE INDEX IF NOT EXISTS idx_transcription_upload_last_access ON transcription_upload(last_access);
+        ''')
+
+        # 創建逐字稿時間片段表格
+        cursor.executescript('''
+            CREATE TABLE IF NOT EXISTS transcript_segment (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                record_id INTEGER NOT NULL REFERENCES voice_record(id) ON DELETE CASCADE,
+                "start" REAL NOT NULL,
+                "end" REAL NOT NULL,
+                text TEXT NOT NULL
+            );
+
+            CREATE INDEX IF NOT EXISTS idx_transcript_segment_record_start ON transcript_segment(record_id, "start");
+        ''')
+
+        # 創建串流轉譯中的逐字稿草稿表格：每次寫回只附加新增的文字，完成時才合併進 voice_record
+        cursor.executescript('''
+            CREATE TABLE IF NOT EXISTS transcript_draft (
+                record_id INTEGER NOT NULL REFERENCES voice_record(id) ON DELETE CASCADE,
+                seq INTEGER NOT NULL,
+                text TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                PRIMARY KEY (record_id, seq)
+            );
+        ''')
+
+        # 創建非同步轉譯工作表格
+        cursor.executescript('''
+            CREATE TABLE IF NOT EXISTS transcription_job (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                voice_record_id INTEGER NOT NULL REFERENCES voice_record(id) ON DELETE CASCADE,
+                status TEXT NOT NULL DEFAULT 'pending',
+                priority INTEGER NOT NULL DEFAULT 0,
+                input_path TEXT NOT NULL,
+                return_timestamps INTEGER NOT NULL DEFAULT 0,
+                model TEXT,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                max_attempts INTEGER NOT NULL DEFAULT 3,
+                next_attempt_at REAL NOT NULL,
+                claimed_by TEXT,
+                heartbeat_at REAL,
+                result TEXT,
+                error_message TEXT,
+                created_at REAL NOT NULL,
+                updated_at REAL NOT NULL
+            );
+
+            CREATE INDEX IF NOT EXISTS idx_transcription_job_claim ON transcription_job(status, priority DESC, next_attempt_at, id);
+            CREATE INDEX IF NOT EXISTS idx_transcription_job_voice_record_id ON transcription_job(voice_record_id);
+        ''')
+
+        # 創建發音評估結果表格；同一音檔與參考文字的評估結果可重複使用
+        cursor.executescript('''
+            CREATE TABLE IF NOT EXISTS pronunciation_assessment (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                voice_record_id INTEGER REFERENCES voice_record(id) ON DELETE SET NULL,
+                reference_path TEXT NOT NULL,
+                text_hash TEXT NOT NULL,
+                reference_text TEXT NOT NULL,
+                audio_size INTEGER NOT NULL,
+                audio_mtime REAL NOT NULL,
+                pronunciation_score REAL,
+                accuracy_score REAL,
+                completeness_score REAL,
+                fluency_score REAL,
+                prosody_score REAL,
+                result TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                UNIQUE (reference_path, text_hash)
+            );
+
+            CREATE INDEX IF NOT EXISTS idx_pronunciation_assessment_voice_record_id ON pronunciation_assessment(voice_record_id);
         ''')
 
         conn.commit()
+        create_search_index(conn)
         console.print("[green]All tables and indexes created successfully.[/green]")
     except sqlite3.Error as e:
         console.print(f"[bold red]Error creating tables or indexes:[/bold red] {e}")
 
+
+def _default_fts_tokenizer():
+    # trigram (SQLite 3.34+) 可對中文等不以空白分詞的文字做子字串搜尋
+    if sqlite3.sqlite_version_info >= (3, 34, 0):
+        return "trigram"
+    return "unicode61 remove_diacritics 2"
+
+
+FTS_TOKENIZER = os.getenv('FTS_TOKENIZER') or _default_fts_tokenizer()
+
+
+def create_search_index(conn):
+    """
+    建立以 voice_record.transcript 為內容的 FTS5 external content 表格，
+    並以觸發器同步新增、更新與刪除。首次建立時會從既有記錄重建索引。
+    SQLite 未編譯 FTS5 時只記錄警告，搜尋功能不可用。
+    """
+    try:
+        cursor = conn.cursor()
+        cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'voice_record_fts'")
+        exists = cursor.fetchone() is not None
+        cursor.executescript(f'''
+            CREATE VIRTUAL TABLE IF NOT EXISTS voice_record_fts USING fts5(
+                transcript,
+                content='voice_record',
+                content_rowid='id',
+                tokenize='{FTS_TOKENIZER}'
+            );
+
+            CREATE TRIGGER IF NOT EXISTS voice_record_fts_ai AFTER INSERT ON voice_record BEGIN
+                INSERT INTO voice_record_fts(rowid, transcript) VALUES (new.id, new.transcript);
+            END;
+
+            CREATE TRIGGER IF NOT EXISTS voice_record_fts_ad AFTER DELETE ON voice_record BEGIN
+                INSERT INTO voice_record_fts(voice_record_fts, rowid, transcript) VALUES ('delete', old.id, old.transcript);
+            END;
+
+            CREATE TRIGGER IF NOT EXISTS voice_record_fts_au AFTER UPDATE OF transcript ON voice_record BEGIN
+                INSERT INTO voice_record_fts(voice_record_fts, rowid, transcript) VALUES ('delete', old.id, old.transcript);
+                INSERT INTO voice_record_fts(rowid, transcript) VALUES (new.id, new.transcript);
+            END;
+        ''')
+        conn.commit()
+        if not exists:
+            rebuild_search_index(conn)
+    except sqlite3.Error as e:
+        console.print(f"[bold yellow]Full-text search index unavailable:[/bold yellow] {e}")
+
+
+def rebuild_search_index(conn):
+    """從 voice_record 重建整個 FTS5 索引並合併索引區段。"""
+    with conn:
+        conn.execute("INSERT INTO voice_record_fts(voice_record_fts) VALUES ('rebuild')")
+        conn.execute("INSERT INTO voice_record_fts(voice_record_fts) VALUES ('optimize')")
+    console.print("[green]Rebuilt full-text search index.[/green]")
+
+VOICE_RECORD_INSERT_SQL = '''
+    INSERT INTO voice_record (filename, filetype, duration, size, filepath, transcript, language, status, error_message, parent_id)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+'''
+
+# SQLite 單一語句的參數數量上限（舊版為 999），批次操作以此切分
+_MAX_BATCH_PARAMS = 900
+
+def _voice_record_params(record):
+    return (
+        record.get('filename'),
+        record.get('filetype'),
+        record.get('duration'),
+        record.get('size'),
+        record.get('filepath'),
+        record.get('transcript'),
+        record.get('language'),
+        record.get('status'),
+        record.get('error_message'),
+        record.get('parent_id')  # 可選
+    )
+
 # 新增 voice_record 資料的函數
 def create_voice_record(conn, record):
     """
@@ -104,24 +456,9 @@ def create_voice_record(conn, record):
         - parent_id (int): 原始語音檔案的 ID（可選）
     :return: 新插入的語音記錄的 ID 或 None
     """
-    sql = '''
-        INSERT INTO voice_record (filename, filetype, duration, size, filepath, transcript, language, status, error_message, parent_id)
-        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-    '''
     try:
         cursor = conn.cursor()
-        cursor.execute(sql, (
-            record.get('filename'),
-            record.get('filetype'),
-            record.get('duration'),
-            record.get('size'),
-            record.get('filepath'),
-            record.get('transcript'),
-            record.get('language'),
-            record.get('status'),
-            record.get('error_message'),
-            record.get('parent_id')  # 可選
-        ))
+        cursor.execute(VOICE_RECORD_INSERT_SQL, _voice_record_params(record))
         conn.commit()
         voice_record_id = cursor.lastrowid
         console.print(f"[green]Voice record inserted with ID: {voice_record_id}[/green]")
@@ -191,6 +528,134 @@ def associate_tag_with_voice_record(conn, voice_record_id, tag_id):
         console.print(f"[bold red]Error associating tag ID {tag_id} with voice_record ID {voice_record_id}:[/bold red] {e}")
         return False
 
+def upsert_tags(conn, tags):
+    """
+    批次新增標籤並取得所有標籤的 ID，不會提交交易。
+    SQLite 3.35 以上使用多列 INSERT ... RETURNING 一次取回 ID，
+    較舊版本則以 executemany 新增後再查詢一次。
+    :param conn: SQLite 資料庫連接物件
+    :param tags: 標籤名稱列表
+    :return: 字典 {標籤名稱: 標籤 ID}
+    """
+    unique_tags = list(dict.fromkeys(tags))
+    tag_ids = {}
+    cursor = conn.cursor()
+    for i in range(0, len(unique_tags), _MAX_BATCH_PARAMS):
+        batch = unique_tags[i:i + _MAX_BATCH_PARAMS]
+        placeholders = ", ".join("?" for _ in batch)
+        if sqlite3.sqlite_version_info >= (3, 35, 0):
+            cursor.execute(
+                f"INSERT INTO tags (tag) VALUES {', '.join('(?)' for _ in batch)} "
+                "ON CONFLICT(tag) DO UPDATE SET tag = excluded.tag RETURNING id, tag",
+                batch
+            )
+        else:
+            cursor.executemany("INSERT OR IGNORE INTO tags (tag) VALUES (?)", [(tag,) for tag in batch])
+            cursor.execute(f"SELECT id, tag FROM tags WHERE tag IN ({placeholders})", batch)
+        for tag_id, tag in cursor.fetchall():
+            tag_ids[tag] = tag_id
+    return tag_ids
+
+def _transcript_segment_params(record_id, segments, duration=None):
+    """
+    把轉譯結果的 chunk（{"timestamp": (start, end), "text": ...}）轉成資料列。
+    Whisper 最後一個 chunk 的結束時間可能是 None，此時使用下一段的起點或音訊長度。
+    """
+    rows = []
+    for i, segment in enumerate(segments):
+        start, end = segment.get("timestamp") or (None, None)
+        start = start or 0.0
+        if end is None:
+            next_start = segments[i + 1].get("timestamp", (None, None))[0] if i + 1 < len(segments) else None
+            end = next_start if next_start is not None else (duration if duration is not None else start)
+        rows.append((record_id, start, max(end, start), segment.get("text", "")))
+    return rows
+
+def insert_transcript_segments(conn, record_id, segments, duration=None):
+    """
+    以 executemany 批次新增逐字稿片段，不會提交交易。
+    :return: 新增的片段數
+    """
+    rows = _transcript_segment_params(record_id, segments, duration)
+    if rows:
+        conn.executemany(
+            'INSERT INTO transcript_segment (record_id, "start", "end", text) VALUES (?, ?, ?, ?)',
+            rows
+        )
+    return len(rows)
+
+def create_voice_record_with_tags(conn, record, tags=None, segments=None):
+    """
+    在單一交易中新增語音記錄、標籤、兩者的關聯與逐字稿片段，只需一次提交。
+    :param conn: SQLite 資料庫連接物件
+    :param record: 與 create_voice_record 相同格式的字典
+    :param tags: 標籤名稱列表（可選）
+    :param segments: 含時間戳的轉譯 chunk 列表（可選）
+    :return: 新插入的語音記錄的 ID 或 None
+    """
+    try:
+        with conn:
+            cursor = conn.cursor()
+            cursor.execute(VOICE_RECORD_INSERT_SQL, _voice_record_params(record))
+            voice_record_id = cursor.lastrowid
+            if tags:
+                tag_ids = upsert_tags(conn, tags)
+                cursor.executemany(
+                    "INSERT OR IGNORE INTO voice_record_tags (voice_record_id, tag_id) VALUES (?, ?)",
+                    [(voice_record_id, tag_id) for tag_id in tag_ids.values()]
+                )
+            if segments:
+                insert_transcript_segments(conn, voice_record_id, segments, record.get('duration'))
+        console.print(f"[green]Voice record inserted with ID: {voice_record_id} ({len(tags or [])} tags)[/green]")
+        return voice_record_id
+    except sqlite3.IntegrityError as e:
+        console.print(f"[bold red]IntegrityError inserting voice record:[/bold red] {e}")
+        return None
+    except sqlite3.Error as e:
+        console.print(f"[bold red]Error inserting voice record:[/bold red] {e}")
+        return None
+
+def bulk_create_voice_records(conn, records, tags=None):
+    """
+    在單一交易中批次新增大量語音記錄，並為每筆記錄加上相同的標籤。
+    檔名已存在的記錄會被略過。
+    :param conn: SQLite 資料庫連接物件
+    :param records: 與 create_voice_record 相同格式的字典列表
+    :param tags: 標籤名稱列表（可選）
+    :return: 實際新增的記錄數
+    """
+    if not records:
+        return 0
+    try:
+        with conn:
+            cursor = conn.cursor()
+            records_by_name = {record.get('filename'): record for record in records}
+            filenames = list(records_by_name)
+            for i in range(0, len(filenames), _MAX_BATCH_PARAMS):
+                batch = filenames[i:i + _MAX_BATCH_PARAMS]
+                placeholders = ", ".join("?" for _ in batch)
+                cursor.execute(f"SELECT filename FROM voice_record WHERE filename IN ({placeholders})", batch)
+                for (filename,) in cursor.fetchall():
+                    records_by_name.pop(filename, None)
+            cursor.executemany(VOICE_RECORD_INSERT_SQL, [_voice_record_params(record) for record in records_by_name.values()])
+            inserted = len(records_by_name)
+            if tags and inserted:
+                tag_ids = list(upsert_tags(conn, tags).values())
+                filenames = list(records_by_name)
+                for i in range(0, len(filenames), _MAX_BATCH_PARAMS):
+                    batch = filenames[i:i + _MAX_BATCH_PARAMS]
+                    placeholders = ", ".join("?" for _ in batch)
+                    cursor.execute(f"SELECT id FROM voice_record WHERE filename IN ({placeholders})", batch)
+                    cursor.executemany(
+                        "INSERT OR IGNORE INTO voice_record_tags (voice_record_id, tag_id) VALUES (?, ?)",
+                        [(row[0], tag_id) for row in cursor.fetchall() for tag_id in tag_ids]
+                    )
+        console.print(f"[green]Bulk inserted {inserted} voice records.[/green]")
+        return inserted
+    except sqlite3.Error as e:
+        console.print(f"[bold red]Error bulk inserting voice records:[/bold red] {e}")
+        return 0
+
 # 初始化資料庫
 def initialize_database():
     connection = create_connection()
@@ -0,0 +1,23 @@
+# src/rebuild_search_index.py
+import argparse
+
+from src.connectionDB import create_connection, create_tables, rebuild_search_index
+
+
+def main():
+    parser = argparse.ArgumentParser(description="從 voice_record 重建逐字稿的全文搜尋索引")
+    parser.parse_args()
+
+    conn = create_connection()
+    if not conn:
+        raise RuntimeError("Database connection failed")
+    try:
+        # create_tables 會在索引不存在時建立表格與觸發器
+        create_tables(conn)
+        rebuild_search_index(conn)
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,49 +1,40 @@
-import torch
-from transformers import AutoModelForSpeechSeq2Seq, AutoProcessor, pipeline
 import numpy as np
 from fastapi import UploadFile, File, HTTPException
 from pydub import AudioSegment
+from services.model_registry import model_registry
+from services.inference_host import get_inference_host_client
+from src.asr_backends import ASR_MODEL_ALIASES, DEFAULT_ASR_MODEL, create_backend, normalize_model, registry_name
 
-device = "cuda:0" if torch.cuda.is_available() else "cpu"
-torch_dtype = torch.float16 if torch.cuda.is_available() else torch.float32
+model_id = ASR_MODEL_ALIASES[DEFAULT_ASR_MODEL]
 
-model_id = "openai/whisper-large-v3"
-model = AutoModelForSpeechSeq2Seq.from_pretrained(
-    model_id, 
-    torch_dtype=torch_dtype, 
-    low_cpu_mem_usage=True, 
-    use_safetensors=True
-)
-model.to(device)
+# 每個模型別名登記一個延遲載入的後端；只有被使用或預熱的模型會佔用記憶體
+for _model in ASR_MODEL_ALIASES:
+    model_registry.register(registry_name(_model), lambda model=_model: create_backend(model))
 
-processor = AutoProcessor.from_pretrained(model_id)
+def get_backend(model=None):
+    return model_registry.get(registry_name(normalize_model(model)))
 
-pipe = pipeline(
-    "automatic-speech-recognition",
-    model=model,
-    tokenizer=processor.tokenizer,
-    feature_extractor=processor.feature_extractor,
-    torch_dtype=torch_dtype,
-    device=device,
-    chunk_length_s=30,
-    batch_size=16,
-)
-
-def transcribe_audio(audio_data, sampling_rate,return_timestamps=False):
+def transcribe_audio(audio_data, sampling_rate,return_timestamps=False, model=None):
     try:
-        input_data = {
-            "raw": audio_data,
-            "sampling_rate": sampling_rate
-        }
-        result = pipe(input_data,return_timestamps=return_timestamps)
+        result = transcribe_audio_batch([audio_data], sampling_rate, return_timestamps, batch_size=1, model=model)[0]
         print("===== TRANSCRIPTION RESULT =====")
         print(result)
-        if "chunks" in result:
-            return result["chunks"]
-        elif "text" in result:
-            return result["text"] 
-        else:
-            raise ValueError("Unexpected transcription result format.")
+        if isinstance(result, Exception):
+            raise result
+        return result
     except Exception as e:
         print(f"Error during transcription: {str(e)}")
         return None
+
+def transcribe_audio_batch(audio_list, sampling_rate, return_timestamps=False, batch_size=16, model=None):
+    """
+    一次轉譯多段音訊。pipeline 會把每段音訊切成 30 秒的 chunk，
+    並把不同音訊的 chunk 合併到同一個 batch 中做 forward。
+    :param audio_list: float32 numpy 陣列的列表
+    :param model: 模型別名（large-v3、small、distil），None 為預設模型
+    :return: 與 audio_list 對應的轉譯結果列表（失敗的項目為例外物件）
+    """
+    client = get_inference_host_client()
+    if client is not None:
+        return client.transcribe_audio_batch(audio_list, sampling_rate, return_timestamps, batch_size, model)
+    return get_backend(model).transcribe_batch(audio_list, sampling_rate, return_timestamps, batch_size)
@@ -0,0 +1,141 @@
+import asyncio
+import threading
+import time
+
+import numpy as np
+import pytest
+
+from services.batch_scheduler import SchedulerStoppedError, TranscriptionBatchScheduler
+from services.inference_executor import InferencePool
+
+
+class FakeModel:
+    """記錄每個 batch 的假模型；每筆結果為 (模型, 該筆音訊長度)。"""
+
+    def __init__(self, delay: float = 0.0, release: threading.Event = None):
+        self.batches = []
+        self.delay = delay
+        self.release = release
+
+    def __call__(self, audio_list, sampling_rate, return_timestamps, batch_size, model):
+        self.batches.append((model, [len(audio) for audio in audio_list]))
+        if self.release is not None:
+            self.release.wait(5)
+        time.sleep(self.delay)
+        return [(model, len(audio)) for audio in audio_list]
+
+
+def _scheduler(model, max_batch_size=4, max_wait_ms=50, max_workers=1):
+    return TranscriptionBatchScheduler(
+        model, InferencePool("test", max_workers=max_workers, max_queue=100),
+        max_batch_size=max_batch_size, max_wait_ms=max_wait_ms, chunk_length_s=1,
+    )
+
+
+def _audio(samples):
+    return np.zeros(samples, dtype=np.float32)
+
+
+def test_requests_are_grouped_by_model():
+    model = FakeModel()
+
+    async def main():
+        scheduler = _scheduler(model, max_wait_ms=100)
+        try:
+            return await asyncio.gather(*(
+                scheduler.submit(_audio(index + 1), 16000, model=name)
+                for index, name in enumerate(["small", "large-v3", "small", "large-v3"])
+            ))
+        finally:
+            await scheduler.stop()
+
+    results = asyncio.run(main())
+    assert results == [("small", 1), ("large-v3", 2), ("small", 3), ("large-v3", 4)]
+    assert sorted(model.batches) == [("large-v3", [2, 4]), ("small", [1, 3])]
+
+
+def test_full_batch_is_sent_before_max_wait():
+    model = FakeModel()
+
+    async def main():
+        scheduler = _scheduler(model, max_batch_size=2, max_wait_ms=5000)
+        try:
+            started = time.perf_counter()
+            await asyncio.gather(*(scheduler.submit(_audio(16000), 16000) for _ in range(2)))
+            return time.perf_counter() - started
+        finally:
+            await scheduler.stop()
+
+    assert asyncio.run(main()) < 1
+    assert model.batches == [(None, [16000, 16000])]
+
+
+def test_partial_batch_is_sent_after_max_wait():
+    model = FakeModel()
+
+    async def main():
+        scheduler = _scheduler(model, max_batch_size=16, max_wait_ms=100)
+        try:
+            started = time.perf_counter()
+            result = await scheduler.submit(_audio(10), 16000)
+            return result, time.perf_counter() - started
+        finally:
+            await scheduler.stop()
+
+    result, elapsed = asyncio.run(main())
+    assert result == (None, 10)
+    assert 0.09 <= elapsed < 2
+    assert model.batches == [(None, [10])]
+
+
+def test_long_audio_counts_as_several_chunks():
+    model = FakeModel()
+
+    async def main():
+        # 每秒 1 個 chunk：3 秒的音訊佔 3 個名額，加上 1 秒的音訊剛好填滿 max_batch_size=4
+        scheduler = _scheduler(model, max_batch_size=4, max_wait_ms=5000)
+        try:
+            await asyncio.gather(scheduler.submit(_audio(3 * 16000), 16000), scheduler.submit(_audio(16000), 16000))
+        finally:
+            await scheduler.stop()
+
+    asyncio.run(main())
+    assert model.batches == [(None, [3 * 16000, 16000])]
+
+
+def test_stop_fails_queued_and_running_requests():
+    release = threading.Event()
+    model = FakeModel(release=release)
+
+    async def main():
+        scheduler = _scheduler(model, max_batch_size=1, max_wait_ms=10)
+        tasks = [asyncio.create_task(scheduler.submit(_audio(10), 16000, model=str(index % 2))) for index in range(5)]
+        # 第一個 batch 在模型中等待，其餘請求留在佇列或擱置區
+        while not model.batches:
+            await asyncio.sleep(0.01)
+        await scheduler.stop()
+        release.set()
+        return await asyncio.wait_for(asyncio.gather(*tasks, return_exceptions=True), 2)
+
+    results = asyncio.run(main())
+    assert len(results) == 5
+    assert all(isinstance(result, SchedulerStoppedError) for result in results)
+
+
+def test_submit_after_stop_starts_a_new_worker():
+    model = FakeModel()
+
+    async def main():
+        scheduler = _scheduler(model)
+        await scheduler.stop()
+        try:
+            return await scheduler.submit(_audio(5), 16000)
+        finally:
+            await scheduler.stop()
+
+    assert asyncio.run(main()) == (None, 5)
+
+
+@pytest.mark.parametrize("samples, chunks", [(1, 1), (16000, 1), (16001, 2), (48000, 3)])
+def test_chunk_count(samples, chunks):
+    assert _scheduler(FakeModel())._count_chunks(_audio(samples), 16000) == chunks
@@ -0,0 +1,58 @@
+import os
+import tempfile
+import threading
+import time
+from multiprocessing import AuthenticationError
+from multiprocessing.connection import Client
+
+import pytest
+
+from services.inference_host import InferenceHost
+
+
+class _EchoHost(InferenceHost):
+    """不載入模型，直接回傳請求內容的主機。"""
+
+    def _handle(self, request: dict):
+        return request["value"]
+
+
+@pytest.fixture
+def host_address():
+    directory = tempfile.mkdtemp()
+    address = os.path.join(directory, "host.sock")
+    host = _EchoHost(address, b"secret")
+    threading.Thread(target=host.serve_forever, daemon=True).start()
+    deadline = time.monotonic() + 5
+    while not os.path.exists(address):
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+    yield address
+
+
+def _call(address, authkey, value):
+    with Client(address, family="AF_UNIX", authkey=authkey) as conn:
+        conn.send({"op": "echo", "value": value})
+        return conn.recv()
+
+
+def test_bad_authkey_does_not_stop_host(host_address):
+    with pytest.raises(AuthenticationError):
+        _call(host_address, b"wrong", 1)
+    assert _call(host_address, b"secret", 2) == {"ok": True, "result": 2}
+
+
+def test_client_dropping_mid_handshake_does_not_stop_host(host_address):
+    # 連上後不回應驗證就斷線
+    raw = Client(host_address, family="AF_UNIX")
+    raw.close()
+    assert _call(host_address, b"secret", 3) == {"ok": True, "result": 3}
+
+
+def test_slow_handshake_does_not_block_other_clients(host_address):
+    # 停在驗證階段的連線不應擋住其他客戶端
+    idle = Client(host_address, family="AF_UNIX")
+    try:
+        assert _call(host_address, b"secret", 4) == {"ok": True, "result": 4}
+    finally:
+        idle.close()
@@ -0,0 +1,136 @@
+import sqlite3
+import threading
+import time
+
+import pytest
+
+from services import job_queue
+from services.job_queue import (
+    claim_job, complete_job, fail_job, get_job, heartbeat, recover_stale_jobs, retry_delay, submit_job,
+)
+from src.connectionDB import create_tables
+
+
+def _connect(path):
+    conn = sqlite3.connect(str(path), timeout=5, check_same_thread=False)
+    conn.execute("PRAGMA journal_mode = WAL;")
+    conn.execute("PRAGMA foreign_keys = ON;")
+    return conn
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    path = tmp_path / "jobs.sqlite"
+    conn = _connect(path)
+    create_tables(conn)
+    conn.close()
+    return path
+
+
+@pytest.fixture
+def conn(db_path):
+    conn = _connect(db_path)
+    yield conn
+    conn.close()
+
+
+def _submit(conn, tmp_path, name="a", max_attempts=3):
+    input_path = tmp_path / f"{name}.wav"
+    input_path.write_bytes(b"audio")
+    record = {"filename": f"{name}.txt", "filetype": "text/plain", "filepath": str(input_path), "status": "pending"}
+    return submit_job(conn, record, [], str(input_path), max_attempts=max_attempts)
+
+
+def _record_status(conn, job):
+    return conn.execute("SELECT status FROM voice_record WHERE id = ?", (job["voice_record_id"],)).fetchone()[0]
+
+
+def test_two_workers_racing_claim_one_job(db_path, conn, tmp_path):
+    _submit(conn, tmp_path)
+    barrier = threading.Barrier(2)
+    claims = {}
+
+    def worker(worker_id):
+        worker_conn = _connect(db_path)
+        try:
+            barrier.wait()
+            claims[worker_id] = claim_job(worker_conn, worker_id)
+        finally:
+            worker_conn.close()
+
+    threads = [threading.Thread(target=worker, args=(f"w{index}",)) for index in range(2)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    claimed = [job for job in claims.values() if job is not None]
+    assert len(claimed) == 1
+    assert get_job(conn, claimed[0]["id"])["claimed_by"] == claimed[0]["claimed_by"]
+
+
+def test_writes_from_worker_with_stolen_claim_are_rejected(conn, tmp_path):
+    job = _submit(conn, tmp_path)
+    first = claim_job(conn, "w1")
+    # w1 的心跳逾時，工作被回收後由 w2 領取
+    conn.execute("UPDATE transcription_job SET heartbeat_at = 0 WHERE id = ?", (job["id"],))
+    conn.commit()
+    assert recover_stale_jobs(conn, stale_after=1) == 1
+    conn.execute("UPDATE transcription_job SET next_attempt_at = 0 WHERE id = ?", (job["id"],))
+    conn.commit()
+    second = claim_job(conn, "w2")
+    assert second["id"] == job["id"]
+
+    assert not heartbeat(conn, job["id"], "w1")
+    assert not complete_job(conn, first, {"text": "stale"}, {"transcript": "stale"})
+    assert fail_job(conn, first, "stale failure") is None
+    current = get_job(conn, job["id"])
+    assert current["status"] == "transcribing"
+    assert current["claimed_by"] == "w2"
+    assert current["result"] is None
+
+    assert complete_job(conn, second, {"text": "ok"}, {"transcript": "ok"})
+    assert get_job(conn, job["id"])["status"] == "completed"
+    assert _record_status(conn, job) == "completed"
+
+
+def test_failed_job_backs_off_then_errors(conn, tmp_path):
+    job = _submit(conn, tmp_path, max_attempts=2)
+    claimed = claim_job(conn, "w1")
+    before = time.time()
+    assert fail_job(conn, claimed, "boom") == "pending"
+    retried = get_job(conn, job["id"])
+    assert retried["next_attempt_at"] >= before + retry_delay(1)
+    # 退避時間未到前不會被領取
+    assert claim_job(conn, "w1") is None
+
+    conn.execute("UPDATE transcription_job SET next_attempt_at = 0 WHERE id = ?", (job["id"],))
+    conn.commit()
+    claimed = claim_job(conn, "w1")
+    assert claimed["attempts"] == 2
+    assert fail_job(conn, claimed, "boom again") == "error"
+    assert _record_status(conn, job) == "error"
+
+
+def test_stale_job_is_requeued_then_errors_and_input_is_removed(conn, tmp_path):
+    job = _submit(conn, tmp_path, max_attempts=2)
+    input_path = tmp_path / "a.wav"
+    for attempt in range(2):
+        conn.execute("UPDATE transcription_job SET next_attempt_at = 0 WHERE id = ?", (job["id"],))
+        conn.commit()
+        assert claim_job(conn, f"w{attempt}") is not None
+        # 仍有心跳的工作不會被回收
+        assert recover_stale_jobs(conn, stale_after=60) == 0
+        conn.execute("UPDATE transcription_job SET heartbeat_at = 0 WHERE id = ?", (job["id"],))
+        conn.commit()
+        assert recover_stale_jobs(conn, stale_after=60) == 1
+        if attempt == 0:
+            assert get_job(conn, job["id"])["status"] == "pending"
+            assert _record_status(conn, job) == "pending"
+            assert input_path.exists()
+
+    recovered = get_job(conn, job["id"])
+    assert recovered["status"] == "error"
+    assert recovered["claimed_by"] is None
+    assert _record_status(conn, job) == "error"
+    assert not input_path.exists()
@@ -0,0 +1,145 @@
+import difflib
+import random
+
+import numpy as np
+import pytest
+
+from services import pronunciation_scoring
+from services.pronunciation_scoring import (
+    ALIGN_BAND, ALIGN_BAND_DOUBLINGS, _INDEL_COST, _SUBSTITUTION_COST, _banded_operations, align_words,
+    edit_operations,
+)
+
+
+def _full_cost(ref, hyp):
+    """完整 O(n * m) 動態規劃的加權編輯距離，作為比對基準。"""
+    previous = [j * _INDEL_COST for j in range(len(hyp) + 1)]
+    for i, word in enumerate(ref, 1):
+        current = [i * _INDEL_COST]
+        for j, other in enumerate(hyp, 1):
+            current.append(min(
+                previous[j] + _INDEL_COST,
+                current[j - 1] + _INDEL_COST,
+                previous[j - 1] + (0 if word == other else _SUBSTITUTION_COST),
+            ))
+        previous = current
+    return previous[-1]
+
+
+def _operations_cost(ref, hyp, operations):
+    """檢查操作序列確實把 ref 對到 hyp，並回傳其成本。"""
+    i = j = cost = 0
+    for operation in operations:
+        if operation == "equal":
+            assert ref[i] == hyp[j]
+            i, j = i + 1, j + 1
+        elif operation == "replace":
+            i, j, cost = i + 1, j + 1, cost + _SUBSTITUTION_COST
+        elif operation == "delete":
+            i, cost = i + 1, cost + _INDEL_COST
+        else:
+            j, cost = j + 1, cost + _INDEL_COST
+    assert (i, j) == (len(ref), len(hyp))
+    return cost
+
+
+def _opcodes_cost(opcodes):
+    cost = 0
+    for tag, i1, i2, j1, j2 in opcodes:
+        a, b = i2 - i1, j2 - j1
+        if tag != "equal":
+            cost += _SUBSTITUTION_COST * min(a, b) + _INDEL_COST * abs(a - b)
+    return cost
+
+
+def _words(rng, vocabulary, count):
+    return [f"w{rng.randrange(vocabulary)}" for _ in range(count)]
+
+
+def _recognized(rng, ref, vocabulary, error_rate):
+    """模擬辨識結果：逐字替換、漏字或多字。"""
+    hyp = []
+    for word in ref:
+        roll = rng.random()
+        if roll < error_rate / 3:
+            continue
+        if roll < 2 * error_rate / 3:
+            hyp.append(f"w{rng.randrange(vocabulary)}")
+        else:
+            hyp.append(word)
+        if rng.random() < error_rate / 3:
+            hyp.append(f"w{rng.randrange(vocabulary)}")
+    return hyp
+
+
+def _with_noise(rng, ref, vocabulary):
+    """辨識結果前後多出或少了一大段，例如錄到參考文字以外的說話。"""
+    hyp = _recognized(rng, ref, vocabulary, rng.uniform(0, 0.2))
+    prefix, suffix = rng.randrange(150), rng.randrange(150)
+    if rng.random() < 0.5:
+        hyp = _words(rng, vocabulary, prefix) + hyp + _words(rng, vocabulary, suffix)
+    else:
+        hyp = hyp[prefix // 3:len(hyp) - suffix // 3]
+    return hyp
+
+
+@pytest.mark.parametrize("seed", range(150))
+def test_edit_operations_matches_full_dp(seed):
+    rng = random.Random(seed)
+    ref = _words(rng, 2000, rng.randrange(1, 200))
+    hyp = _with_noise(rng, ref, 2000)
+    assert _operations_cost(ref, hyp, edit_operations(ref, hyp)) == _full_cost(ref, hyp)
+
+
+@pytest.mark.parametrize("seed", range(100))
+def test_align_words_not_worse_than_difflib(seed):
+    rng = random.Random(seed)
+    ref = _words(rng, rng.choice([20, 200, 2000]), rng.randrange(1, 300))
+    hyp = _recognized(rng, ref, 2000, rng.uniform(0, 0.5))
+    if len(hyp) > 40 and rng.random() < 0.5:
+        # 一段字被移到別處
+        start, length = rng.randrange(len(hyp) - 20), rng.randrange(5, 20)
+        block, hyp = hyp[start:start + length], hyp[:start] + hyp[start + length:]
+        position = rng.randrange(len(hyp))
+        hyp = hyp[:position] + block + hyp[position:]
+    matcher = difflib.SequenceMatcher(None, ref, hyp, autojunk=False)
+    assert _opcodes_cost(align_words(ref, hyp)) <= _opcodes_cost(matcher.get_opcodes())
+
+
+@pytest.mark.parametrize("seed", range(50))
+def test_banded_operations_is_optimal_with_narrow_band(seed):
+    rng = random.Random(seed)
+    ref = _words(rng, 4, rng.randrange(30, 120))
+    hyp = _words(rng, 4, rng.randrange(30, 120))
+    ref_codes = np.array([int(word[1:]) for word in ref], dtype=np.int64)
+    hyp_codes = np.array([int(word[1:]) for word in hyp], dtype=np.int64)
+    operations = _banded_operations(ref_codes, hyp_codes, band=2)
+    assert _operations_cost(ref, hyp, operations) == _full_cost(ref, hyp)
+
+
+def test_leading_speech_does_not_split_reference():
+    rng = random.Random(0)
+    ref = _words(rng, 50, 60)
+    hyp = _words(rng, 50, 120) + ref
+    opcodes = align_words(ref, hyp)
+    assert {opcode[0] for opcode in opcodes} <= {"insert", "equal"}
+    assert sum(i2 - i1 for tag, i1, i2, _, _ in opcodes if tag == "equal") == len(ref)
+
+
+def test_unrelated_text_keeps_band_bounded(monkeypatch):
+    # 辨識結果與參考文字無關時沒有錨點，帶寬加倍到上限後就停止，不會長到 O(n * m)
+    widths = []
+    banded_table = pronunciation_scoring._banded_table
+
+    def recording_table(ref, hyp, lo, hi, width):
+        widths.append(width)
+        return banded_table(ref, hyp, lo, hi, width)
+
+    monkeypatch.setattr(pronunciation_scoring, "_banded_table", recording_table)
+    rng = random.Random(0)
+    ref = [f"a{rng.randrange(3000)}" for _ in range(3000)]
+    hyp = [f"b{rng.randrange(3000)}" for _ in range(3000)]
+    operations = edit_operations(ref, hyp)
+    assert _operations_cost(ref, hyp, operations) <= _SUBSTITUTION_COST * len(ref)
+    assert max(widths) <= 2 * ALIGN_BAND * 2 ** ALIGN_BAND_DOUBLINGS + 1
+    assert len(widths) <= ALIGN_BAND_DOUBLINGS + 1
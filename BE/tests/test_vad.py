@@ -0,0 +1,36 @@
+import pytest
+
+from services.vad import TimelineMap
+
+
+@pytest.fixture
+def timeline():
+    # 原始音訊 [1, 3) 與 [10, 12) 秒為語音，壓縮後接成 [0, 2) 與 [2, 4)
+    return TimelineMap(packed_starts=[0.0, 2.0], original_starts=[1.0, 10.0], durations=[2.0, 2.0])
+
+
+def test_boundary_start_maps_to_next_segment(timeline):
+    assert timeline.to_original(2.0) == 10.0
+
+
+def test_boundary_end_stays_in_previous_segment(timeline):
+    assert timeline.to_original(2.0, is_end=True) == 3.0
+
+
+def test_times_inside_segments(timeline):
+    assert timeline.to_original(0.5) == 1.5
+    assert timeline.to_original(0.5, is_end=True) == 1.5
+    assert timeline.to_original(3.0) == 11.0
+    assert timeline.to_original(3.0, is_end=True) == 11.0
+    assert timeline.to_original(0.0, is_end=True) == 1.0
+
+
+def test_remap_chunks_does_not_stretch_chunk_ending_on_boundary(timeline):
+    chunks = [
+        {"text": "first", "timestamp": (0.5, 2.0)},
+        {"text": "second", "timestamp": (2.0, 3.5)},
+        {"text": "open", "timestamp": (3.5, None)},
+    ]
+    assert [chunk["timestamp"] for chunk in timeline.remap_chunks(chunks)] == [
+        (1.5, 3.0), (10.0, 11.5), (11.5, None),
+    ]
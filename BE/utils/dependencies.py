@@ -5,6 +5,7 @@ import logging
 import os
 
 from src.connectionDB import create_connection
+from services.inference_executor import InferenceBusyError
 
 logger = logging.getLogger(__name__)
 
@@ -27,3 +28,11 @@ async def database_exception_handler(request: Request, exc: DatabaseError):
         status_code=500,
         content={"detail": exc.message},
     )
+
+async def inference_busy_exception_handler(request: Request, exc: InferenceBusyError):
+    logger.warning(f"Inference busy: {exc.message}")
+    return JSONResponse(
+        status_code=503,
+        content={"detail": exc.message},
+        headers={"Retry-After": str(exc.retry_after)},
+    )